@@ -0,0 +1,42 @@
+import argparse
+from api_metrics import report_api_metrics
+from inventory_common import add_account_arguments, add_common_arguments, call_stats
+from inventory_engine import InventoryEngine
+from vpc_topology import DEFAULT_TOPOLOGY_DB
+
+# Input: List of account numbers
+account_numbers_input = [
+    "123456789764",
+    "123456789764",
+    "123456789764",
+]
+
+# Role to assume in child accounts
+role_name = "Switch-account-role"
+
+# List of required tags
+required_tags = ['Name', 'Env', 'Grade', 'Application', 'Environment', 'Product']
+
+# Parse command-line options
+parser = argparse.ArgumentParser(description='EC2, RDS and VPC inventory across accounts in a single pass')
+add_common_arguments(parser)
+add_account_arguments(parser)
+parser.add_argument('--collectors', default='ec2,rds,rds-clusters,vpc-org',
+                    help='Comma-separated collectors to run (default: ec2,rds,rds-clusters,vpc-org)')
+parser.add_argument('--per-vpc', action='store_true',
+                    help='Query each VPC resource type once per VPC instead of once per region')
+parser.add_argument('--topology-db', nargs='?', const=DEFAULT_TOPOLOGY_DB, default=None, metavar='PATH',
+                    help=f"Also refresh the VPC topology graph used by vpc-topology-query.py (default path: {DEFAULT_TOPOLOGY_DB})")
+parser.set_defaults(required_tags=required_tags)
+args = parser.parse_args()
+
+# Every region of every account is scanned once, running all collectors against
+# the same clients and sharing describe_* results (e.g. instances for EC2 and VPC)
+collector_names = [name.strip() for name in args.collectors.split(',') if name.strip()]
+sinks = InventoryEngine(args, role_name).run(collector_names, account_numbers_input)
+
+for sink in sinks.values():
+    print(f"CSV file '{sink.filename}' has been created successfully.")
+    sink.report()
+call_stats.report()
+report_api_metrics(args)
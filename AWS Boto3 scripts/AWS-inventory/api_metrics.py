@@ -0,0 +1,220 @@
+"""Per-API-call metrics collected from botocore event hooks.
+
+inventory_common.new_client attaches the hooks to every client the inventory
+scripts create, including the STS and service clients of assumed-role
+sessions. Calls are grouped by (service, operation, region, account).
+"""
+import bisect
+import json
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# Error codes AWS services return when a caller is throttled
+THROTTLE_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'ProvisionedThroughputExceededException', 'RequestLimitExceeded',
+    'RequestThrottled', 'SlowDown', 'EC2ThrottledException', 'BandwidthLimitExceeded',
+}
+
+
+class OperationMetrics:
+    """Latency histogram and counters for one (service, operation, region, account)."""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.calls = 0
+        self.seconds = 0.0
+        self.retries = 0
+        self.throttles = 0
+        self.errors = 0
+        self.bytes = 0
+
+    def observe(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """Upper bound of the histogram bucket holding the q-quantile of the latency."""
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return 0.0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'retries': self.retries,
+            'throttles': self.throttles,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.buckets)},
+        }
+
+
+class ApiMetrics:
+    """Collects OperationMetrics from the clients passed to attach()."""
+
+    def __init__(self):
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def attach(self, client, account_id=None):
+        """Register the metric hooks on client; account_id labels its calls ('' if unknown)."""
+        labels = (client.meta.service_model.service_name, client.meta.region_name or '', account_id or '')
+        events = client.meta.events
+        events.register_first('before-call', lambda **kwargs: self._before_call(labels, **kwargs))
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+        events.register_first('needs-retry', self._needs_retry)
+        return client
+
+    def _metrics(self, key):
+        metrics = self.operations.get(key)
+        if metrics is None:
+            metrics = self.operations.setdefault(key, OperationMetrics())
+        return metrics
+
+    def _before_call(self, labels, model, context, **kwargs):
+        service, region, account_id = labels
+        context['api_metrics_key'] = (service, model.name, region, account_id)
+        context['api_metrics_started'] = time.perf_counter()
+
+    def _after_call(self, http_response, parsed, context, **kwargs):
+        key = context.get('api_metrics_key')
+        if key is None:
+            return
+        elapsed = time.perf_counter() - context['api_metrics_started']
+        metadata = parsed.get('ResponseMetadata', {})
+        size = metadata.get('HTTPHeaders', {}).get('content-length') or http_response.headers.get('content-length') or 0
+        with self._lock:
+            metrics = self._metrics(key)
+            metrics.observe(elapsed)
+            metrics.retries += metadata.get('RetryAttempts', 0)
+            metrics.bytes += int(size)
+            if 'Error' in parsed:
+                metrics.errors += 1
+
+    def _after_call_error(self, context, **kwargs):
+        # Connection errors and timeouts that exhausted their retries
+        key = context.get('api_metrics_key')
+        if key is None:
+            return
+        with self._lock:
+            metrics = self._metrics(key)
+            metrics.observe(time.perf_counter() - context['api_metrics_started'])
+            metrics.errors += 1
+
+    def _needs_retry(self, response=None, request_dict=None, **kwargs):
+        # Called after every attempt; only counts throttled ones, the retry decision is botocore's
+        if not response or not request_dict:
+            return None
+        key = request_dict.get('context', {}).get('api_metrics_key')
+        if key is not None and response[1].get('Error', {}).get('Code') in THROTTLE_CODES:
+            with self._lock:
+                self._metrics(key).throttles += 1
+        return None
+
+    def _by_operation(self):
+        """Metrics summed over regions and accounts, keyed by (service, operation)."""
+        totals = {}
+        for (service, operation, _, _), metrics in self.operations.items():
+            total = totals.setdefault((service, operation), OperationMetrics())
+            total.buckets = [a + b for a, b in zip(total.buckets, metrics.buckets)]
+            for field in ('calls', 'seconds', 'retries', 'throttles', 'errors', 'bytes'):
+                setattr(total, field, getattr(total, field) + getattr(metrics, field))
+        return totals
+
+    def report(self, top=10):
+        """Print the operations that took the most time, then the slowest region/account pairs."""
+        with self._lock:
+            by_operation = sorted(self._by_operation().items(), key=lambda item: item[1].seconds, reverse=True)
+            by_unit = sorted(self.operations.items(), key=lambda item: item[1].seconds, reverse=True)
+        total_seconds = sum(metrics.seconds for _, metrics in by_operation) or 1.0
+
+        print(f"Hot paths (API time summed over all threads: {total_seconds:.2f}s)")
+        print(f"  {'Operation':<42}{'Calls':>8}{'Time':>10}{'Share':>8}{'p50':>8}{'p95':>8}{'Retries':>9}{'Throttles':>11}{'MiB':>9}")
+        for (service, operation), metrics in by_operation[:top]:
+            print(f"  {service + '.' + operation:<42}{metrics.calls:>8}{metrics.seconds:>9.2f}s"
+                  f"{metrics.seconds / total_seconds:>8.0%}{format_bound(metrics.quantile(0.5)):>8}"
+                  f"{format_bound(metrics.quantile(0.95)):>8}{metrics.retries:>9}{metrics.throttles:>11}"
+                  f"{metrics.bytes / 1024 / 1024:>9.2f}")
+        print("  Slowest operation/region/account:")
+        for (service, operation, region, account_id), metrics in by_unit[:top]:
+            print(f"    {service}.{operation} {region or '-'} {account_id or '-'}: "
+                  f"{metrics.calls} calls, {metrics.seconds:.2f}s, {metrics.throttles} throttled")
+
+    def to_json(self):
+        with self._lock:
+            return [dict(service=service, operation=operation, region=region, account=account_id, **metrics.to_dict())
+                    for (service, operation, region, account_id), metrics in sorted(self.operations.items())]
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP aws_api_call_duration_seconds Duration of AWS API calls, retries included.',
+            '# TYPE aws_api_call_duration_seconds histogram',
+        ]
+        counters = []
+        with self._lock:
+            items = sorted(self.operations.items())
+        for (service, operation, region, account_id), metrics in items:
+            labels = f'service="{service}",operation="{operation}",region="{region}",account="{account_id}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'aws_api_call_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'aws_api_call_duration_seconds_sum{{{labels}}} {metrics.seconds}')
+            lines.append(f'aws_api_call_duration_seconds_count{{{labels}}} {metrics.calls}')
+            counters.append((labels, metrics))
+        for name, field, help_text in (
+                ('aws_api_call_retries_total', 'retries', 'Retried attempts of AWS API calls.'),
+                ('aws_api_call_throttles_total', 'throttles', 'Attempts rejected by AWS throttling.'),
+                ('aws_api_call_errors_total', 'errors', 'AWS API calls that failed.'),
+                ('aws_api_response_bytes_total', 'bytes', 'Response payload bytes of AWS API calls.')):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(f'{name}{{{labels}}} {getattr(metrics, field)}' for labels, metrics in counters)
+        return '\n'.join(lines) + '\n'
+
+
+def format_bound(seconds):
+    if seconds == float('inf'):
+        return f">{LATENCY_BUCKETS[-2]:g}s"
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:g}s"
+
+
+# Metrics of every client created through inventory_common.new_client
+api_metrics = ApiMetrics()
+
+
+def add_metrics_arguments(parser):
+    """Add the options controlling the API metrics report and exports."""
+    parser.add_argument('--hot-paths', type=int, default=10,
+                        help='Operations listed in the hot-path report (0 to disable; default: 10)')
+    parser.add_argument('--metrics-json', metavar='FILE', help='Write per-call API metrics to FILE as JSON')
+    parser.add_argument('--metrics-prometheus', metavar='FILE', help='Write per-call API metrics to FILE in Prometheus text format')
+    return parser
+
+
+def report_api_metrics(args, metrics=None):
+    """Print the hot-path report and write the exports requested on the command line."""
+    metrics = metrics or api_metrics
+    if args.hot_paths:
+        metrics.report(args.hot_paths)
+    if args.metrics_json:
+        with open(args.metrics_json, 'w') as file:
+            json.dump(metrics.to_json(), file, indent=1)
+        print(f"API metrics written to '{args.metrics_json}'.")
+    if args.metrics_prometheus:
+        with open(args.metrics_prometheus, 'w') as file:
+            file.write(metrics.to_prometheus())
+        print(f"API metrics written to '{args.metrics_prometheus}'.")
@@ -0,0 +1,157 @@
+"""Fleet capacity rollup: EC2 inventory rows joined with instance type specs.
+
+Reads EC2 inventory files written by the inventory scripts (csv, csv.gz,
+jsonl, parquet or arrow) and the instance type cache of
+Python_usefull_scripts/CPU-Memory-info-for-ITypes.py, and sums the instances,
+vCPUs, memory and EBS GiB (from 'Volume Sizes') of every account, region,
+Env, Grade and state:
+
+    python capacity-rollup.py 111111111111-inventory.csv --catalog instance_types_cache.json
+
+The join and the sums run as columnar pyarrow operations, so inventories of
+50k instances roll up in well under a second. Needs pyarrow.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+try:
+    import pyarrow
+    import pyarrow.compute as pc
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.json
+    import pyarrow.parquet
+except ImportError:
+    sys.exit("capacity-rollup.py needs pyarrow: pip install pyarrow")
+
+GROUP_BY = ['Account Number', 'Region', 'Env', 'Grade', 'State']
+INSTANCE_TYPE = 'Instance Type'
+VOLUME_SIZES = 'Volume Sizes'
+
+OUTPUT_FIELDS = ['Instances', 'vCPUs', 'Memory (GiB)', 'EBS (GiB)', 'Unknown Type Instances']
+
+
+def read_inventory(path, columns):
+    """The given columns of an inventory file, by format; columns it lacks are null."""
+    string_columns = [column for column in columns if column != VOLUME_SIZES]
+    if path.endswith('.parquet'):
+        names = pyarrow.parquet.read_schema(path).names
+        table = pyarrow.parquet.read_table(path, columns=[column for column in columns if column in names])
+    elif path.endswith('.arrow'):
+        with pyarrow.memory_map(path) as source:
+            table = pyarrow.ipc.open_file(source).read_all()
+    elif path.endswith(('.jsonl', '.jsonl.gz')):
+        # Volume Sizes is a list of GiB in JSON Lines; the other columns are strings
+        schema = pyarrow.schema([(column, pyarrow.string()) for column in string_columns]
+                                + [(VOLUME_SIZES, pyarrow.list_(pyarrow.int64()))])
+        table = pyarrow.json.read_json(path, parse_options=pyarrow.json.ParseOptions(
+            explicit_schema=schema, unexpected_field_behavior='ignore'))
+    else:
+        # Read as strings: account numbers keep their leading zeros
+        table = pyarrow.csv.read_csv(path, convert_options=pyarrow.csv.ConvertOptions(
+            include_columns=columns, include_missing_columns=True,
+            column_types={column: pyarrow.string() for column in columns}))
+    for column in columns:
+        if column not in table.column_names:
+            table = table.append_column(column, pyarrow.nulls(table.num_rows, pyarrow.string()))
+    return table.select(columns)
+
+
+def volume_sizes(column):
+    """(row index, GiB) of every volume in a Volume Sizes column."""
+    column = column.combine_chunks()
+    if not pyarrow.types.is_list(column.type):
+        # The CSV inventories render the sizes as "100GiB, 8GiB"
+        column = pc.split_pattern(column.cast(pyarrow.string()), ', ')
+    rows = pc.list_parent_indices(column)
+    sizes = pc.list_flatten(column)
+    if not pyarrow.types.is_integer(sizes.type):
+        sizes = pc.replace_substring(sizes.cast(pyarrow.string()), 'GiB', '')
+        numeric = pc.match_substring_regex(sizes, r'^\d+$')
+        rows, sizes = rows.filter(numeric), sizes.filter(numeric)
+    return rows, sizes.cast(pyarrow.int64())
+
+
+def load_inventories(paths, group_by):
+    """(instance table, volume table) of the inventory files, with string group columns."""
+    instance_tables, volume_tables = [], []
+    for path in paths:
+        table = read_inventory(path, group_by + [INSTANCE_TYPE, VOLUME_SIZES])
+        # Empty group values would not match in the joins below
+        keys = pyarrow.table({column: pc.fill_null(table[column].cast(pyarrow.string()), '') for column in group_by})
+        instance_tables.append(keys.append_column(INSTANCE_TYPE, table[INSTANCE_TYPE].cast(pyarrow.string())))
+        rows, sizes = volume_sizes(table[VOLUME_SIZES])
+        volume_tables.append(keys.take(rows).append_column('GiB', sizes))
+    return pyarrow.concat_tables(instance_tables), pyarrow.concat_tables(volume_tables)
+
+
+def load_catalog(cache_file):
+    """Specs of the instance type cache of CPU-Memory-info-for-ITypes.py, as a table."""
+    with open(cache_file) as file:
+        cache = json.load(file)
+    specs = {}
+    for region_cache in cache.values():
+        for instance_type, spec in region_cache.items():
+            # An instance type has the same specs in every region; types the API rejected have none
+            if not spec.get('Invalid'):
+                specs.setdefault(instance_type, spec)
+    return pyarrow.table({
+        INSTANCE_TYPE: pyarrow.array(list(specs), pyarrow.string()),
+        'VCpus': pyarrow.array([spec['VCpus'] for spec in specs.values()], pyarrow.int64()),
+        'MemoryMiB': pyarrow.array([spec['MemoryMiB'] for spec in specs.values()], pyarrow.int64()),
+    })
+
+
+def rollup(instances, volumes, catalog, group_by):
+    """Capacity per group: one vectorized join with the catalog and two grouped sums."""
+    joined = instances.join(catalog, INSTANCE_TYPE, join_type='left outer')
+    joined = joined.append_column('Unknown', pc.is_null(joined['VCpus']).cast(pyarrow.int64()))
+    capacity = joined.group_by(group_by).aggregate([
+        (INSTANCE_TYPE, 'count', pc.CountOptions(mode='all')),
+        ('VCpus', 'sum'), ('MemoryMiB', 'sum'), ('Unknown', 'sum')])
+    ebs = volumes.group_by(group_by).aggregate([('GiB', 'sum')])
+    result = capacity.join(ebs, group_by, join_type='left outer')
+    return result.sort_by([(column, 'ascending') for column in group_by]), joined
+
+
+def write_rollup(result, group_by, output_file):
+    with open(output_file, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=group_by + OUTPUT_FIELDS)
+        writer.writeheader()
+        for row in result.to_pylist():
+            writer.writerow({
+                **{column: row[column] for column in group_by},
+                'Instances': row[f'{INSTANCE_TYPE}_count'],
+                'vCPUs': row['VCpus_sum'] or 0,
+                'Memory (GiB)': round((row['MemoryMiB_sum'] or 0) / 1024, 1),  # Convert MiB to GiB
+                'EBS (GiB)': row['GiB_sum'] or 0,
+                'Unknown Type Instances': row['Unknown_sum'],
+            })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sum vCPU, memory and EBS capacity of EC2 inventories per group')
+    parser.add_argument('inventories', nargs='+', help='EC2 inventory files (csv, csv.gz, jsonl, parquet or arrow)')
+    parser.add_argument('--catalog', default='instance_types_cache.json',
+                        help='Instance type cache of CPU-Memory-info-for-ITypes.py (default: instance_types_cache.json)')
+    parser.add_argument('--group-by', default=','.join(GROUP_BY),
+                        help=f"Comma-separated inventory columns to group by (default: {','.join(GROUP_BY)})")
+    parser.add_argument('--output', default='capacity_rollup.csv', help='CSV file to write (default: capacity_rollup.csv)')
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    group_by = [column.strip() for column in args.group_by.split(',') if column.strip()]
+    instances, volumes = load_inventories(args.inventories, group_by)
+    result, joined = rollup(instances, volumes, load_catalog(args.catalog), group_by)
+    write_rollup(result, group_by, args.output)
+
+    unknown = joined.filter(pc.equal(joined['Unknown'], 1))
+    if unknown.num_rows:
+        types = ', '.join(sorted(str(value) for value in pc.unique(unknown[INSTANCE_TYPE]).to_pylist()))
+        print(f"Warning: {unknown.num_rows} instances have types missing from '{args.catalog}' ({types}); "
+              f"run CPU-Memory-info-for-ITypes.py --prefetch to cache them.")
+    print(f"Rolled up {instances.num_rows} instances into {result.num_rows} groups in "
+          f"{time.monotonic() - started:.2f}s; CSV file '{args.output}' has been created successfully.")
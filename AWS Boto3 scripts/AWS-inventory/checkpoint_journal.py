@@ -0,0 +1,190 @@
+"""Checkpoint journal of the inventory runs, used by --resume.
+
+With --checkpoint-db, every (account, region, collector) unit that completes
+is stored in SQLite with its rows, as soon as it completes. A run interrupted by an expired
+role, throttling or Ctrl-C can then be rerun with --resume: completed units
+are read back from the journal instead of being scanned again, and the
+output files are assembled from journaled and newly scanned rows. A run
+that completes removes its units again, so only interrupted runs can be
+resumed, and only within RESUME_MAX_AGE_HOURS of their start.
+"""
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Journal used by --resume when --checkpoint-db is given without a path, or not at all
+DEFAULT_CHECKPOINT_DB = 'inventory_checkpoint.db'
+
+# Options that change the rows collected; units journaled with other values are not resumed
+ROW_OPTIONS = ('select', 'required_tags', 'config_aggregator')
+
+# Journals of runs started longer ago hold too stale an inventory to resume
+RESUME_MAX_AGE_HOURS = 24
+
+
+def encode_value(value):
+    # Rows are JSON; datetimes (e.g. LaunchTime) are tagged so they decode back to datetimes
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    raise TypeError(f"Cannot journal a {type(value).__name__} value")
+
+
+def decode_object(obj):
+    if len(obj) == 1 and '$datetime' in obj:
+        return datetime.datetime.fromisoformat(obj['$datetime'])
+    return obj
+
+
+def encode_rows(rows):
+    return json.dumps(rows, default=encode_value, separators=(',', ':'))
+
+
+def decode_rows(data):
+    return json.loads(data, object_hook=decode_object)
+
+
+def options_signature(options):
+    values = {name: getattr(options, name, None) for name in ROW_OPTIONS}
+    # A Selector is compared by its expression
+    return repr(sorted((name, getattr(value, 'text', value)) for name, value in values.items()))
+
+
+class CheckpointJournal:
+    """SQLite table of the completed units of a run, with their rows.
+
+    Rows are stored as JSON with tagged datetimes, so they come back as the
+    collectors produced them. Units are written from the scanning threads
+    and committed one by one. A run is identified by its collector names;
+    runs of different collectors can share one journal file.
+    """
+
+    def __init__(self, path, signature, collectors):
+        self.path = path
+        self.signature = signature
+        self.run_key = ','.join(sorted(collectors))
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            -- Commits survive a crash of the script, which is what the journal is for, without an fsync each
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS runs (
+                collectors TEXT PRIMARY KEY,
+                started_at REAL NOT NULL
+            );
+            -- Region lists are kept per run, as runs of other collectors may scan other regions
+            CREATE TABLE IF NOT EXISTS regions (
+                collectors TEXT NOT NULL,
+                account TEXT NOT NULL,
+                regions TEXT NOT NULL,
+                PRIMARY KEY (collectors, account)
+            );
+            CREATE TABLE IF NOT EXISTS units (
+                account TEXT NOT NULL,
+                region TEXT NOT NULL,
+                collector TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                rows TEXT NOT NULL,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (account, region, collector)
+            );
+        """)
+        self._lock = threading.Lock()
+        self.resumed = 0
+        self.recorded = 0
+        self.finished = False
+
+    def start(self, collectors, accounts):
+        """Forget the units of collectors in accounts, for a run that starts over."""
+        with self._lock:
+            self._forget(collectors, accounts)
+            self.conn.execute('INSERT OR REPLACE INTO runs VALUES (?, ?)', (self.run_key, time.time()))
+            self.conn.commit()
+
+    def resumable(self):
+        """Why the interrupted run of these collectors cannot be resumed, or None if it can."""
+        with self._lock:
+            row = self.conn.execute('SELECT started_at FROM runs WHERE collectors = ?', (self.run_key,)).fetchone()
+        if row is None:
+            return f"'{self.path}' holds no interrupted run of these inventories; the last one completed or never started"
+        age_hours = (time.time() - row[0]) / 3600
+        if age_hours > RESUME_MAX_AGE_HOURS:
+            return (f"the interrupted run in '{self.path}' started {age_hours:.0f} hours ago, "
+                    f"more than {RESUME_MAX_AGE_HOURS}; its inventory is too stale to resume")
+        return None
+
+    def finish(self, collectors, accounts):
+        """Forget a completed run; the file is removed once it holds no other run."""
+        with self._lock:
+            self._forget(collectors, accounts)
+            self.conn.execute('DELETE FROM runs WHERE collectors = ?', (self.run_key,))
+            self.conn.commit()
+            remaining = self.conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+            self.finished = True
+            if remaining:
+                return
+            self.conn.close()
+            self.conn = None
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def _forget(self, collectors, accounts):
+        for account in accounts:
+            self.conn.execute('DELETE FROM regions WHERE collectors = ? AND account = ?', (self.run_key, account))
+            self.conn.executemany('DELETE FROM units WHERE account = ? AND collector = ?',
+                                  [(account, collector) for collector in collectors])
+
+    def regions(self, account):
+        """Regions listed for account by an earlier run of these collectors, or None."""
+        with self._lock:
+            row = self.conn.execute('SELECT regions FROM regions WHERE collectors = ? AND account = ?',
+                                    (self.run_key, account)).fetchone()
+        return row[0].split(',') if row else None
+
+    def record_regions(self, account, regions):
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO regions VALUES (?, ?, ?)', (self.run_key, account, ','.join(regions)))
+            self.conn.commit()
+
+    def completed(self, account, region, collectors=None):
+        """{collector: rows} of the units of account/region completed with the same options."""
+        with self._lock:
+            found = self.conn.execute(
+                'SELECT collector, rows FROM units WHERE account = ? AND region = ? AND signature = ?',
+                (account, region, self.signature)).fetchall()
+        units = {collector: decode_rows(rows) for collector, rows in found
+                 if collectors is None or collector in collectors}
+        with self._lock:
+            self.resumed += len(units)
+        return units
+
+    def pending(self, account, regions, collectors):
+        """True if a unit of account is not completed yet."""
+        with self._lock:
+            done = self.conn.execute('SELECT COUNT(*) FROM units WHERE account = ? AND signature = ? AND collector IN '
+                                     f"({', '.join('?' for _ in collectors)})",
+                                     [account, self.signature] + list(collectors)).fetchone()[0]
+        return done < len(regions) * len(collectors)
+
+    def record(self, account, region, collector, rows):
+        data = encode_rows(rows)
+        with self._lock:
+            if self.conn is None:  # Closed by an interrupted run
+                return
+            self.conn.execute('INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?, ?)',
+                              (account, region, collector, self.signature, data, time.time()))
+            self.conn.commit()
+            self.recorded += 1
+
+    def close(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def report(self):
+        state = 'cleared, the run completed' if self.finished else 'kept for --resume'
+        print(f"Checkpoint journal '{self.path}': {self.resumed} units resumed, {self.recorded} units scanned; {state}")
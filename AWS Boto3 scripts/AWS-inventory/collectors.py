@@ -0,0 +1,484 @@
+"""Resource collectors run by inventory_engine.
+
+Each collector turns the describe_* data of one (account, region) into CSV
+rows. Collectors share a RegionContext, so a resource type needed by several
+collectors (e.g. instances for both EC2 and VPC inventories) is fetched once.
+"""
+from botocore.exceptions import ClientError
+
+from inventory_common import paginate, volumes_by_instance
+from inventory_index import DEFAULT_INDEX_DB, FIELDS as INDEX_FIELDS, IndexSink, instance_record
+from output_formats import BOOLEAN, GIB, GIB_LIST, STRING_LIST, TIMESTAMP
+from rate_limiter import rate_limiters
+from vpc_topology import DEFAULT_TOPOLOGY_DB, NODE_FIELDS as TOPOLOGY_FIELDS, TopologySink, topology_records
+
+# Tags reported as columns by the cross-account inventories
+REQUIRED_TAGS = ['Name', 'Env', 'Grade', 'Application', 'Environment', 'Product']
+
+COLLECTORS = {}
+
+
+class Collector:
+    """A registered collector and the output it produces."""
+
+    def __init__(self, name, func, fieldnames, filename, key_fields, tag_columns=False, column_types=None, sink_options=None,
+                 sink_factory=None):
+        self.name = name
+        self.func = func
+        self.base_fieldnames = fieldnames
+        self.filename = filename
+        self.key_fields = key_fields
+        self.tag_columns = tag_columns
+        self.column_types = column_types or {}
+        self.sink_options = sink_options or {}
+        self.sink_factory = sink_factory
+
+    def fieldnames(self, options):
+        if self.tag_columns:
+            return self.base_fieldnames + required_tags(options)
+        return self.base_fieldnames
+
+    def collect(self, context, options):
+        return self.func(context, options)
+
+
+def register_collector(name, fieldnames, filename, key_fields, tag_columns=False, column_types=None, sink_factory=None,
+                       **sink_options):
+    """Decorator registering a collector function(context, options) -> rows under name.
+
+    column_types maps non-string columns to an output_formats type, e.g. TIMESTAMP.
+    sink_factory(options), if given, replaces the file sink of the collector.
+    """
+    def decorator(func):
+        COLLECTORS[name] = Collector(name, func, fieldnames, filename, key_fields, tag_columns, column_types, sink_options,
+                                     sink_factory)
+        return func
+    return decorator
+
+
+def required_tags(options):
+    return getattr(options, 'required_tags', None) or REQUIRED_TAGS
+
+
+def tag_dict(tags):
+    """Turn an AWS [{'Key': ..., 'Value': ...}] tag list into a dict."""
+    return {tag['Key']: tag['Value'] for tag in tags or []}
+
+
+def get_name_tag(tags):
+    """Helper function to get the 'Name' tag from a list of tags."""
+    return tag_dict(tags).get('Name')
+
+
+def selected_instances(context, options):
+    """(owner account, instance) pairs of the region, narrowed by --select.
+
+    The server-side part of the selector is sent as the API Filters; the
+    rest is applied here. Collectors of the same region share the result.
+    """
+    selector = getattr(options, 'select', None)
+    filters = selector.filters('ec2') if selector else []
+    params = {'Filters': filters} if filters else {}
+
+    def select():
+        reservations = context.records('ec2', 'describe_instances', 'Reservations', **params)
+        instances = [(reservation['OwnerId'], instance) for reservation in reservations for instance in reservation['Instances']]
+        if not selector:
+            return instances
+        kept = [(owner, instance) for owner, instance in instances
+                if selector.matches('ec2', instance, tag_dict(instance.get('Tags')))]
+        selector.count('ec2', [instance for _, instance in instances], len(kept))
+        return kept
+    return context.cached(('selected_instances', repr(params)), select)
+
+
+def volume_info(context, instance_id):
+    """Return the 'Volume IDs' and 'Volume Sizes' (GiB) columns for an instance, as lists."""
+    volume_index = context.cached('volume_index', lambda: volumes_by_instance(context.records('ec2', 'describe_volumes', 'Volumes')))
+    volumes = volume_index.get(instance_id, [])
+    return [volume['VolumeId'] for volume in volumes], [volume['Size'] for volume in volumes]
+
+
+# ---------------------------------------------------------------------------
+# EC2
+# ---------------------------------------------------------------------------
+
+EC2_COLUMN_TYPES = {'Launchdate': TIMESTAMP, 'Volume IDs': STRING_LIST, 'Volume Sizes': GIB_LIST}
+
+def ec2_account_filename(first_row):
+    """Name the file after the account of the first instance found, e.g. 'accountnumber-inventory.csv'."""
+    account_number = first_row['Account Number'] if first_row else 'unknown'
+    return f"{account_number}-inventory.csv"
+
+
+@register_collector(
+    'ec2-account',
+    fieldnames=['Account Number', 'Role', 'Instance Name', 'Grade', 'Env', 'Private IP', 'Instance ID', 'AZ', 'Region', 'State', 'State Transition Reason', 'Public IP', 'Launchdate', 'Instance Type', 'OS', 'KeyName', 'Volume IDs', 'Volume Sizes'],
+    filename=ec2_account_filename,
+    key_fields=('Account Number', 'Region', 'Instance ID'),
+    column_types=EC2_COLUMN_TYPES,
+)
+def collect_ec2_account(context, options):
+    """EC2 instances in the layout of AWS-ec2-inventory-ec2-single-account.py."""
+    rows = []
+    # account_number is the owner of the instance's reservation
+    for account_number, instance in selected_instances(context, options):
+        tags = tag_dict(instance.get('Tags'))
+        volume_ids_info, volume_sizes_info = volume_info(context, instance['InstanceId'])
+        rows.append({
+            'Account Number': account_number,
+            'Role': tags.get('Role', ''),
+            'Instance Name': tags.get('Name', ''),
+            'Grade': tags.get('Grade', 'N/A'),
+            'Env': tags.get('Env', 'N/A'),
+            'Private IP': instance.get('PrivateIpAddress', ''),
+            'Instance ID': instance['InstanceId'],
+            'AZ': instance['Placement']['AvailabilityZone'],
+            'Region': context.region,
+            'State': instance['State']['Name'],
+            'State Transition Reason': instance.get('StateTransitionReason', 'N/A'),
+            'Public IP': instance.get('PublicIpAddress', ''),
+            'Launchdate': instance['LaunchTime'],
+            'Instance Type': instance['InstanceType'],
+            'OS': instance.get('Platform', 'Linux/Unix'),  # Default to Linux/Unix if 'Platform' doesn't exist
+            'KeyName': instance.get('KeyName', 'N/A'),
+            'Volume IDs': volume_ids_info,
+            'Volume Sizes': volume_sizes_info
+        })
+    return rows
+
+
+@register_collector(
+    'ec2',
+    fieldnames=['Account Number', 'Private IP', 'Instance ID', 'AZ', 'Region', 'State', 'Public IP', 'Launchdate', 'State Transition Reason', 'Instance Type', 'OS', 'KeyName', 'Volume IDs', 'Volume Sizes'],
+    filename='organization-inventory-withtags-2.csv',
+    key_fields=('Account Number', 'Region', 'Instance ID'),
+    tag_columns=True,
+    column_types=EC2_COLUMN_TYPES,
+)
+def collect_ec2(context, options):
+    """EC2 instances in the layout of AWS_inventory_accross_account-ec2.py."""
+    rows = []
+    for _, instance in selected_instances(context, options):
+        tags = tag_dict(instance.get('Tags'))
+        volume_ids_info, volume_sizes_info = volume_info(context, instance['InstanceId'])
+        rows.append({
+            'Account Number': context.account_id,
+            'Private IP': instance.get('PrivateIpAddress', 'N/A'),
+            'Instance ID': instance['InstanceId'],
+            'AZ': instance['Placement']['AvailabilityZone'],
+            'Region': context.region,
+            'State': instance['State']['Name'],
+            'Public IP': instance.get('PublicIpAddress', 'N/A'),
+            'Launchdate': instance['LaunchTime'],
+            'State Transition Reason': instance.get('StateTransitionReason', 'N/A'),
+            'Instance Type': instance['InstanceType'],
+            'OS': instance.get('Platform', 'Linux/Unix'),  # Default to Linux/Unix if 'Platform' doesn't exist
+            'KeyName': instance.get('KeyName', 'N/A'),
+            'Volume IDs': volume_ids_info,
+            'Volume Sizes': volume_sizes_info,
+            **{tag: tags.get(tag, 'N/A') for tag in required_tags(options)}
+        })
+    return rows
+
+
+@register_collector(
+    'instance-index',
+    fieldnames=INDEX_FIELDS,
+    filename=None,
+    key_fields=('account', 'region', 'instance_id'),
+    # A --select run only sees part of each region, so it must not prune the rest
+    sink_factory=lambda options: IndexSink(getattr(options, 'index_db', None) or DEFAULT_INDEX_DB,
+                                           prune=not getattr(options, 'select', None)),
+)
+def collect_instance_index(context, options):
+    """Instances for the local lookup index (--index-db), see inventory_index.py."""
+    return [instance_record(instance, context.account_id, context.region)
+            for _, instance in selected_instances(context, options)]
+
+
+# ---------------------------------------------------------------------------
+# RDS
+# ---------------------------------------------------------------------------
+
+def sweep_rds_tags(context):
+    """Tags of every tagged RDS instance and cluster in the region, keyed by ARN.
+
+    One paginated Resource Groups Tagging API sweep replaces a
+    list_tags_for_resource call per resource. Returns None when the sweep is
+    not allowed, so callers fall back to the per-resource call.
+    """
+    tagging = context.client('resourcegroupstaggingapi')
+    try:
+        return {mapping['ResourceARN']: tag_dict(mapping.get('Tags'))
+                for mapping in paginate(tagging, 'get_resources', 'ResourceTagMappingList',
+                                        ResourceTypeFilters=['rds:db', 'rds:cluster'])}
+    except ClientError as e:
+        print(f"Tagging API unavailable in region {context.region}, listing RDS tags per resource: {e}")
+        return None
+
+
+def rds_tags(context, resource, arn_key):
+    """Tags of an RDS instance or cluster, using the cheapest source available."""
+    # Current API versions return the tags with the describe_* response
+    if 'TagList' in resource:
+        return tag_dict(resource['TagList'])
+    tags_by_arn = context.cached('rds_tag_sweep', lambda: sweep_rds_tags(context))
+    if tags_by_arn is not None:
+        return tags_by_arn.get(resource[arn_key], {})  # Resources without tags are not in the sweep
+    tags_response = rate_limiters.call(context.client('rds'), 'list_tags_for_resource', ResourceName=resource[arn_key])
+    return tag_dict(tags_response.get('TagList'))
+
+
+def selected_rds(context, options, kind, operation, result_key, arn_key):
+    """(record, tags) pairs of an RDS describe_* call, narrowed by --select."""
+    selector = getattr(options, 'select', None)
+    filters = selector.filters(kind) if selector else []
+    records = context.records('rds', operation, result_key, **({'Filters': filters} if filters else {}))
+    pairs = [(record, rds_tags(context, record, arn_key)) for record in records]
+    if not selector:
+        return pairs
+    kept = [(record, tags) for record, tags in pairs if selector.matches(kind, record, tags)]
+    selector.count(kind, [record for record, _ in pairs], len(kept))
+    return kept
+
+
+@register_collector(
+    'rds',
+    fieldnames=['Account Number', 'DBInstanceIdentifier', 'Engine', 'Engine Version', 'DB Class', 'Status', 'Region', 'AZ', 'Storage', 'Endpoint', 'VPC', 'Creation Time'],
+    filename='organization-rds-inventory-2.csv',
+    key_fields=('Account Number', 'Region', 'DBInstanceIdentifier'),
+    tag_columns=True,
+    column_types={'Storage': GIB, 'Creation Time': TIMESTAMP},
+)
+def collect_rds(context, options):
+    """RDS DB instances in the layout of AWS_inventory_accross_account-rds.py."""
+    rows = []
+    for instance, tags in selected_rds(context, options, 'rds', 'describe_db_instances', 'DBInstances', 'DBInstanceArn'):
+        db_instance_id = instance['DBInstanceIdentifier']
+        db_endpoint = instance.get('Endpoint', {}).get('Address', 'N/A')  # Handle missing Address
+
+        # Log missing endpoint addresses
+        if db_endpoint == 'N/A':
+            print(f"Endpoint Address missing for DBInstanceIdentifier: {db_instance_id}")
+
+        rows.append({
+            'Account Number': context.account_id,
+            'DBInstanceIdentifier': db_instance_id,
+            'Engine': instance['Engine'],
+            'Engine Version': instance['EngineVersion'],
+            'DB Class': instance['DBInstanceClass'],
+            'Status': instance['DBInstanceStatus'],
+            'Region': context.region,
+            'AZ': instance['AvailabilityZone'],
+            'Storage': instance['AllocatedStorage'],
+            'Endpoint': db_endpoint,
+            'VPC': instance['DBSubnetGroup']['VpcId'],
+            'Creation Time': instance['InstanceCreateTime'],
+            **{tag: tags.get(tag, 'N/A') for tag in required_tags(options)}
+        })
+    return rows
+
+
+@register_collector(
+    'rds-clusters',
+    fieldnames=['Account Number', 'DBClusterIdentifier', 'Engine', 'Engine Version', 'Engine Mode', 'Status', 'Region', 'Multi-AZ', 'Writer', 'Readers', 'Endpoint', 'Reader Endpoint', 'DB Subnet Group', 'Creation Time'],
+    filename='organization-rds-cluster-inventory.csv',
+    key_fields=('Account Number', 'Region', 'DBClusterIdentifier'),
+    tag_columns=True,
+    column_types={'Multi-AZ': BOOLEAN, 'Writer': STRING_LIST, 'Readers': STRING_LIST, 'Creation Time': TIMESTAMP},
+)
+def collect_rds_clusters(context, options):
+    """Aurora (and Multi-AZ) DB clusters with their writer and reader instances."""
+    rows = []
+    for cluster, tags in selected_rds(context, options, 'rds-cluster', 'describe_db_clusters', 'DBClusters', 'DBClusterArn'):
+        members = cluster.get('DBClusterMembers', [])
+        rows.append({
+            'Account Number': context.account_id,
+            'DBClusterIdentifier': cluster['DBClusterIdentifier'],
+            'Engine': cluster['Engine'],
+            'Engine Version': cluster['EngineVersion'],
+            'Engine Mode': cluster.get('EngineMode', 'provisioned'),
+            'Status': cluster['Status'],
+            'Region': context.region,
+            'Multi-AZ': cluster.get('MultiAZ', False),
+            'Writer': [m['DBInstanceIdentifier'] for m in members if m.get('IsClusterWriter')],
+            'Readers': [m['DBInstanceIdentifier'] for m in members if not m.get('IsClusterWriter')],
+            'Endpoint': cluster.get('Endpoint', 'N/A'),
+            'Reader Endpoint': cluster.get('ReaderEndpoint', 'N/A'),
+            'DB Subnet Group': cluster.get('DBSubnetGroup', 'N/A'),
+            'Creation Time': cluster['ClusterCreateTime'],
+            **{tag: tags.get(tag, 'N/A') for tag in required_tags(options)}
+        })
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# VPC
+# ---------------------------------------------------------------------------
+
+VPC_FIELDNAMES = ['Region', 'VpcId', 'VpcName', 'ResourceType', 'ResourceId', 'ResourceName']
+
+
+def get_vpc_ids(resource):
+    """Helper function to get the VPC a resource belongs to, as a list."""
+    return [resource['VpcId']] if resource.get('VpcId') else []
+
+
+# Resource types reported for each VPC, in output order:
+# (ResourceType, describe operation, result key, vpc filter name, ID key, function returning the resource's VPC IDs)
+VPC_RESOURCE_TYPES = [
+    ('Subnet', 'describe_subnets', 'Subnets', 'vpc-id', 'SubnetId', get_vpc_ids),
+    ('RouteTable', 'describe_route_tables', 'RouteTables', 'vpc-id', 'RouteTableId', get_vpc_ids),
+    ('InternetGateway', 'describe_internet_gateways', 'InternetGateways', 'attachment.vpc-id', 'InternetGatewayId',
+     lambda igw: [attachment['VpcId'] for attachment in igw.get('Attachments', [])]),
+    ('SecurityGroup', 'describe_security_groups', 'SecurityGroups', 'vpc-id', 'GroupId', get_vpc_ids),
+    ('EC2Instance', 'describe_instances', 'Reservations', 'vpc-id', 'InstanceId', get_vpc_ids),
+    ('NetworkAcl', 'describe_network_acls', 'NetworkAcls', 'vpc-id', 'NetworkAclId', get_vpc_ids),
+    ('VpcPeeringConnection', 'describe_vpc_peering_connections', 'VpcPeeringConnections', 'requester-vpc-info.vpc-id', 'VpcPeeringConnectionId',
+     lambda pc: [pc['RequesterVpcInfo']['VpcId']] if pc.get('RequesterVpcInfo', {}).get('VpcId') else []),
+    ('NatGateway', 'describe_nat_gateways', 'NatGateways', 'vpc-id', 'NatGatewayId', get_vpc_ids),
+    ('VpcEndpoint', 'describe_vpc_endpoints', 'VpcEndpoints', 'vpc-id', 'VpcEndpointId', get_vpc_ids),
+]
+
+
+def describe_vpc_resources(context, resource_spec, vpc_id=None):
+    """Return every resource of one type in the region, or only those in vpc_id if given."""
+    resource_type, operation, result_key, filter_name, id_key, vpc_ids_of = resource_spec
+    if vpc_id:
+        # describe_nat_gateways names its filter parameter 'Filter' instead of 'Filters'
+        filter_param = 'Filter' if operation == 'describe_nat_gateways' else 'Filters'
+        resources = context.records('ec2', operation, result_key,
+                                    **{filter_param: [{'Name': filter_name, 'Values': [vpc_id]}]})
+    else:
+        # Unfiltered results are shared with other collectors scanning the same region
+        resources = context.records('ec2', operation, result_key)
+    if operation == 'describe_instances':
+        resources = [instance for reservation in resources for instance in reservation['Instances']]
+    return resources
+
+
+def to_resource_row(resource_spec, resource):
+    resource_type, id_key = resource_spec[0], resource_spec[4]
+    if resource_type == 'SecurityGroup':
+        name = resource['GroupName']  # Security Groups usually have a GroupName instead of a Name tag
+    else:
+        name = get_name_tag(resource.get('Tags', []))
+    return {'ResourceType': resource_type, 'ResourceId': resource[id_key], 'ResourceName': name}
+
+
+def describe_vpc_resource_rows(context, resource_spec, vpc_id=None):
+    """Rows for one resource type; a failure skips the type, keeping the rest of the region."""
+    try:
+        return [(resource, to_resource_row(resource_spec, resource))
+                for resource in describe_vpc_resources(context, resource_spec, vpc_id)]
+    except ClientError as e:
+        scope = f"VPC {vpc_id}" if vpc_id else f"region {context.region}"
+        print(f"Skipping {resource_spec[0]} resources in {scope}: {e}")
+        context.failures += 1
+        return []
+
+
+def group_resources_by_vpc(context):
+    """Fetch each resource type once for the whole region and index the rows by VPC ID."""
+    resources_by_vpc = {}
+    for resource_spec in VPC_RESOURCE_TYPES:
+        vpc_ids_of = resource_spec[5]
+        for resource, row in describe_vpc_resource_rows(context, resource_spec):
+            for vpc_id in vpc_ids_of(resource):
+                resources_by_vpc.setdefault(vpc_id, []).append(row)
+    return resources_by_vpc
+
+
+def selected_vpcs(context, options):
+    selector = getattr(options, 'select', None)
+    filters = selector.filters('vpc') if selector else []
+    vpcs = list(context.records('ec2', 'describe_vpcs', 'Vpcs', **({'Filters': filters} if filters else {})))
+    if not selector:
+        return vpcs
+    kept = [vpc for vpc in vpcs if selector.matches('vpc', vpc, tag_dict(vpc.get('Tags')))]
+    selector.count('vpc', vpcs, len(kept))
+    return kept
+
+
+def collect_vpc(context, options):
+    """VPCs and their network components, one row per (VPC, resource)."""
+    bulk = not getattr(options, 'per_vpc', False)
+    try:
+        # Fetch the VPCs in the region, narrowed by --select
+        vpcs = selected_vpcs(context, options)
+
+        if not vpcs:
+            return []  # No VPCs in this region
+
+        # In bulk mode each resource type costs one paginated call per region,
+        # however many VPCs there are; otherwise every type is queried per VPC
+        if bulk:
+            print(f"Fetching details for {len(vpcs)} VPCs in region {context.region}...")
+            resources_by_vpc = group_resources_by_vpc(context)
+
+        region_vpc_details = []
+
+        for vpc in vpcs:
+            vpc_id = vpc['VpcId']
+            vpc_name = get_name_tag(vpc.get('Tags', []))
+
+            if bulk:
+                resources = resources_by_vpc.get(vpc_id, [])
+            else:
+                print(f"Fetching details for VPC {vpc_id} in region {context.region}...")
+                resources = [row for resource_spec in VPC_RESOURCE_TYPES
+                             for _, row in describe_vpc_resource_rows(context, resource_spec, vpc_id)]
+
+            for resource in resources:
+                region_vpc_details.append({
+                    'Account Number': context.account_id,
+                    'Region': context.region,
+                    'VpcId': vpc_id,
+                    'VpcName': vpc_name,
+                    'ResourceType': resource['ResourceType'],
+                    'ResourceId': resource['ResourceId'],
+                    'ResourceName': resource['ResourceName']
+                })
+
+        return region_vpc_details
+
+    except ClientError as e:
+        # Only reached when the VPCs themselves cannot be listed
+        print(f"An error occurred in region {context.region}: {e}")
+        context.failures += 1
+        return []
+
+
+# The single-account VPC inventory keeps its original columns; the
+# organization-wide variant adds the account the VPC belongs to
+register_collector(
+    'vpc',
+    fieldnames=VPC_FIELDNAMES,
+    filename='vpc_details.csv',
+    key_fields=(None, 'Region', ('VpcId', 'ResourceType', 'ResourceId')),
+    write_empty=False,
+)(collect_vpc)
+
+register_collector(
+    'vpc-org',
+    fieldnames=['Account Number'] + VPC_FIELDNAMES,
+    filename='organization-vpc-inventory.csv',
+    key_fields=('Account Number', 'Region', ('VpcId', 'ResourceType', 'ResourceId')),
+)(collect_vpc)
+
+
+@register_collector(
+    'vpc-topology',
+    fieldnames=TOPOLOGY_FIELDS,
+    filename=None,
+    key_fields=('account', 'region', 'node_id'),
+    sink_factory=lambda options: TopologySink(getattr(options, 'topology_db', None) or DEFAULT_TOPOLOGY_DB),
+)
+def collect_vpc_topology(context, options):
+    """Nodes and edges of the local VPC topology graph (--topology-db), see vpc_topology.py."""
+    # The same region-wide describe_* results as the bulk VPC inventory, whatever --select keeps
+    resources = {'Vpc': context.records('ec2', 'describe_vpcs', 'Vpcs')}
+    for resource_spec in VPC_RESOURCE_TYPES:
+        resources[resource_spec[0]] = [resource for resource, _ in describe_vpc_resource_rows(context, resource_spec)]
+    return topology_records(resources, context.account_id, context.region)
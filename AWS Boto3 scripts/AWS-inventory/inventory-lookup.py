@@ -0,0 +1,104 @@
+"""Look up EC2 instances in the local inventory index, falling back to the API.
+
+The index is written by the inventory scripts run with --index-db. Lookups
+by instance ID, Name tag or private IP are answered from it in milliseconds;
+IDs missing from the index, or indexed longer ago than --max-age-hours, are
+described through the EC2 API (unless --no-api) and added to the index.
+With --region, instances indexed in other regions are treated as missing.
+
+    python inventory-lookup.py i-0abc123 --field key_name --field private_ip
+    python inventory-lookup.py --name web-01 --json
+
+Prints one line per instance found: the requested fields separated by tabs
+(lists and tags as JSON), or the whole record with --json. Exits with status
+1 if an instance ID, name or IP was not found.
+"""
+import argparse
+import json
+import sys
+
+from inventory_index import DEFAULT_INDEX_DB, FIELDS, InventoryIndex, instance_record
+
+# Values accepted per describe_instances filter
+FILTER_BATCH_SIZE = 200
+
+
+def describe_instances(instance_ids, region=None):
+    """Index records of the instance IDs that exist, described through the EC2 API.
+
+    An instance-id filter is used instead of InstanceIds, so unknown IDs are
+    left out of the response instead of failing the call, and up to
+    FILTER_BATCH_SIZE IDs are described per call.
+    """
+    # Imported here so lookups answered by the index do not pay for loading boto3
+    from botocore.exceptions import ClientError
+    from inventory_common import new_client
+
+    ec2 = new_client('ec2', region)
+    paginator = ec2.get_paginator('describe_instances')
+    records = []
+    for start in range(0, len(instance_ids), FILTER_BATCH_SIZE):
+        batch = instance_ids[start:start + FILTER_BATCH_SIZE]
+        try:
+            for page in paginator.paginate(Filters=[{'Name': 'instance-id', 'Values': batch}]):
+                for reservation in page['Reservations']:
+                    records.extend(instance_record(instance, reservation['OwnerId'], ec2.meta.region_name)
+                                   for instance in reservation['Instances'])
+        except ClientError as e:
+            print(f"Could not describe instances through the API: {e}", file=sys.stderr)
+            break
+    return records
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    return json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Look up EC2 instances in the local inventory index')
+    parser.add_argument('instance_ids', nargs='*', metavar='INSTANCE_ID', help='Instance IDs to look up')
+    parser.add_argument('--name', help='Find instances by Name tag')
+    parser.add_argument('--ip', help='Find instances by private IP address')
+    parser.add_argument('--field', action='append', choices=FIELDS,
+                        help='Field to print, repeatable (default: instance_id, name, private_ip, state)')
+    parser.add_argument('--json', action='store_true', help='Print whole records as JSON lines')
+    parser.add_argument('--max-age-hours', type=float, default=24,
+                        help='Treat index entries older than this as missing (default: 24)')
+    parser.add_argument('--no-api', action='store_true', help='Only use the index; never call AWS')
+    parser.add_argument('--region', help='Only match instances of this region, also used by the API fallback '
+                                         '(default: any region in the index, the configured region for the API)')
+    parser.add_argument('--db', default=DEFAULT_INDEX_DB, help=f"Index database (default: {DEFAULT_INDEX_DB})")
+    args = parser.parse_args()
+
+    if not (args.instance_ids or args.name or args.ip):
+        parser.error('give instance IDs, --name or --ip')
+
+    index = InventoryIndex(args.db)
+    max_age = args.max_age_hours * 3600
+    found = True
+    records = []
+    if args.instance_ids:
+        by_id = index.get(args.instance_ids, max_age, region=args.region)
+        missing = [instance_id for instance_id in args.instance_ids if instance_id not in by_id]
+        if missing and not args.no_api:
+            fetched = describe_instances(missing, args.region)
+            index.upsert(fetched)
+            index.commit()
+            by_id.update(index.get([record['instance_id'] for record in fetched]))
+        records.extend(by_id[instance_id] for instance_id in args.instance_ids if instance_id in by_id)
+        found = all(instance_id in by_id for instance_id in args.instance_ids)
+    if args.name or args.ip:
+        matches = index.find(name=args.name, private_ip=args.ip, region=args.region, max_age=max_age)
+        records.extend(matches)
+        found = found and bool(matches)
+    index.close()
+
+    fields = args.field or ['instance_id', 'name', 'private_ip', 'state']
+    for record in records:
+        if args.json:
+            print(json.dumps(record))
+        else:
+            print('\t'.join(format_value(record[field]) for field in fields))
+    sys.exit(0 if found else 1)
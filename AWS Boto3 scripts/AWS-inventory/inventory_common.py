@@ -0,0 +1,224 @@
+"""Shared helpers for the inventory scripts in this directory."""
+import sys
+import threading
+from collections import Counter
+
+import boto3
+from botocore.credentials import RefreshableCredentials
+from botocore.exceptions import ClientError
+from botocore.session import get_session
+
+from api_metrics import add_metrics_arguments, api_metrics
+from checkpoint_journal import DEFAULT_CHECKPOINT_DB
+from inventory_index import DEFAULT_INDEX_DB
+from rate_limiter import is_throttle, rate_limiters
+from resource_selector import selector_argument
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# boto3 sessions are not thread-safe while creating clients, so creation is serialized
+_client_lock = threading.Lock()
+
+# Times paginate() resumes a scan that AWS throttled after botocore's own retries
+THROTTLE_RESUMES = 5
+
+
+class CallStats:
+    """Page and byte counters per API operation."""
+
+    def __init__(self):
+        self.pages = Counter()
+        self.bytes = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, operation, page):
+        headers = page.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+        with self._lock:
+            self.pages[operation] += 1
+            self.bytes[operation] += int(headers.get('content-length', 0))
+
+    def total_calls(self):
+        return sum(self.pages.values())
+
+    def report(self):
+        print(f"API calls made: {self.total_calls()}")
+        for operation in sorted(self.pages):
+            print(f"  {operation}: {self.pages[operation]} pages, {self.bytes[operation]} bytes")
+
+
+# Default counters used by paginate() when no stats object is passed
+call_stats = CallStats()
+
+
+def add_common_arguments(parser):
+    """Add the options shared by every inventory script to an argparse parser."""
+    parser.add_argument('--max-workers', type=int, default=1,
+                        help='Number of regions to scan in parallel (default: 1, sequential)')
+    parser.add_argument('--page-size', type=int, default=None,
+                        help='Records requested per describe_* page (default: service default)')
+    parser.add_argument('--format', default='csv', choices=['csv', 'csv.gz', 'jsonl', 'parquet', 'arrow'],
+                        help='Output format; parquet and arrow need pyarrow (default: csv)')
+    parser.add_argument('--since-last-run', action='store_true',
+                        help='Write only resources added, removed or changed since the previous run')
+    parser.add_argument('--snapshot-db', default='inventory_snapshots.db',
+                        help='SQLite snapshot store used by --since-last-run (default: inventory_snapshots.db)')
+    parser.add_argument('--api-rate-scale', type=float, default=1.0,
+                        help='Fraction of the documented AWS API rates to use per account/region/service (0 disables rate limiting)')
+    parser.add_argument('--select', type=selector_argument, metavar='EXPR',
+                        help="Only inventory matching resources, e.g. 'Grade=prod,state=running,Env in (a,b)'; "
+                             "see resource_selector.py")
+    parser.add_argument('--checkpoint-db', nargs='?', const=DEFAULT_CHECKPOINT_DB, default=None, metavar='PATH',
+                        help="Journal the rows of every completed account/region unit, so an interrupted run can be "
+                             "continued with --resume; the journal holds a second copy of the inventory until the "
+                             f"run completes and removes it (default path: {DEFAULT_CHECKPOINT_DB})")
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run of the last 24 hours started with --checkpoint-db: '
+                             'reuse the units completed in its journal')
+    parser.add_argument('--config-aggregator', metavar='NAME',
+                        help='Read the resources from this AWS Config aggregator with a few organization-wide queries '
+                             'instead of describe_* calls in every account and region; see inventory_sources.py')
+    parser.add_argument('--config-aggregator-region', metavar='REGION',
+                        help='Region of the --config-aggregator (default: the session region)')
+    parser.add_argument('--consistency-check', nargs='?', const='source_consistency.csv', default=None, metavar='PATH',
+                        help='With --config-aggregator, also collect every region with describe_* calls and write the '
+                             'differences between both sources (default path: source_consistency.csv)')
+    parser.add_argument('--index-db', nargs='?', const=DEFAULT_INDEX_DB, default=None, metavar='PATH',
+                        help=f"Also refresh the local instance index used by inventory-lookup.py (default path: {DEFAULT_INDEX_DB})")
+    add_metrics_arguments(parser)
+    return parser
+
+
+def add_account_arguments(parser):
+    """Add the options used by the cross-account inventory scripts."""
+    parser.add_argument('--max-accounts', type=int, default=1,
+                        help='Number of accounts to scan in parallel (default: 1, sequential)')
+    return parser
+
+
+def new_client(service, region_name=None, session=None, account_id=None, **client_kwargs):
+    """Create a client from session (or the default boto3 session) safely from any thread.
+
+    The client shares the rate limiter of its (account, region, service) and
+    reports its calls to api_metrics, labelled with account_id.
+    """
+    with _client_lock:
+        client = (session or boto3).client(service, region_name=region_name, **client_kwargs)
+    # The limiter hooks run first, so time spent waiting for it is not counted as API latency
+    rate_limiters.attach(client, account_id)
+    return api_metrics.attach(client, account_id)
+
+
+def list_regions(session=None):
+    """Return the names of all regions enabled for the account."""
+    ec2 = new_client('ec2', session=session)
+    return [region['RegionName'] for region in ec2.describe_regions()['Regions']]
+
+
+class AccountSessions:
+    """boto3 sessions per account, with assumed-role credentials cached for the run.
+
+    The caller's own account uses the default session. Other accounts get a
+    session whose credentials are refreshed with a new assume_role call shortly
+    before they expire, so long scans do not fail part-way through.
+    """
+
+    def __init__(self, role_name, role_session_name='CrossAccountSession'):
+        self.role_name = role_name
+        self.role_session_name = role_session_name
+        self._caller_account = None
+        self._sessions = {}
+        self._account_locks = {}
+        self._lock = threading.Lock()
+
+    def caller_account(self):
+        with self._lock:
+            if self._caller_account is None:
+                self._caller_account = new_client('sts').get_caller_identity()['Account']
+            return self._caller_account
+
+    def get(self, account_id):
+        with self._lock:
+            account_lock = self._account_locks.setdefault(account_id, threading.Lock())
+        # Regions asking for the same account at once share one assume_role call
+        with account_lock:
+            with self._lock:
+                session = self._sessions.get(account_id)
+            if session is None:
+                if account_id == self.caller_account():
+                    session = boto3.Session()  # Use default session for the main account
+                else:
+                    session = self._assume_role_session(account_id)  # Assume role for child accounts
+                with self._lock:
+                    self._sessions[account_id] = session
+        return session
+
+    def _assume_role_session(self, account_id):
+        role_arn = f"arn:aws:iam::{account_id}:role/{self.role_name}"
+
+        def fetch_credentials():
+            sts_client = new_client('sts')
+            credentials = sts_client.assume_role(RoleArn=role_arn, RoleSessionName=self.role_session_name)['Credentials']
+            return {
+                'access_key': credentials['AccessKeyId'],
+                'secret_key': credentials['SecretAccessKey'],
+                'token': credentials['SessionToken'],
+                'expiry_time': credentials['Expiration'].isoformat(),
+            }
+
+        credentials = RefreshableCredentials.create_from_metadata(
+            metadata=fetch_credentials(),
+            refresh_using=fetch_credentials,
+            method='sts-assume-role',
+        )
+        botocore_session = get_session()
+        botocore_session._credentials = credentials
+        return boto3.Session(botocore_session=botocore_session)
+
+
+def paginate(client, operation, result_key, page_size=None, stats=None, **kwargs):
+    """Yield every record under result_key across all pages of a describe_* call.
+
+    If AWS still throttles a page after botocore's retries, the scan waits for
+    the rate limiter's cooldown and resumes from that page instead of failing.
+    """
+    stats = stats or call_stats
+    pagination_config = {'PageSize': page_size} if page_size else {}
+    paginator = client.get_paginator(operation)
+    resumes = 0
+    while True:
+        try:
+            for page in paginator.paginate(PaginationConfig=pagination_config, **kwargs):
+                stats.record(operation, page)
+                yield from page.get(result_key, [])
+                # Single-token operations accept their raw token as StartingToken
+                next_token = page.get('NextToken') or page.get('Marker') or page.get('PaginationToken')
+                if next_token:
+                    pagination_config['StartingToken'] = next_token
+            return
+        except ClientError as e:
+            limiter = rate_limiters.for_client(client)
+            if not is_throttle(e) or limiter is None or resumes == THROTTLE_RESUMES:
+                raise
+            resumes += 1
+            limiter.wait_for_cooldown()
+
+
+def volumes_by_instance(volumes):
+    """Map instance ID -> attached volumes of one region-wide describe_volumes result."""
+    volume_index = {}
+    for volume in volumes:
+        for attachment in volume.get('Attachments', []):
+            volume_index.setdefault(attachment['InstanceId'], []).append(volume)
+    return volume_index
+
+
+def peak_rss_mib():
+    """Return the peak resident set size of this process in MiB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,307 @@
+"""Inventory engine shared by every inventory entry point in this directory.
+
+Accounts and regions are scheduled on one asyncio event loop; the blocking
+boto3 calls run on a shared thread pool. Every (account, region) unit runs all
+requested collectors against one RegionContext, so a single pass collects
+EC2, RDS and VPC data together and clients are reused across collectors.
+With --checkpoint-db, completed units are kept in a checkpoint journal, so an
+interrupted run can continue with --resume. The describe_* records come from the run's source
+(inventory_sources.py): direct calls, or an AWS Config aggregator.
+"""
+import asyncio
+import copy
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from checkpoint_journal import DEFAULT_CHECKPOINT_DB, CheckpointJournal, options_signature
+from collectors import COLLECTORS
+from inventory_common import AccountSessions, list_regions, new_client
+from inventory_index import DEFAULT_INDEX_DB, InventoryIndex
+from inventory_sources import ConsistencyCheck, DescribeSource, open_source
+from rate_limiter import rate_limiters
+from resource_selector import Selector
+from snapshot_store import open_sink
+
+# Collectors added to every run by the option naming their database, e.g. --index-db
+COMPANION_COLLECTORS = {'index_db': 'instance-index', 'topology_db': 'vpc-topology'}
+
+
+class RegionContext:
+    """Clients and memoized describe_* results for one (account, region) unit."""
+
+    def __init__(self, engine, session, account_id, region, source=None, shared=True):
+        self.engine = engine
+        self.session = session
+        self.account_id = account_id
+        self.region = region
+        self.page_size = engine.options.page_size
+        self.source = source or engine.source
+        # Collectors sharing the unit share its records; a lone collector streams them
+        self.shared = shared
+        # describe_* failures the collectors skipped over; rows of such a unit are partial
+        self.failures = 0
+        self._cache = {}
+
+    def client(self, service):
+        # Units served by an aggregator only assume the account's role if they fall back to describe_* calls
+        if self.session is None:
+            self.session = self.engine.sessions.get(self.account_id)
+        return self.engine.client(self.session, self.account_id, service, self.region)
+
+    def cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def records(self, service, operation, result_key, **kwargs):
+        """All records of a paginated describe_* call, as an iterable to read once.
+
+        When several collectors share the unit, the records are read once from
+        the source and kept for all of them; otherwise they stream page by page.
+        """
+        if not self.shared:
+            return self.source.records(self, service, operation, result_key, **kwargs)
+        key = (service, operation, repr(sorted(kwargs.items())))
+        return self.cached(key, lambda: list(self.source.records(self, service, operation, result_key, **kwargs)))
+
+
+class InventoryEngine:
+    """Runs registered collectors across accounts and regions and streams rows to sinks.
+
+    options is the argparse namespace of the entry point (see
+    inventory_common.add_common_arguments). Accounts run concurrently up to
+    --max-accounts, and each account scans up to --max-workers regions at once.
+    """
+
+    def __init__(self, options, role_name=None):
+        self.options = options
+        self.max_workers = max(1, options.max_workers)
+        self.max_accounts = max(1, getattr(options, 'max_accounts', 1))
+        self.sessions = AccountSessions(role_name)
+        rate_limiters.configure(getattr(options, 'api_rate_scale', 1.0))
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        # One connection pool per client, sized for the collectors sharing it
+        self._client_config = Config(max_pool_connections=max(10, self.max_workers))
+        self.journal = None
+        self.source = open_source(options)
+        self.consistency = None
+        if getattr(options, 'consistency_check', None):
+            if isinstance(self.source, DescribeSource):
+                sys.exit('--consistency-check compares a --config-aggregator with describe_* calls; name the aggregator.')
+            self.consistency = ConsistencyCheck(options.consistency_check)
+            self.direct_source = DescribeSource()
+            # The describe_* pass keeps its own --select counters, so the report counts each resource once
+            self.check_options = copy.copy(options)
+            if getattr(options, 'select', None):
+                self.check_options.select = Selector(options.select.text)
+
+    def client(self, session, account_id, service, region):
+        """Return the shared client for (account, service, region), creating it once."""
+        key = (account_id, service, region)
+        with self._clients_lock:
+            if key not in self._clients:
+                self._clients[key] = new_client(service, region, session, account_id, config=self._client_config)
+            return self._clients[key]
+
+    def open_sinks(self, collector_names, account_ids=None):
+        sinks = {}
+        for name in collector_names:
+            collector = COLLECTORS[name]
+            if collector.sink_factory:
+                sinks[name] = collector.sink_factory(self.options)
+                continue
+            sinks[name] = open_sink(self.options, name, collector.filename, collector.fieldnames(self.options),
+                                    collector.key_fields, account_ids, collector.column_types, **collector.sink_options)
+        return sinks
+
+    def run(self, collector_names, account_ids=None):
+        """Collect every named collector and return {name: sink} once all sinks are closed.
+
+        account_ids defaults to the caller's own account; duplicates are dropped.
+        Rows are written in account, then region order, as each unit completes.
+        """
+        if account_ids is None:
+            account_ids = [self.sessions.caller_account()]
+        account_ids = list(dict.fromkeys(account_ids))
+        # --index-db and --topology-db refresh their local databases from the same describe_* data
+        companions = [name for option, name in COMPANION_COLLECTORS.items()
+                      if getattr(self.options, option, None) and name not in collector_names]
+        collector_names = list(collector_names) + companions
+        collectors = [COLLECTORS[name] for name in collector_names]
+        # Counted before this run can update the index
+        select_totals = self.selection_totals(account_ids) if getattr(self.options, 'select', None) else None
+
+        self.journal = self.open_journal(collector_names, account_ids)
+        self.source.start(account_ids)
+        # (account, region) units a collector failed to scan completely
+        self.failed_units = set()
+
+        # Sinks are closed even if the run fails, keeping the rows already written
+        try:
+            with ExitStack() as stack:
+                sinks = {name: stack.enter_context(sink)
+                         for name, sink in self.open_sinks(collector_names, account_ids).items()}
+                asyncio.run(self._run(collectors, account_ids, sinks))
+            if self.journal and self.failed_units:
+                print(f"{len(self.failed_units)} account/region units failed to scan; "
+                      f"rerun with --resume to scan only those again.")
+            elif self.journal:
+                self.journal.finish(collector_names, account_ids)
+        except BaseException:
+            if self.journal:
+                print(f"Run interrupted; completed units are kept in '{self.journal.path}'. "
+                      f"Rerun with --resume to continue where it stopped.")
+            raise
+        finally:
+            if self.journal:
+                self.journal.close()
+        rate_limiters.report()
+        self.source.report()
+        if self.consistency:
+            self.consistency.write()
+            self.consistency.report()
+        if self.journal:
+            self.journal.report()
+        for name in companions:
+            sinks.pop(name).report()
+        if getattr(self.options, 'select', None):
+            self.options.select.report(select_totals)
+        return sinks
+
+    def open_journal(self, collector_names, account_ids):
+        """The checkpoint journal of the run (--checkpoint-db), emptied for these units unless --resume.
+
+        --resume without --checkpoint-db reads the default journal, and stops the
+        script when the journal holds no recent interrupted run of these collectors.
+        """
+        resume = getattr(self.options, 'resume', False)
+        path = getattr(self.options, 'checkpoint_db', None) or (DEFAULT_CHECKPOINT_DB if resume else None)
+        if not path:
+            return None
+        if resume and not os.path.exists(path):
+            sys.exit(f"Cannot --resume: there is no checkpoint journal '{path}'; only runs started with "
+                     f"--checkpoint-db can be resumed. Rerun without --resume for a full scan.")
+        journal = CheckpointJournal(path, options_signature(self.options), collector_names)
+        if not resume:
+            journal.start(collector_names, account_ids)
+            return journal
+        reason = journal.resumable()
+        if reason:
+            journal.close()
+            sys.exit(f"Cannot --resume: {reason}. Rerun without --resume for a full scan.")
+        return journal
+
+    def selection_totals(self, account_ids):
+        """Unfiltered EC2 instance counts from the local index (--index-db), for the --select transfer estimate."""
+        path = getattr(self.options, 'index_db', None) or DEFAULT_INDEX_DB
+        if not os.path.exists(path):
+            return None
+        index = InventoryIndex(path)
+        try:
+            count = index.count(account_ids)
+        finally:
+            index.close()
+        return {'ec2': count} if count else None
+
+    async def _run(self, collectors, account_ids, sinks):
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.max_accounts * self.max_workers)
+        account_slots = asyncio.Semaphore(self.max_accounts)
+        try:
+            async def in_thread(func, *args):
+                return await loop.run_in_executor(executor, func, *args)
+
+            async def plan_account(account_id):
+                # Returns the account's region tasks as soon as they are scheduled,
+                # so rows can be written while later regions are still running
+                await account_slots.acquire()
+                print(f"Processing account: {account_id}")
+                regions = self.journal.regions(account_id) if self.journal else None
+                journaled = regions is not None
+                # An aggregator lists the regions of the accounts it records without their credentials;
+                # the consistency check lists them directly, so regions it misses are reported
+                if regions is None and not self.consistency:
+                    regions = await in_thread(self.source.regions, account_id)
+                session = None
+                # An account completed before --resume needs no credentials at all
+                if regions is None or (journaled and self.journal.pending(account_id, regions, collector_names)):
+                    session = await in_thread(self.sessions.get, account_id)
+                if regions is None:
+                    regions = await in_thread(list_regions, session)
+                if self.journal and not journaled:
+                    self.journal.record_regions(account_id, regions)
+                region_slots = asyncio.Semaphore(self.max_workers)
+
+                async def scan_region(region):
+                    async with region_slots:
+                        return await in_thread(self._scan_unit, collectors, session, account_id, region)
+
+                region_tasks = [asyncio.ensure_future(scan_region(region)) for region in regions]
+
+                async def release_when_done():
+                    await asyncio.gather(*region_tasks, return_exceptions=True)
+                    account_slots.release()
+                    print(f"Completed processing account: {account_id}")
+
+                asyncio.ensure_future(release_when_done())
+                return region_tasks
+
+            collector_names = [collector.name for collector in collectors]
+            account_tasks = [asyncio.ensure_future(plan_account(account_id)) for account_id in account_ids]
+            for account_task in account_tasks:
+                for region_task in await account_task:
+                    account_id, region, results = await region_task
+                    for name, rows, complete in results:
+                        sinks[name].write_rows(rows)
+                        sinks[name].unit_scanned(account_id, region, complete)
+                        if not complete:
+                            self.failed_units.add((account_id, region))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _scan_unit(self, collectors, session, account_id, region):
+        """Return (account_id, region, [(collector name, rows, complete)]) for one unit.
+
+        complete is False when the collector failed or skipped part of the
+        unit, so sinks do not take its missing resources for removed ones.
+        """
+        journaled = self.journal.completed(account_id, region, [collector.name for collector in collectors]) if self.journal else {}
+        if len(journaled) == len(collectors):
+            print(f"Resumed region: {region} in account: {account_id} from the checkpoint journal")
+            return account_id, region, [(collector.name, journaled[collector.name], True) for collector in collectors]
+        print(f"Processing region: {region} in account: {account_id}")
+        shared = len(collectors) - len(journaled) > 1
+        context = RegionContext(self, session, account_id, region, shared=shared)
+        if self.consistency:
+            direct_context = RegionContext(self, session, account_id, region, self.direct_source, shared)
+        results = []
+        for collector in collectors:
+            if collector.name in journaled:
+                results.append((collector.name, journaled[collector.name], True))
+                continue
+            # A failing collector does not discard what the others found in this region,
+            # and is not journaled, so --resume scans it again
+            failures = context.failures
+            try:
+                rows = collector.collect(context, self.options)
+                if self.consistency:
+                    described = collector.collect(direct_context, self.check_options)
+                    self.consistency.compare(collector, account_id, region, described, rows)
+            except ClientError as e:
+                print(f"Error collecting {collector.name} in region {region} for account {account_id}: {e}")
+                results.append((collector.name, [], False))
+                continue
+            complete = context.failures == failures
+            if self.journal and complete:
+                self.journal.record(account_id, region, collector.name, rows)
+            results.append((collector.name, rows, complete))
+        self.source.release(account_id, region)
+        print(f"Completed processing region: {region} for account: {account_id}")
+        return account_id, region, results
@@ -0,0 +1,175 @@
+"""Local SQLite index of EC2 instances, filled by the inventory scripts (--index-db).
+
+The index answers the lookups of the CLI helper scripts (instance ID, Name
+tag, private IP, key pair, tags, attached volumes) without an API round
+trip; see inventory-lookup.py. This module does not import boto3, so
+lookups stay fast.
+"""
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_INDEX_DB = os.environ.get('INVENTORY_INDEX_DB', os.path.expanduser('~/.aws_inventory_index.db'))
+
+FIELDS = ['instance_id', 'account', 'region', 'name', 'private_ip', 'public_ip', 'key_name', 'state',
+          'instance_type', 'tags', 'block_devices', 'indexed_at']
+
+# Fields stored as JSON text
+JSON_FIELDS = ('tags', 'block_devices')
+
+
+def instance_record(instance, account_id, region):
+    """Index record of an instance as returned by describe_instances."""
+    tags = instance.get('Tags', [])
+    return {
+        'instance_id': instance['InstanceId'],
+        'account': account_id,
+        'region': region,
+        'name': next((tag['Value'] for tag in tags if tag['Key'] == 'Name'), None),
+        'private_ip': instance.get('PrivateIpAddress'),
+        'public_ip': instance.get('PublicIpAddress'),
+        'key_name': instance.get('KeyName'),
+        'state': instance['State']['Name'],
+        'instance_type': instance['InstanceType'],
+        'tags': tags,
+        'block_devices': [{'DeviceName': mapping['DeviceName'], 'VolumeId': mapping['Ebs']['VolumeId']}
+                          for mapping in instance.get('BlockDeviceMappings', []) if 'Ebs' in mapping],
+    }
+
+
+class InventoryIndex:
+    """SQLite table of instances, indexed on ID, Name tag, private IP and account/region."""
+
+    def __init__(self, path=DEFAULT_INDEX_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS instances (
+                instance_id TEXT PRIMARY KEY,
+                account TEXT,
+                region TEXT,
+                name TEXT,
+                private_ip TEXT,
+                public_ip TEXT,
+                key_name TEXT,
+                state TEXT,
+                instance_type TEXT,
+                tags TEXT,
+                block_devices TEXT,
+                indexed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS instances_name ON instances (name);
+            CREATE INDEX IF NOT EXISTS instances_private_ip ON instances (private_ip);
+            CREATE INDEX IF NOT EXISTS instances_account_region ON instances (account, region);
+        """)
+
+    def upsert(self, records, indexed_at=None):
+        indexed_at = indexed_at or time.time()
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO instances ({', '.join(FIELDS)}) VALUES ({', '.join('?' for _ in FIELDS)})",
+            [tuple(json.dumps(record.get(field) or []) if field in JSON_FIELDS else record.get(field)
+                   for field in FIELDS[:-1]) + (indexed_at,) for record in records])
+
+    def _records(self, query, params):
+        records = []
+        for row in self.conn.execute(query, params):
+            record = dict(row)
+            for field in JSON_FIELDS:
+                record[field] = json.loads(record[field]) if record[field] else []
+            records.append(record)
+        return records
+
+    def get(self, instance_ids, max_age=None, region=None):
+        """Return {instance_id: record} for the IDs found, skipping records older than max_age seconds.
+
+        With region, instances indexed in other regions are skipped too.
+        """
+        instance_ids = list(instance_ids)
+        if not instance_ids:
+            return {}
+        query = f"SELECT * FROM instances WHERE instance_id IN ({', '.join('?' for _ in instance_ids)})"
+        params = list(instance_ids)
+        if region is not None:
+            query += ' AND region = ?'
+            params.append(region)
+        if max_age is not None:
+            query += ' AND indexed_at >= ?'
+            params.append(time.time() - max_age)
+        return {record['instance_id']: record for record in self._records(query, params)}
+
+    def find(self, name=None, private_ip=None, account=None, region=None, max_age=None):
+        """Return the records matching every criterion given."""
+        conditions, params = [], []
+        for column, value in (('name', name), ('private_ip', private_ip), ('account', account), ('region', region)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if max_age is not None:
+            conditions.append('indexed_at >= ?')
+            params.append(time.time() - max_age)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self._records(f"SELECT * FROM instances{where} ORDER BY instance_id", params)
+
+    def count(self, accounts=None):
+        """Number of instances indexed, in total or for the given accounts."""
+        if accounts is None:
+            return self.conn.execute('SELECT COUNT(*) FROM instances').fetchone()[0]
+        accounts = list(accounts)
+        return self.conn.execute(f"SELECT COUNT(*) FROM instances WHERE account IN ({', '.join('?' for _ in accounts)})",
+                                 accounts).fetchone()[0]
+
+    def prune(self, account, region, before):
+        """Delete the instances of account/region not indexed since `before` (terminated since)."""
+        self.conn.execute('DELETE FROM instances WHERE account = ? AND region = ? AND indexed_at < ?',
+                          (account, region, before))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class IndexSink:
+    """Output sink storing the 'instance-index' collector rows in an InventoryIndex.
+
+    Once the run completes, instances that disappeared from a scanned
+    account/region are removed from the index, unless prune is False.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_DB, prune=True):
+        self.index = InventoryIndex(path)
+        self.prune = prune
+        self.filename = path
+        self.started = time.time()
+        self.rows_written = 0
+        # (account, region) units scanned completely, pruned once the run completes
+        self._scanned = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(complete=exc_type is None)
+
+    def write_rows(self, rows):
+        self.index.upsert(rows, self.started)
+        self.rows_written += len(rows)
+
+    def unit_scanned(self, account, region, complete):
+        # Recorded even without rows, so a region whose last resource is gone is pruned too
+        if complete:
+            self._scanned.add((account, region))
+
+    def close(self, complete=True):
+        if complete and self.prune:
+            for account, region in self._scanned:
+                self.index.prune(account, region, self.started)
+        self.index.commit()
+        self.index.close()
+
+    def report(self):
+        print(f"Instances indexed in '{self.filename}': {self.rows_written}")
@@ -0,0 +1,319 @@
+"""Sources of the describe_* records read by the collectors (--config-aggregator).
+
+By default every (account, region) unit calls the describe_* APIs of its own
+account and region. With --config-aggregator NAME, the records come from an
+AWS Config aggregator instead: one paginated advanced query per resource type
+returns that type for up to ACCOUNTS_PER_QUERY accounts in every region, and
+the configuration items are mapped back onto the describe_* shapes, so the
+collectors and their CSV layouts do not change. For 200 accounts x 17
+regions, the dozen describe_* calls of every unit become a few queries per
+resource type.
+
+A unit falls back to the direct describe_* call for what the aggregator
+cannot serve: accounts it has no VPC recorded for, operations without a
+Config resource type, items missing a field the collectors read, and
+filters other than those of --select and of the --per-vpc VPC inventory.
+
+--consistency-check collects every unit with both sources and writes the
+rows that differ to a CSV file, to validate the aggregator before relying
+on it.
+"""
+import csv
+import datetime
+import fnmatch
+import json
+import re
+import threading
+from collections import Counter
+
+from inventory_common import new_client, paginate
+from resource_selector import FIELDS as SELECTOR_FIELDS
+
+# Results per select_aggregate_resource_config page (the API maximum), and
+# accounts per query, which keeps the expression under its 4096 characters
+AGGREGATOR_PAGE_SIZE = 100
+ACCOUNTS_PER_QUERY = 100
+
+# describe_* operations served by the aggregator:
+# (service, operation) -> (Config resource type, --select kind or None, fields the collectors require)
+AGGREGATED_OPERATIONS = {
+    ('ec2', 'describe_instances'): ('AWS::EC2::Instance', 'ec2', ['InstanceId', 'InstanceType', 'LaunchTime', 'Placement', 'State']),
+    ('ec2', 'describe_volumes'): ('AWS::EC2::Volume', None, ['VolumeId', 'Size']),
+    ('ec2', 'describe_vpcs'): ('AWS::EC2::VPC', 'vpc', ['VpcId']),
+    ('ec2', 'describe_subnets'): ('AWS::EC2::Subnet', None, ['SubnetId']),
+    ('ec2', 'describe_route_tables'): ('AWS::EC2::RouteTable', None, ['RouteTableId']),
+    ('ec2', 'describe_internet_gateways'): ('AWS::EC2::InternetGateway', None, ['InternetGatewayId']),
+    ('ec2', 'describe_security_groups'): ('AWS::EC2::SecurityGroup', None, ['GroupId', 'GroupName']),
+    ('ec2', 'describe_network_acls'): ('AWS::EC2::NetworkAcl', None, ['NetworkAclId']),
+    ('ec2', 'describe_vpc_peering_connections'): ('AWS::EC2::VPCPeeringConnection', None,
+                                                  ['VpcPeeringConnectionId', 'RequesterVpcInfo']),
+    ('ec2', 'describe_nat_gateways'): ('AWS::EC2::NatGateway', None, ['NatGatewayId']),
+    ('ec2', 'describe_vpc_endpoints'): ('AWS::EC2::VPCEndpoint', None, ['VpcEndpointId']),
+    ('rds', 'describe_db_instances'): ('AWS::RDS::DBInstance', 'rds',
+                                       ['DBInstanceIdentifier', 'Engine', 'EngineVersion', 'DBInstanceClass', 'DBInstanceStatus',
+                                        'AvailabilityZone', 'AllocatedStorage', 'DBSubnetGroup', 'InstanceCreateTime']),
+    ('rds', 'describe_db_clusters'): ('AWS::RDS::DBCluster', 'rds-cluster',
+                                      ['DBClusterIdentifier', 'Engine', 'EngineVersion', 'Status', 'ClusterCreateTime']),
+}
+
+# VPC filters of the --per-vpc VPC inventory: filter name -> VPC IDs of a record
+VPC_FILTERS = {
+    'vpc-id': lambda record: [record.get('VpcId')],
+    'attachment.vpc-id': lambda record: [attachment.get('VpcId') for attachment in record.get('Attachments') or []],
+    'requester-vpc-info.vpc-id': lambda record: [(record.get('RequesterVpcInfo') or {}).get('VpcId')],
+}
+
+# Every resource inventoried here lives in a VPC, so the regions of an
+# account's VPCs are the regions worth scanning
+REGIONS_RESOURCE_TYPE = 'AWS::EC2::VPC'
+
+# Configuration keys holding ISO 8601 timestamps, parsed like boto3 parses them
+TIMESTAMP_KEYS = {'launchTime', 'attachTime', 'createTime', 'instanceCreateTime', 'clusterCreateTime', 'creationTimestamp'}
+
+CONSISTENCY_FIELDNAMES = ['Collector', 'Account Number', 'Region', 'Resource', 'Field', 'Describe Value', 'Aggregator Value']
+
+
+def parse_timestamp(value):
+    if not isinstance(value, str):
+        return value
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def describe_shape(value):
+    """A Config configuration in the describe_* shape: keys capitalized (vpcId -> VpcId), timestamps parsed."""
+    if isinstance(value, dict):
+        return {key[:1].upper() + key[1:]: parse_timestamp(item) if key in TIMESTAMP_KEYS else describe_shape(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [describe_shape(item) for item in value]
+    return value
+
+
+def to_record(item, tag_key='Tags'):
+    """The describe_* record of a Config item, with its tags under tag_key (RDS returns them as TagList)."""
+    record = describe_shape(item.get('configuration') or {})
+    if item.get('tags') is not None:
+        record[tag_key] = [{'Key': tag['key'], 'Value': tag['value']} for tag in item['tags']]
+    return record
+
+
+def filter_predicate(kind, api_filter):
+    """Client-side test of a describe_* API filter sent by --select or --per-vpc, or None for other filters."""
+    name = api_filter['Name']
+    # EC2 filter values are wildcards; RDS values have none, so they match exactly
+    pattern = re.compile('|'.join(fnmatch.translate(value) for value in api_filter['Values']))
+    if name.startswith('tag:'):
+        key = name[4:]
+
+        def getter(record):
+            return {tag['Key']: tag['Value'] for tag in record.get('Tags') or []}.get(key)
+    else:
+        getter = next((getter for server_name, getter in SELECTOR_FIELDS.get(kind, {}).values() if server_name == name), None)
+        if getter is None and name in VPC_FILTERS:
+            vpc_ids = VPC_FILTERS[name]
+            return lambda record: any(vpc_id and pattern.match(vpc_id) for vpc_id in vpc_ids(record))
+        if getter is None:
+            return None
+    return lambda record: getter(record) is not None and pattern.match(str(getter(record))) is not None
+
+
+class DescribeSource:
+    """describe_* calls in the unit's own account and region."""
+
+    def start(self, account_ids):
+        pass
+
+    def regions(self, account_id):
+        """Regions to scan in account_id, or None to list them with the account's credentials."""
+        return None
+
+    def records(self, context, service, operation, result_key, **kwargs):
+        """Yield the records page by page, as paginate() reads them."""
+        yield from paginate(context.client(service), operation, result_key, context.page_size, **kwargs)
+
+    def release(self, account_id, region):
+        pass
+
+    def report(self):
+        pass
+
+
+class ConfigAggregatorSource:
+    """Records of an AWS Config aggregator, queried once per resource type for the whole run.
+
+    Queries run on the caller's own credentials in the aggregator's region;
+    units only need their account's credentials when they fall back to
+    describe_* calls.
+    """
+
+    def __init__(self, aggregator, region=None):
+        self.aggregator = aggregator
+        self.region = region
+        self.fallback = DescribeSource()
+        self.account_ids = []
+        self._client = None
+        self._items = {}   # Config resource type -> {(account, region): [JSON results]}
+        self._type_locks = {}
+        self._regions = None
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.served = Counter()     # operation -> units served
+        self.fallbacks = Counter()  # (operation, reason) -> units fetched with describe_* calls
+
+    def start(self, account_ids):
+        self.account_ids = list(account_ids)
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = new_client('config', self.region)
+            return self._client
+
+    def items(self, resource_type):
+        """{(account, region): [Config items as JSON]} of a resource type in the run's accounts."""
+        with self._lock:
+            type_lock = self._type_locks.setdefault(resource_type, threading.Lock())
+        # Units of every account wait for the one query of the type
+        with type_lock:
+            if resource_type not in self._items:
+                self._items[resource_type] = self._query(resource_type)
+            return self._items[resource_type]
+
+    def _query(self, resource_type):
+        items = {}
+        for start in range(0, len(self.account_ids), ACCOUNTS_PER_QUERY):
+            accounts = ', '.join(f"'{account_id}'" for account_id in self.account_ids[start:start + ACCOUNTS_PER_QUERY])
+            expression = (f"SELECT accountId, awsRegion, resourceId, tags, configuration "
+                          f"WHERE resourceType = '{resource_type}' AND accountId IN ({accounts})")
+            with self._lock:
+                self.queries += 1
+            for result in paginate(self.client(), 'select_aggregate_resource_config', 'Results', AGGREGATOR_PAGE_SIZE,
+                                   Expression=expression, ConfigurationAggregatorName=self.aggregator):
+                # Kept as JSON until its unit is scanned: a fraction of the memory of the parsed item
+                item = json.loads(result)
+                items.setdefault((item['accountId'], item['awsRegion']), []).append(result)
+        return items
+
+    def recorded_regions(self):
+        """{account: regions} of the VPCs recorded by the aggregator, kept for the run as units release their items."""
+        vpcs = self.items(REGIONS_RESOURCE_TYPE)
+        with self._lock:
+            if self._regions is None:
+                self._regions = {}
+                for account, region in sorted(vpcs):
+                    self._regions.setdefault(account, []).append(region)
+            return self._regions
+
+    def regions(self, account_id):
+        return self.recorded_regions().get(account_id)
+
+    def aggregated(self, account_id):
+        """True if the aggregator records account_id; other accounts are scanned with describe_* calls."""
+        return account_id in self.recorded_regions()
+
+    def records(self, context, service, operation, result_key, **kwargs):
+        if (service, operation) not in AGGREGATED_OPERATIONS:
+            records, reason = None, 'no Config resource type'
+        elif not self.aggregated(context.account_id):
+            records, reason = None, 'account not in the aggregator'
+        else:
+            records, reason = self._unit_records(context, service, operation, kwargs)
+        with self._lock:
+            if records is None:
+                self.fallbacks[(operation, reason)] += 1
+            else:
+                self.served[operation] += 1
+        if records is None:
+            return self.fallback.records(context, service, operation, result_key, **kwargs)
+        return records
+
+    def _unit_records(self, context, service, operation, kwargs):
+        """(records, None), or (None, reason) when the unit has to fall back to describe_* calls."""
+        resource_type, kind, required = AGGREGATED_OPERATIONS[(service, operation)]
+        # describe_nat_gateways names its filter parameter 'Filter'
+        filters = kwargs.get('Filters') or kwargs.get('Filter') or []
+        if set(kwargs) - {'Filters', 'Filter'}:
+            return None, f"unsupported parameters {sorted(set(kwargs) - {'Filters', 'Filter'})}"
+        predicates = [filter_predicate(kind, api_filter) for api_filter in filters]
+        if None in predicates:
+            return None, 'unsupported filters'
+
+        tag_key = 'TagList' if service == 'rds' else 'Tags'
+        records = [to_record(json.loads(result), tag_key)
+                   for result in self.items(resource_type).get((context.account_id, context.region), [])]
+        if any(field not in record for record in records for field in required):
+            return None, 'fields missing from configuration items'
+        records = [record for record in records if all(predicate(record) for predicate in predicates)]
+        if operation == 'describe_instances':
+            # Config has no reservations; the collectors only read their owner
+            records = [{'OwnerId': context.account_id, 'Instances': [record]} for record in records]
+        return records, None
+
+    def release(self, account_id, region):
+        """Drop the items of a completed unit."""
+        with self._lock:
+            for items in self._items.values():
+                items.pop((account_id, region), None)
+
+    def report(self):
+        print(f"Config aggregator '{self.aggregator}': {self.queries} queries, "
+              f"{sum(self.served.values())} unit listings served")
+        for (operation, reason), units in sorted(self.fallbacks.items()):
+            print(f"  {operation}: {units} units fetched with describe_* calls ({reason})")
+
+
+def open_source(options):
+    """The record source selected by the options of a run."""
+    aggregator = getattr(options, 'config_aggregator', None)
+    if aggregator:
+        return ConfigAggregatorSource(aggregator, getattr(options, 'config_aggregator_region', None))
+    return DescribeSource()
+
+
+def resource_key(collector, row):
+    """The resource part of the collector's key fields, e.g. 'i-0abc' or 'vpc-1/Subnet/subnet-2'."""
+    key = collector.key_fields[-1]
+    fields = key if isinstance(key, tuple) else (key,)
+    return '/'.join(str(row.get(field)) for field in fields)
+
+
+class ConsistencyCheck:
+    """Differences between the rows of the aggregator and of direct describe_* calls (--consistency-check)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.differences = []
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def compare(self, collector, account_id, region, described, aggregated):
+        described = {resource_key(collector, row): row for row in described}
+        aggregated = {resource_key(collector, row): row for row in aggregated}
+        differences = []
+        for key in sorted(described.keys() | aggregated.keys()):
+            base = {'Collector': collector.name, 'Account Number': account_id, 'Region': region, 'Resource': key}
+            if key not in aggregated:
+                differences.append({**base, 'Field': '(resource)', 'Describe Value': 'present', 'Aggregator Value': 'missing'})
+            elif key not in described:
+                differences.append({**base, 'Field': '(resource)', 'Describe Value': 'missing', 'Aggregator Value': 'present'})
+            else:
+                row, other = described[key], aggregated[key]
+                differences.extend({**base, 'Field': field, 'Describe Value': row.get(field), 'Aggregator Value': other.get(field)}
+                                   for field in row.keys() | other.keys() if row.get(field) != other.get(field))
+        with self._lock:
+            self.rows += len(described)
+            self.differences.extend(differences)
+
+    def write(self):
+        order = {'(resource)': ''}
+        self.differences.sort(key=lambda d: (d['Collector'], d['Account Number'], d['Region'], d['Resource'],
+                                             order.get(d['Field'], d['Field'])))
+        with open(self.path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=CONSISTENCY_FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(self.differences)
+
+    def report(self):
+        resources = {(d['Collector'], d['Account Number'], d['Region'], d['Resource']) for d in self.differences}
+        print(f"Consistency check: {len(resources)} of {self.rows} described resources differ in the aggregator "
+              f"({len(self.differences)} differences); CSV file '{self.path}' has been created successfully.")
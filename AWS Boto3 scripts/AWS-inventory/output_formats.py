@@ -0,0 +1,263 @@
+"""Output sinks for inventory rows: CSV, gzip CSV, JSON Lines, Parquet and Arrow.
+
+Collectors produce typed values (datetimes, integer GiB sizes, lists) and
+declare the type of each non-string column. The CSV sinks render them the
+way the inventory files always looked ("100GiB, 8GiB"); the typed formats
+keep them as numbers, timestamps and lists so they load straight into
+analytics tools. Parquet and Arrow need pyarrow.
+"""
+import csv
+import gzip
+import json
+import sys
+
+from inventory_common import peak_rss_mib
+
+# Imported by load_pyarrow(), only for --format parquet/arrow
+pyarrow = None
+
+# Column types a collector can declare; undeclared columns are strings
+TIMESTAMP = 'timestamp'   # datetime
+GIB = 'gib'               # integer size in GiB
+GIB_LIST = 'gib_list'     # list of integer sizes in GiB
+STRING_LIST = 'list'      # list of strings
+BOOLEAN = 'bool'
+
+
+def load_pyarrow():
+    """Import pyarrow on first use, so CSV and JSON runs do not pay for loading it."""
+    global pyarrow
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def csv_value(value, column_type=None):
+    """Render a typed value the way the CSV inventories have always shown it."""
+    if value is None:
+        return value
+    if column_type == TIMESTAMP and hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if column_type == GIB:
+        return f"{value}GiB"
+    if column_type == GIB_LIST:
+        return ", ".join(f"{size}GiB" for size in value)
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return value
+
+
+def json_value(value, column_type=None):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class RowSink:
+    """Base class streaming rows into a file, writing every batch_size rows.
+
+    filename may be a callable taking the first row (or None when no rows were
+    written), for scripts whose output name depends on the data. Its '.csv'
+    extension is replaced by the extension of the format. The file is created
+    on the first write; with write_empty=False it is not created at all when
+    no rows arrive. Rows may carry keys outside fieldnames; they are ignored.
+    """
+
+    extension = '.csv'
+    default_batch_size = 500
+
+    def __init__(self, filename, fieldnames, column_types=None, batch_size=None, write_empty=True):
+        self.filename = output_filename(filename, self.extension)
+        self.fieldnames = fieldnames
+        self.column_types = column_types or {}
+        self.batch_size = batch_size or self.default_batch_size
+        self.write_empty = write_empty
+        self.rows_written = 0
+        self._buffer = []
+        self._opened = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open(self, first_row):
+        if callable(self.filename):
+            self.filename = self.filename(first_row)
+        self._open_file()
+        self._opened = True
+
+    def write_rows(self, rows):
+        for row in rows:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self.flush()
+
+    def unit_scanned(self, account, region, complete):
+        """Called by the engine once the rows of an (account, region) unit are written."""
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if not self._opened:
+            self._open(self._buffer[0])
+        self._write_batch(self._buffer)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        if not self._opened and self.write_empty:
+            self._open(None)
+        if self._opened:
+            self._close_file()
+            self._opened = False
+
+    def report(self):
+        peak = peak_rss_mib()
+        peak_info = f", peak RSS {peak:.1f} MiB" if peak is not None else ''
+        print(f"Rows written to '{self.filename}': {self.rows_written}{peak_info}")
+
+    def _open_file(self):
+        raise NotImplementedError
+
+    def _write_batch(self, rows):
+        raise NotImplementedError
+
+    def _close_file(self):
+        raise NotImplementedError
+
+
+class CsvSink(RowSink):
+    """Stream rows into a CSV file, flushing to disk every batch_size rows."""
+
+    def _open_file(self):
+        self._file = open(self.filename, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _write_batch(self, rows):
+        # Only the typed columns need rendering; string columns are written as they are
+        typed = [(field, column_type) for field, column_type in self.column_types.items() if field in self.fieldnames]
+        if typed:
+            rows = [{**row, **{field: csv_value(row.get(field), column_type) for field, column_type in typed}}
+                    for row in rows]
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def _close_file(self):
+        self._file.close()
+
+
+class GzipCsvSink(CsvSink):
+    """CSV compressed with gzip."""
+
+    extension = '.csv.gz'
+
+    def _open_file(self):
+        self._file = gzip.open(self.filename, 'wt', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+        self._writer.writeheader()
+
+
+class JsonlSink(RowSink):
+    """One JSON object per line with typed values; timestamps in ISO 8601."""
+
+    extension = '.jsonl'
+
+    def _open_file(self):
+        self._file = open(self.filename, 'w')
+
+    def _write_batch(self, rows):
+        for row in rows:
+            record = {field: json_value(row.get(field), self.column_types.get(field)) for field in self.fieldnames}
+            self._file.write(json.dumps(record, default=str) + '\n')
+        self._file.flush()
+
+    def _close_file(self):
+        self._file.close()
+
+
+class ParquetSink(RowSink):
+    """Typed Parquet file written one row group per batch."""
+
+    extension = '.parquet'
+    default_batch_size = 10000
+
+    def __init__(self, *args, **kwargs):
+        if load_pyarrow() is None:
+            sys.exit(f"--format {self.extension.lstrip('.')} needs pyarrow: pip install pyarrow")
+        super().__init__(*args, **kwargs)
+        self.schema = pyarrow.schema([(field, arrow_type(self.column_types.get(field))) for field in self.fieldnames])
+
+    def _open_file(self):
+        self._writer = pyarrow.parquet.ParquetWriter(self.filename, self.schema)
+
+    def _table(self, rows):
+        columns = {field: [arrow_value(row.get(field), self.column_types.get(field)) for row in rows]
+                   for field in self.fieldnames}
+        return pyarrow.Table.from_pydict(columns, schema=self.schema)
+
+    def _write_batch(self, rows):
+        self._writer.write_table(self._table(rows))
+
+    def _close_file(self):
+        self._writer.close()
+
+
+class ArrowSink(ParquetSink):
+    """Typed Arrow IPC file, one record batch per batch of rows."""
+
+    extension = '.arrow'
+
+    def _open_file(self):
+        self._file = pyarrow.OSFile(self.filename, 'wb')
+        self._writer = pyarrow.ipc.new_file(self._file, self.schema)
+
+    def _close_file(self):
+        self._writer.close()
+        self._file.close()
+
+
+def arrow_type(column_type):
+    return {
+        TIMESTAMP: pyarrow.timestamp('s', tz='UTC'),
+        GIB: pyarrow.int64(),
+        GIB_LIST: pyarrow.list_(pyarrow.int64()),
+        STRING_LIST: pyarrow.list_(pyarrow.string()),
+        BOOLEAN: pyarrow.bool_(),
+    }.get(column_type, pyarrow.string())
+
+
+def arrow_value(value, column_type):
+    if value is None or column_type is not None:
+        return value
+    return value if isinstance(value, str) else str(value)
+
+
+# --format choices
+SINKS = {
+    'csv': CsvSink,
+    'csv.gz': GzipCsvSink,
+    'jsonl': JsonlSink,
+    'parquet': ParquetSink,
+    'arrow': ArrowSink,
+}
+
+
+def output_filename(filename, extension):
+    """'name.csv' -> 'name' + extension; callables are wrapped to apply the same rename."""
+    if callable(filename):
+        return lambda first_row: output_filename(filename(first_row), extension)
+    if filename.endswith('.csv'):
+        filename = filename[:-len('.csv')]
+    return filename + extension
+
+
+def create_sink(output_format, filename, fieldnames, column_types=None, **options):
+    return SINKS[output_format](filename, fieldnames, column_types, **options)
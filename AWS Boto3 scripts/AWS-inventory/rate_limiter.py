@@ -0,0 +1,244 @@
+"""Client-side rate limiting shared by every client of an (account, region, service).
+
+AWS throttles each account per region and service, so all clients created
+through inventory_common.new_client for the same (account, region, service)
+share one AdaptiveLimiter:
+
+- a token bucket sized like the documented AWS request bucket, so sustained
+  scans stay at the refill rate instead of bursting into throttling;
+- an adaptive cap on in-flight calls that halves when AWS throttles and grows
+  back by one for every `limit` successful calls (additive increase,
+  multiplicative decrease);
+- a cooldown after a throttle, during which every caller of the key waits,
+  so retries are spread out instead of hitting the bucket again at once.
+"""
+import random
+import threading
+import time
+import weakref
+
+from botocore.exceptions import ClientError
+
+from api_metrics import THROTTLE_CODES
+
+# (refill rate per second, bucket size) by service and action class.
+# EC2 values are the documented request token buckets for non-mutating
+# (Describe*, Get*, List*, Search*) and mutating actions. RDS does not
+# publish its buckets; its values are conservative.
+RATE_LIMITS = {
+    ('ec2', 'non-mutating'): (20.0, 100),
+    ('ec2', 'mutating'): (5.0, 200),
+    ('rds', 'non-mutating'): (10.0, 50),
+    ('rds', 'mutating'): (5.0, 50),
+}
+DEFAULT_RATE_LIMIT = (10.0, 50)
+
+NON_MUTATING_PREFIXES = ('Describe', 'Get', 'List', 'Search', 'Select')
+
+# Bounds of the adaptive in-flight cap
+MAX_IN_FLIGHT = 16
+MIN_IN_FLIGHT = 1
+
+# Cooldown after a throttle: doubled for consecutive throttles, up to MAX_COOLDOWN seconds
+BASE_COOLDOWN = 0.5
+MAX_COOLDOWN = 20.0
+
+
+def is_throttle(error):
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLE_CODES
+
+
+def action_class(operation_name):
+    return 'non-mutating' if operation_name.startswith(NON_MUTATING_PREFIXES) else 'mutating'
+
+
+class TokenBucket:
+    """Thread-safe token bucket; take() blocks until a token is available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take one token and return the seconds spent waiting for it."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveLimiter:
+    """Token buckets, in-flight cap and throttle cooldown of one (account, region, service)."""
+
+    def __init__(self, service, scale=1.0):
+        self.service = service
+        self.scale = scale
+        self.buckets = {}
+        self.limit = float(MAX_IN_FLIGHT)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_throttles = 0
+        self.throttles = 0
+        self.wait_seconds = 0.0
+        self.min_limit_seen = MAX_IN_FLIGHT
+        self._condition = threading.Condition()
+
+    def _bucket(self, operation_name):
+        kind = action_class(operation_name)
+        with self._condition:
+            if kind not in self.buckets:
+                rate, capacity = RATE_LIMITS.get((self.service, kind), DEFAULT_RATE_LIMIT)
+                self.buckets[kind] = TokenBucket(rate * self.scale, max(1, int(capacity * self.scale)))
+            return self.buckets[kind]
+
+    def acquire(self, operation_name):
+        """Wait for the cooldown, an in-flight slot and a token before a call."""
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if now < self.cooldown_until:
+                    self._condition.wait(self.cooldown_until - now)
+                elif self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    self.in_flight += 1
+                    break
+        with self._condition:
+            self.wait_seconds += time.monotonic() - started
+        self.take_token(operation_name)
+
+    def take_token(self, operation_name):
+        waited = self._bucket(operation_name).take()
+        with self._condition:
+            self.wait_seconds += waited
+
+    def release(self, throttled=False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.on_throttle()
+            else:
+                self.consecutive_throttles = 0
+                self.limit = min(MAX_IN_FLIGHT, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def on_throttle(self):
+        """Shrink the in-flight cap and start (or extend) the cooldown. Caller holds the lock."""
+        self.throttles += 1
+        self.consecutive_throttles += 1
+        self.limit = max(MIN_IN_FLIGHT, self.limit / 2)
+        self.min_limit_seen = min(self.min_limit_seen, int(self.limit))
+        cooldown = min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** (self.consecutive_throttles - 1))
+        # Jitter keeps the callers of different keys from retrying in lockstep
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown * random.uniform(0.5, 1.0))
+
+    def throttled(self):
+        """Record a throttle seen outside a call (e.g. a retry attempt) and wake waiting callers."""
+        with self._condition:
+            self.on_throttle()
+            self._condition.notify_all()
+
+    def wait_for_cooldown(self):
+        with self._condition:
+            while time.monotonic() < self.cooldown_until:
+                self._condition.wait(self.cooldown_until - time.monotonic())
+
+
+class RateLimiters:
+    """One AdaptiveLimiter per (account, region, service), attached to clients by new_client."""
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self._limiters = {}
+        self._by_client = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def configure(self, scale):
+        """Scale the documented rates (e.g. 0.5 to leave room for other tools); 0 disables limiting."""
+        self.scale = scale
+
+    def get(self, account_id, region, service):
+        key = (account_id or '', region or '', service)
+        with self._lock:
+            if key not in self._limiters:
+                self._limiters[key] = AdaptiveLimiter(service, self.scale)
+            return self._limiters[key]
+
+    def for_client(self, client):
+        return self._by_client.get(client)
+
+    def attach(self, client, account_id=None):
+        if not self.scale:
+            return client
+        limiter = self.get(account_id, client.meta.region_name, client.meta.service_model.service_name)
+        self._by_client[client] = limiter
+
+        def before_call(model, context, **kwargs):
+            limiter.acquire(model.name)
+            context['rate_limiter_acquired'] = True
+
+        def after_call(parsed, context, **kwargs):
+            if context.pop('rate_limiter_acquired', False):
+                # Throttled attempts botocore saw were already recorded by needs_retry
+                throttled = parsed.get('Error', {}).get('Code') in THROTTLE_CODES
+                limiter.release(throttled and not context.get('rate_limiter_throttle_seen'))
+
+        def after_call_error(context, **kwargs):
+            if context.pop('rate_limiter_acquired', False):
+                limiter.release()
+
+        def needs_retry(operation, response=None, request_dict=None, **kwargs):
+            # A throttled attempt: back off the whole key, and make botocore's
+            # retry wait for the cooldown and a fresh token
+            if response and response[1].get('Error', {}).get('Code') in THROTTLE_CODES:
+                if request_dict:
+                    request_dict['context']['rate_limiter_throttle_seen'] = True
+                limiter.throttled()
+                limiter.wait_for_cooldown()
+                limiter.take_token(operation.name)
+            return None
+
+        events = client.meta.events
+        events.register_first('before-call', before_call)
+        events.register('after-call', after_call)
+        events.register('after-call-error', after_call_error)
+        events.register_first('needs-retry', needs_retry)
+        return client
+
+    def call(self, client, operation, retries=5, **kwargs):
+        """Call client.operation(**kwargs), retrying throttled calls after the key's cooldown."""
+        for attempt in range(retries + 1):
+            try:
+                return getattr(client, operation)(**kwargs)
+            except ClientError as e:
+                limiter = self.for_client(client)
+                if not is_throttle(e) or limiter is None or attempt == retries:
+                    raise
+                limiter.wait_for_cooldown()
+
+    def report(self):
+        """Print the keys that were throttled or had to wait for the limiter."""
+        with self._lock:
+            busy = [(key, limiter) for key, limiter in sorted(self._limiters.items())
+                    if limiter.throttles or limiter.wait_seconds >= 0.1]
+        if busy:
+            print("Rate limiting (account/region/service):")
+        for (account_id, region, service), limiter in busy:
+            print(f"  {account_id or '-'}/{region or '-'}/{service}: waited {limiter.wait_seconds:.1f}s, "
+                  f"{limiter.throttles} throttled, in-flight cap {limiter.min_limit_seen}..{int(limiter.limit)}")
+
+
+# Limiters of every client created through inventory_common.new_client
+rate_limiters = RateLimiters()
@@ -0,0 +1,181 @@
+"""Selector DSL shared by the EC2, RDS and VPC inventories (--select).
+
+    --select 'Grade=prod,state=running,Env in (a,b),type!=t3.micro'
+
+Terms are separated by commas and must all match. A term compares a field
+with =, !=, 'in (...)' or 'not in (...)'; values may use * and ? wildcards.
+Fields are the names in FIELDS for the resource kind (state, type, ...) or
+tag keys, which can also be written tag:Key. Terms the service can filter
+on are sent as the API Filters of the describe_* call; the others are
+compiled into predicates applied to the records returned.
+"""
+import argparse
+import fnmatch
+import json
+import re
+import threading
+
+# Fields by resource kind: name -> (API filter name or None, value getter(record))
+FIELDS = {
+    'ec2': {
+        'state': ('instance-state-name', lambda instance: instance['State']['Name']),
+        'type': ('instance-type', lambda instance: instance['InstanceType']),
+        'az': ('availability-zone', lambda instance: instance['Placement']['AvailabilityZone']),
+        'vpc': ('vpc-id', lambda instance: instance.get('VpcId')),
+        'id': ('instance-id', lambda instance: instance['InstanceId']),
+        'key': ('key-name', lambda instance: instance.get('KeyName')),
+    },
+    'rds': {
+        'state': (None, lambda db: db['DBInstanceStatus']),
+        'engine': ('engine', lambda db: db['Engine']),
+        'class': (None, lambda db: db['DBInstanceClass']),
+        'id': ('db-instance-id', lambda db: db['DBInstanceIdentifier']),
+        'cluster': ('db-cluster-id', lambda db: db.get('DBClusterIdentifier')),
+    },
+    'rds-cluster': {
+        'state': (None, lambda cluster: cluster['Status']),
+        'engine': ('engine', lambda cluster: cluster['Engine']),
+        'id': ('db-cluster-id', lambda cluster: cluster['DBClusterIdentifier']),
+    },
+    'vpc': {
+        'state': ('state', lambda vpc: vpc['State']),
+        'id': ('vpc-id', lambda vpc: vpc['VpcId']),
+        'cidr': ('cidr', lambda vpc: vpc['CidrBlock']),
+        'default': ('is-default', lambda vpc: str(vpc.get('IsDefault', False)).lower()),
+    },
+}
+
+# Kinds whose API filters accept tag:Key names and * / ? wildcards (EC2); RDS filters take neither
+SERVER_TAG_FILTERS = {'ec2', 'vpc'}
+SERVER_WILDCARDS = {'ec2', 'vpc'}
+
+TERM_RE = re.compile(r"^\s*(?P<field>[^=!\s]+?)\s*(?:(?P<op>!=|=)\s*(?P<value>.*?)|\s+(?P<in>not\s+in|in)\s*\((?P<values>[^)]*)\))\s*$",
+                     re.IGNORECASE)
+
+
+def split_terms(text):
+    """Split on the commas outside parentheses."""
+    terms, depth, current = [], 0, ''
+    for char in text:
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        if char == ',' and depth == 0:
+            terms.append(current)
+            current = ''
+        else:
+            current += char
+    terms.append(current)
+    return [term for term in terms if term.strip()]
+
+
+class Term:
+    """One field comparison, with its value test compiled once."""
+
+    def __init__(self, field, values, negated):
+        self.field = field
+        self.values = values
+        self.negated = negated
+        self.wildcards = any('*' in value or '?' in value for value in values)
+        if self.wildcards:
+            pattern = re.compile('|'.join(fnmatch.translate(value) for value in values))
+            self._test = lambda value: value is not None and pattern.match(value) is not None
+        else:
+            value_set = frozenset(values)
+            self._test = lambda value: value in value_set
+
+    def field_spec(self, kind):
+        """(API filter name or None, getter) of the term for kind."""
+        if self.field.startswith('tag:'):
+            key = self.field[4:]
+        elif self.field in FIELDS[kind]:
+            return FIELDS[kind][self.field]
+        else:
+            key = self.field
+        server_name = f"tag:{key}" if kind in SERVER_TAG_FILTERS else None
+        return server_name, lambda record, tags=None: (tags or {}).get(key)
+
+    def server_filter(self, kind):
+        """The API filter of the term, or None if it has to be applied client-side."""
+        server_name = self.field_spec(kind)[0]
+        if server_name is None or self.negated or (self.wildcards and kind not in SERVER_WILDCARDS):
+            return None
+        return {'Name': server_name, 'Values': list(self.values)}
+
+    def predicate(self, kind):
+        getter = self.field_spec(kind)[1]
+        is_tag = self.field.startswith('tag:') or self.field not in FIELDS[kind]
+        if is_tag:
+            return lambda record, tags: self._test(getter(record, tags)) != self.negated
+        return lambda record, tags: self._test(getter(record)) != self.negated
+
+
+class Selector:
+    """A compiled --select expression, with counters of what it selected."""
+
+    def __init__(self, text):
+        self.text = text
+        self.terms = []
+        for term in split_terms(text):
+            match = TERM_RE.match(term)
+            if not match:
+                raise ValueError(f"invalid selector term '{term.strip()}'")
+            if match.group('op'):
+                values, negated = [match.group('value')], match.group('op') == '!='
+            else:
+                values = [value.strip() for value in match.group('values').split(',') if value.strip()]
+                negated = match.group('in').lower().startswith('not')
+            self.terms.append(Term(match.group('field'), values, negated))
+        self._compiled = {}
+        self._lock = threading.Lock()
+        self.returned = {}   # kind -> records the API returned
+        self.kept = {}       # kind -> records left after the client-side predicates
+        self.bytes = {}      # kind -> approximate payload bytes of the records returned
+
+    def _compile(self, kind):
+        with self._lock:
+            if kind not in self._compiled:
+                filters, predicates = [], []
+                for term in self.terms:
+                    server_filter = term.server_filter(kind)
+                    if server_filter:
+                        filters.append(server_filter)
+                    else:
+                        predicates.append(term.predicate(kind))
+                self._compiled[kind] = (filters, predicates)
+            return self._compiled[kind]
+
+    def filters(self, kind):
+        """API Filters for the describe_* call of kind."""
+        return self._compile(kind)[0]
+
+    def matches(self, kind, record, tags=None):
+        return all(predicate(record, tags) for predicate in self._compile(kind)[1])
+
+    def count(self, kind, returned, kept):
+        """Record the records of one describe_* result and how many the predicates kept."""
+        size = len(json.dumps(returned, default=str)) if returned else 0
+        with self._lock:
+            self.returned[kind] = self.returned.get(kind, 0) + len(returned)
+            self.kept[kind] = self.kept.get(kind, 0) + kept
+            self.bytes[kind] = self.bytes.get(kind, 0) + size
+
+    def report(self, totals=None):
+        """Print what the selection kept; totals ({kind: records without filters}) adds the transfer avoided."""
+        print(f"Selection '{self.text}':")
+        for kind in sorted(self.returned):
+            returned, kept, size = self.returned[kind], self.kept[kind], self.bytes[kind]
+            server = ', '.join(f"{f['Name']} in {f['Values']}" for f in self.filters(kind)) or 'none'
+            line = (f"  {kind}: server-side filters ({server}) returned {returned} records ({size / 1024 / 1024:.2f} MiB), "
+                    f"client-side predicates kept {kept}")
+            total = (totals or {}).get(kind)
+            if total is not None and returned:
+                avoided = max(0, total - returned)
+                line += f"; about {avoided * size / returned / 1024 / 1024:.2f} MiB ({avoided} records) not transferred"
+            print(line)
+
+
+def selector_argument(text):
+    """argparse type compiling --select once for the whole run."""
+    try:
+        return Selector(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
@@ -0,0 +1,199 @@
+"""Local snapshot store used by the --since-last-run mode of the inventory scripts."""
+import hashlib
+import json
+import sqlite3
+import time
+
+from output_formats import create_sink
+
+DELTA_FIELDNAMES = ['Change', 'Account Number', 'Region', 'Resource ID', 'Field', 'Old Value', 'New Value']
+
+
+def row_digest(row_json):
+    return hashlib.sha1(row_json.encode('utf-8')).hexdigest()
+
+
+class SnapshotStore:
+    """SQLite table of the last row seen for every (collector, account, region, resource)."""
+
+    def __init__(self, path='inventory_snapshots.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collector TEXT NOT NULL,
+                started_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS resources (
+                collector TEXT NOT NULL,
+                account TEXT NOT NULL,
+                region TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                row_json TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                run_id INTEGER NOT NULL,
+                PRIMARY KEY (collector, account, region, resource_id)
+            );
+        """)
+
+    def start_run(self, collector):
+        cursor = self.conn.execute('INSERT INTO runs (collector, started_at) VALUES (?, ?)', (collector, time.time()))
+        return cursor.lastrowid
+
+    def upsert(self, collector, run_id, account, region, resource_id, row):
+        """Store row and return (change, old_row): change is 'added', 'changed' or None."""
+        row_json = json.dumps(row, sort_keys=True, default=str)
+        digest = row_digest(row_json)
+        key = (collector, account, region, resource_id)
+        previous = self.conn.execute(
+            'SELECT row_json, digest FROM resources WHERE collector = ? AND account = ? AND region = ? AND resource_id = ?',
+            key).fetchone()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO resources (collector, account, region, resource_id, row_json, digest, run_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', key + (row_json, digest, run_id))
+        if previous is None:
+            return 'added', None
+        if previous[1] != digest:
+            return 'changed', json.loads(previous[0])
+        return None, None
+
+    def pop_unseen(self, collector, run_id, accounts=None, skip=()):
+        """Delete and return the rows of collector not seen in run_id, limited to accounts if given.
+
+        skip holds (account, region) units whose rows are kept whether seen or not.
+        """
+        query = 'SELECT account, region, resource_id, row_json FROM resources WHERE collector = ? AND run_id != ?'
+        params = [collector, run_id]
+        if accounts is not None:
+            query += f" AND account IN ({', '.join('?' for _ in accounts)})"
+            params.extend(accounts)
+        unseen = [row for row in self.conn.execute(query, params) if (row[0], row[1]) not in skip]
+        self.conn.executemany(
+            'DELETE FROM resources WHERE collector = ? AND account = ? AND region = ? AND resource_id = ?',
+            [(collector, account, region, resource_id) for account, region, resource_id, _ in unseen])
+        return [(account, region, resource_id, json.loads(row_json)) for account, region, resource_id, row_json in unseen]
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class DeltaSink:
+    """Drop-in replacement for the output sinks that writes only added, removed and changed resources.
+
+    Every row is compared with the previous run of the same collector in the
+    snapshot store; changed rows produce one delta line per differing field.
+    key_fields names the row fields holding the account, region and resource
+    ID (a tuple of fields for the resource ID is joined with '/'); an account
+    field of None stores the rows under an empty account. Resources missing
+    from this run are reported as removed, only for `accounts` when given and
+    never for a unit the engine reports as failed or partial; with prune
+    False (a --select run, which only sees part of the fleet) none are.
+    """
+
+    def __init__(self, store, collector, key_fields, filename, accounts=None, output_format='csv', prune=True):
+        self.store = store
+        self.collector = collector
+        self.key_fields = key_fields
+        self.prune = prune
+        self.accounts = list(accounts) if accounts is not None else None
+        if self.accounts is not None and key_fields[0] is None:
+            self.accounts = ['']
+        self.run_id = store.start_run(collector)
+        self.rows_seen = 0
+        self.changes = {'added': 0, 'changed': 0, 'removed': 0}
+        self._partial = set()
+        self._delta = create_sink(output_format, filename, DELTA_FIELDNAMES)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Only a complete run can tell which resources were removed
+        self.close(complete=exc_type is None)
+
+    @property
+    def filename(self):
+        return self._delta.filename
+
+    @property
+    def rows_written(self):
+        return self._delta.rows_written
+
+    def _key(self, row):
+        account_field, region_field, id_fields = self.key_fields
+        if isinstance(id_fields, str):
+            id_fields = (id_fields,)
+        account = row[account_field] if account_field else ''
+        return account, row[region_field], '/'.join(str(row[field]) for field in id_fields)
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.rows_seen += 1
+            account, region, resource_id = self._key(row)
+            change, old_row = self.store.upsert(self.collector, self.run_id, account, region, resource_id, row)
+            if change == 'added':
+                self._emit('added', account, region, resource_id)
+            elif change == 'changed':
+                for field in row:
+                    if str(old_row.get(field)) != str(row[field]):
+                        self._emit('changed', account, region, resource_id, field, old_row.get(field), row[field])
+
+    def unit_scanned(self, account, region, complete):
+        if not complete:
+            self._partial.add((account if self.key_fields[0] else '', region))
+
+    def _emit(self, change, account, region, resource_id, field='', old_value='', new_value=''):
+        self.changes[change] += 1
+        self._delta.write_rows([{
+            'Change': change,
+            'Account Number': account,
+            'Region': region,
+            'Resource ID': resource_id,
+            'Field': field,
+            'Old Value': old_value,
+            'New Value': new_value,
+        }])
+
+    def close(self, complete=True):
+        if complete and self.prune:
+            unseen = self.store.pop_unseen(self.collector, self.run_id, self.accounts, self._partial)
+            for account, region, resource_id, _ in unseen:
+                self._emit('removed', account, region, resource_id)
+        self.store.commit()
+        self._delta.close()
+
+    def report(self):
+        print(f"Resources scanned: {self.rows_seen}; added {self.changes['added']}, "
+              f"changed fields {self.changes['changed']}, removed {self.changes['removed']}")
+        if not self.prune:
+            print("Removals not checked: --select limits the run to part of the resources")
+        elif self._partial:
+            print(f"Removals not checked in {len(self._partial)} account/region units that failed to scan")
+        self._delta.report()
+
+
+def delta_filename(filename):
+    """'name.csv' -> 'name-delta.csv'; callables are wrapped to apply the same rename."""
+    if callable(filename):
+        return lambda first_row: delta_filename(filename(first_row))
+    base, dot, extension = filename.rpartition('.')
+    return f"{base}-delta.{extension}" if dot else f"{filename}-delta"
+
+
+def open_sink(args, collector, filename, fieldnames, key_fields, accounts=None, column_types=None, **sink_options):
+    """Return the output sink selected by the command-line options.
+
+    With --since-last-run rows go through a DeltaSink backed by --snapshot-db,
+    otherwise straight into a sink of the --format chosen. Resources filtered
+    out by --select are not reported as removed.
+    """
+    output_format = getattr(args, 'format', 'csv')
+    if args.since_last_run:
+        store = SnapshotStore(args.snapshot_db)
+        return DeltaSink(store, collector, key_fields, delta_filename(filename), accounts, output_format,
+                         prune=not getattr(args, 'select', None))
+    return create_sink(output_format, filename, fieldnames, column_types, **sink_options)
@@ -0,0 +1,42 @@
+"""Tests of the checkpoint journal behind --resume (checkpoint_journal.py).
+
+Run from this directory or the repository root: python -m pytest
+"""
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint_journal import CheckpointJournal, decode_rows, encode_rows  # noqa: E402
+
+
+def test_rows_round_trip_with_datetimes():
+    rows = [{'InstanceId': 'i-1', 'LaunchTime': datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone.utc),
+             'Tags': {'Name': 'web'}, 'Count': 2, 'Public IP': None}]
+    assert decode_rows(encode_rows(rows)) == rows
+
+
+def test_runs_of_other_collectors_keep_their_regions(tmp_path):
+    path = str(tmp_path / 'journal.db')
+    ec2 = CheckpointJournal(path, 'sig', ['ec2'])
+    vpc = CheckpointJournal(path, 'sig', ['vpc', 'vpc-topology'])
+    ec2.start(['ec2'], ['111'])
+    ec2.record_regions('111', ['us-east-1', 'eu-west-1'])
+    vpc.start(['vpc', 'vpc-topology'], ['111'])
+    vpc.record_regions('111', ['us-east-1'])
+    ec2.record('111', 'us-east-1', 'ec2', [{'InstanceId': 'i-1'}])
+
+    assert ec2.regions('111') == ['us-east-1', 'eu-west-1']
+    assert vpc.regions('111') == ['us-east-1']
+
+    # Finishing one run leaves the other one resumable where it stopped
+    vpc.finish(['vpc', 'vpc-topology'], ['111'])
+    assert os.path.exists(path)
+    assert ec2.resumable() is None
+    assert ec2.regions('111') == ['us-east-1', 'eu-west-1']
+    assert ec2.completed('111', 'us-east-1', ['ec2']) == {'ec2': [{'InstanceId': 'i-1'}]}
+    assert ec2.pending('111', ec2.regions('111'), ['ec2'])
+
+    ec2.finish(['ec2'], ['111'])
+    assert not os.path.exists(path)
@@ -0,0 +1,133 @@
+"""Parser and compiler tests of the --select DSL (resource_selector.py).
+
+Run from this directory or the repository root: python -m pytest
+"""
+import argparse
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resource_selector import Selector, selector_argument, split_terms  # noqa: E402
+
+
+def instance(state='running', instance_type='t3.micro', az='us-east-1a', instance_id='i-0123'):
+    return {'State': {'Name': state}, 'InstanceType': instance_type, 'Placement': {'AvailabilityZone': az},
+            'InstanceId': instance_id, 'VpcId': 'vpc-1', 'KeyName': 'ops'}
+
+
+def db_instance(status='available', engine='mysql', db_class='db.t3.small'):
+    return {'DBInstanceStatus': status, 'Engine': engine, 'DBInstanceClass': db_class, 'DBInstanceIdentifier': 'db-1'}
+
+
+# Parser
+
+def test_split_terms_keeps_commas_inside_parentheses():
+    assert split_terms('Grade=prod, Env in (a,b),type!=t3.micro') == ['Grade=prod', ' Env in (a,b)', 'type!=t3.micro']
+
+
+def test_split_terms_drops_empty_terms():
+    assert split_terms('Grade=prod,, ,') == ['Grade=prod']
+
+
+@pytest.mark.parametrize('text, field, values, negated', [
+    ('Grade=prod', 'Grade', ['prod'], False),
+    ('  state = running  ', 'state', ['running'], False),
+    ('type!=t3.micro', 'type', ['t3.micro'], True),
+    ('Env in (dev, stage ,prod)', 'Env', ['dev', 'stage', 'prod'], False),
+    ('Env NOT IN (dev)', 'Env', ['dev'], True),
+    ('tag:CostCenter=42', 'tag:CostCenter', ['42'], False),
+    ('Name=web-*', 'Name', ['web-*'], False),
+])
+def test_term_parsing(text, field, values, negated):
+    term, = Selector(text).terms
+    assert (term.field, term.values, term.negated) == (field, values, negated)
+
+
+def test_terms_keep_their_order():
+    assert [term.field for term in Selector('state=running,Grade=prod,type!=t2.nano').terms] == ['state', 'Grade', 'type']
+
+
+@pytest.mark.parametrize('text', ['Grade', 'Env in dev', 'Env in (dev', '=prod', 'Env in (a) x'])
+def test_invalid_terms_are_rejected(text):
+    with pytest.raises(ValueError):
+        Selector(text)
+
+
+def test_selector_argument_reports_invalid_terms_to_argparse():
+    with pytest.raises(argparse.ArgumentTypeError, match="invalid selector term 'Grade'"):
+        selector_argument('state=running,Grade')
+
+
+# Compiler
+
+def test_ec2_fields_and_tags_compile_to_server_filters():
+    selector = Selector('state=running,Grade=prod,tag:Env in (dev,stage),type=m5.*')
+    assert selector.filters('ec2') == [
+        {'Name': 'instance-state-name', 'Values': ['running']},
+        {'Name': 'tag:Grade', 'Values': ['prod']},
+        {'Name': 'tag:Env', 'Values': ['dev', 'stage']},
+        {'Name': 'instance-type', 'Values': ['m5.*']},
+    ]
+    # Everything ran on the server, so every record returned matches
+    assert selector.matches('ec2', instance(state='stopped'), {})
+
+
+def test_negated_terms_stay_client_side():
+    selector = Selector('type!=t3.micro,Env not in (dev)')
+    assert selector.filters('ec2') == []
+    assert selector.matches('ec2', instance(instance_type='m5.large'), {'Env': 'prod'})
+    assert not selector.matches('ec2', instance(instance_type='t3.micro'), {'Env': 'prod'})
+    assert not selector.matches('ec2', instance(instance_type='m5.large'), {'Env': 'dev'})
+
+
+def test_rds_tags_and_wildcards_stay_client_side():
+    selector = Selector('engine=mysql,Env=prod,class=db.t3.*')
+    # RDS filters take neither tag keys nor wildcards, and class has no filter at all
+    assert selector.filters('rds') == [{'Name': 'engine', 'Values': ['mysql']}]
+    assert selector.matches('rds', db_instance(), {'Env': 'prod'})
+    assert not selector.matches('rds', db_instance(), {'Env': 'dev'})
+    assert not selector.matches('rds', db_instance(db_class='db.r5.large'), {'Env': 'prod'})
+
+
+def test_rds_engine_wildcard_is_not_sent_to_the_server():
+    selector = Selector('engine=aurora*')
+    assert selector.filters('rds-cluster') == []
+    assert selector.matches('rds-cluster', {'Engine': 'aurora-postgresql', 'Status': 'available',
+                                            'DBClusterIdentifier': 'c-1'})
+
+
+def test_one_selector_compiles_per_kind():
+    selector = Selector('state=available')
+    assert selector.filters('vpc') == [{'Name': 'state', 'Values': ['available']}]
+    assert selector.filters('rds') == []
+    assert selector.matches('rds', db_instance(status='available'))
+    assert not selector.matches('rds', db_instance(status='stopped'))
+
+
+def test_missing_tag_matches_only_negated_terms():
+    # RDS tag terms are all applied client-side
+    assert not Selector('Owner=*').matches('rds', db_instance(), {})
+    assert not Selector('Owner=x').matches('rds', db_instance(), {})
+    assert Selector('Owner!=x').matches('rds', db_instance(), {})
+    assert Selector('Owner not in (a,b)').matches('rds', db_instance(), None)
+
+
+def test_wildcards_match_whole_values():
+    selector = Selector('Owner=team-?,Name!=*-old')
+    assert selector.matches('rds', db_instance(), {'Owner': 'team-a', 'Name': 'web'})
+    assert not selector.matches('rds', db_instance(), {'Owner': 'team-ab', 'Name': 'web'})
+    assert not selector.matches('rds', db_instance(), {'Owner': 'team-a', 'Name': 'web-old'})
+    # The same terms run on the EC2 server, except the negated one
+    assert selector.filters('ec2') == [{'Name': 'tag:Owner', 'Values': ['team-?']}]
+    assert not selector.matches('ec2', instance(), {'Name': 'db-old'})
+
+
+def test_count_accumulates_per_kind():
+    selector = Selector('Env=prod')
+    selector.count('rds', [db_instance(), db_instance()], 1)
+    selector.count('rds', [db_instance()], 1)
+    assert (selector.returned['rds'], selector.kept['rds']) == (3, 2)
+    assert selector.bytes['rds'] > 0
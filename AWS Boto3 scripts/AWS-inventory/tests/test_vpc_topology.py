@@ -0,0 +1,61 @@
+"""Pruning tests of the VPC topology graph (vpc_topology.py).
+
+Run from this directory or the repository root: python -m pytest
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vpc_topology import TopologyGraph, TopologySink, routed_through, topology_records  # noqa: E402
+
+
+def region_resources(suffix):
+    return {
+        'Vpc': [{'VpcId': f'vpc-{suffix}', 'State': 'available'}],
+        'Subnet': [{'SubnetId': f'subnet-{suffix}', 'VpcId': f'vpc-{suffix}'}],
+        'NatGateway': [{'NatGatewayId': f'nat-{suffix}', 'VpcId': f'vpc-{suffix}', 'SubnetId': f'subnet-{suffix}'}],
+        'RouteTable': [{'RouteTableId': f'rtb-{suffix}', 'VpcId': f'vpc-{suffix}',
+                        'Routes': [{'DestinationCidrBlock': '0.0.0.0/0', 'NatGatewayId': f'nat-{suffix}'}],
+                        'Associations': [{'Main': True}]}],
+        'EC2Instance': [{'InstanceId': f'i-{suffix}', 'VpcId': f'vpc-{suffix}', 'SubnetId': f'subnet-{suffix}'}],
+    }
+
+
+def scan(path, units):
+    """One run of the sink over {(account, region): resources}."""
+    with TopologySink(path) as sink:
+        for (account, region), resources in units.items():
+            records = topology_records(resources, account, region)
+            if records:
+                sink.write_rows(records)
+            sink.unit_scanned(account, region, True)
+    return sink
+
+
+def test_region_that_became_empty_loses_its_nodes_and_edges(tmp_path):
+    path = str(tmp_path / 'topology.db')
+    scan(path, {('111', 'us-east-1'): region_resources('a'), ('111', 'eu-west-1'): region_resources('b')})
+    sink = scan(path, {('111', 'us-east-1'): region_resources('a'), ('111', 'eu-west-1'): {}})
+
+    graph = TopologyGraph(path)
+    try:
+        assert set(graph.get(['vpc-a', 'vpc-b', 'nat-b', 'rtb-b'])) == {'vpc-a'}
+        assert routed_through(graph, 'nat-b') == (set(), set(), set())
+        assert graph.edges_from(['rtb-b', 'subnet-b', 'i-b']) == []
+        assert graph.edges_to(['vpc-b', 'subnet-b']) == []
+        assert routed_through(graph, 'nat-a') == ({'rtb-a'}, {'subnet-a'}, {'i-a', 'nat-a'})
+    finally:
+        graph.close()
+    # Only the edges of the remaining region are left
+    assert (sink.nodes, sink.edges) == (5, len([edge for record in topology_records(region_resources('a'), '111', 'us-east-1')
+                                                for edge in record['edges']]))
+
+
+def test_partial_unit_is_not_pruned(tmp_path):
+    path = str(tmp_path / 'topology.db')
+    scan(path, {('111', 'us-east-1'): region_resources('a')})
+    with TopologySink(path) as sink:
+        sink.unit_scanned('111', 'us-east-1', False)
+    assert sink.nodes == 5
+    assert sink.edges > 0
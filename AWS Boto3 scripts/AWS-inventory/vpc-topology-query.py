@@ -0,0 +1,80 @@
+"""Answer network questions from the local VPC topology graph, without API calls.
+
+The graph is written by the VPC inventory scripts run with --topology-db:
+
+    python vpc-topology-query.py routes-through nat-0abc123 --type EC2Instance
+    python vpc-topology-query.py peered vpc-0abc123
+    python vpc-topology-query.py neighbors subnet-0abc123
+
+routes-through lists the route tables sending traffic to a gateway, NAT,
+peering connection or endpoint, the subnets using them and the resources in
+those subnets. peered lists the VPCs peered with a VPC over active peering
+connections and the resources in them. neighbors lists every relationship
+of a resource. Prints one tab-separated line per resource (node ID, type,
+account, region, VPC, name, state), or JSON with --json. Exits with status 1
+if the resource is not in the graph.
+"""
+import argparse
+import json
+import sys
+import time
+
+from vpc_topology import DEFAULT_TOPOLOGY_DB, NODE_FIELDS, TopologyGraph, peered_resources, routed_through
+
+
+def node_line(node):
+    return '\t'.join('' if node.get(field) is None else str(node[field]) for field in NODE_FIELDS)
+
+
+def nodes_of(graph, node_ids, node_type=None):
+    """Graph nodes of node_ids sorted by type and ID; IDs the graph has no node for (e.g. transit gateways) get a bare one."""
+    found = graph.get(node_ids)
+    nodes = [found.get(node_id, {'node_id': node_id}) for node_id in node_ids]
+    if node_type:
+        nodes = [node for node in nodes if node.get('type') == node_type]
+    return sorted(nodes, key=lambda node: (node.get('type') or '', node['node_id']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the local VPC topology graph')
+    parser.add_argument('query', choices=['routes-through', 'peered', 'neighbors'], help='Question to answer')
+    parser.add_argument('node_id', help='Resource ID: a gateway, NAT, peering connection or endpoint for routes-through, '
+                                        'a VPC for peered, any resource for neighbors')
+    parser.add_argument('--type', help='Only list resources of this type, e.g. EC2Instance, Subnet, RouteTable')
+    parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+    parser.add_argument('--db', default=DEFAULT_TOPOLOGY_DB, help=f"Topology database (default: {DEFAULT_TOPOLOGY_DB})")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    graph = TopologyGraph(args.db)
+    if not graph.get([args.node_id]) and not graph.edges_to([args.node_id]):
+        sys.exit(f"{args.node_id} is not in the topology graph '{args.db}'; refresh it with --topology-db.")
+
+    if args.query == 'routes-through':
+        route_tables, subnets, resources = routed_through(graph, args.node_id)
+        result = {'route_tables': route_tables, 'subnets': subnets, 'resources': route_tables | subnets | resources}
+    elif args.query == 'peered':
+        connections, peers, resources = peered_resources(graph, args.node_id)
+        result = {'peering_connections': connections, 'peer_vpcs': peers, 'resources': connections | peers | resources}
+    else:
+        outgoing = graph.edges_from([args.node_id])
+        incoming = graph.edges_to([args.node_id])
+        result = {'edges': [{'src': src, 'relation': relation, 'dst': dst, 'detail': detail}
+                            for src, relation, dst, detail in outgoing + incoming],
+                  'resources': {dst for _, _, dst, _ in outgoing} | {src for src, _, _, _ in incoming}}
+
+    resources = nodes_of(graph, result.pop('resources'), args.type)
+    if args.json:
+        output = {key: sorted(value) if isinstance(value, set) else value for key, value in result.items()}
+        print(json.dumps({**output, 'resources': resources}, indent=2))
+    else:
+        for key, value in result.items():
+            if key == 'edges':
+                for edge in value:
+                    print(f"# {edge['src']} -{edge['relation']}-> {edge['dst']}" + (f" ({edge['detail']})" if edge['detail'] else ''))
+            else:
+                print(f"# {key.replace('_', ' ')}: {len(value)}")
+        for node in resources:
+            print(node_line(node))
+    graph.close()
+    print(f"{len(resources)} resources found in {(time.monotonic() - started) * 1000:.1f} ms", file=sys.stderr)
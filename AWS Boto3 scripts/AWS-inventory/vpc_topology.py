@@ -0,0 +1,297 @@
+"""VPC topology graph, filled by the VPC inventory scripts (--topology-db).
+
+Nodes are VPCs and their components, edges the relationships between them:
+
+    Subnet, RouteTable, SecurityGroup, ... -in_vpc->  Vpc
+    InternetGateway      -attached_to->       Vpc
+    Subnet               -uses_route_table->  RouteTable  (explicit or main association)
+    Subnet               -uses_network_acl->  NetworkAcl
+    RouteTable           -routes_to->         gateway, NAT, peering, endpoint, ... (detail: destination)
+    EC2Instance, NatGateway, VpcEndpoint -in_subnet-> Subnet
+    EC2Instance          -member_of->         SecurityGroup
+    VpcPeeringConnection -requester-> / -accepter-> Vpc
+
+Edges are indexed in both directions, so questions like "which instances
+route through NAT X" are answered by walking the graph in SQLite instead of
+with live API calls; see vpc-topology-query.py. This module does not import
+boto3.
+"""
+import os
+import sqlite3
+import time
+
+DEFAULT_TOPOLOGY_DB = os.environ.get('VPC_TOPOLOGY_DB', os.path.expanduser('~/.aws_vpc_topology.db'))
+
+NODE_FIELDS = ['node_id', 'type', 'account', 'region', 'vpc_id', 'name', 'state']
+
+# Route keys naming the target of a route; GatewayId also holds 'local', which is skipped
+ROUTE_TARGET_KEYS = ('GatewayId', 'NatGatewayId', 'VpcPeeringConnectionId', 'TransitGatewayId', 'NetworkInterfaceId',
+                     'InstanceId', 'EgressOnlyInternetGatewayId', 'CarrierGatewayId', 'LocalGatewayId')
+
+# Node ID key of the records of each resource type
+ID_KEYS = {
+    'Vpc': 'VpcId', 'Subnet': 'SubnetId', 'RouteTable': 'RouteTableId', 'InternetGateway': 'InternetGatewayId',
+    'SecurityGroup': 'GroupId', 'EC2Instance': 'InstanceId', 'NetworkAcl': 'NetworkAclId',
+    'VpcPeeringConnection': 'VpcPeeringConnectionId', 'NatGateway': 'NatGatewayId', 'VpcEndpoint': 'VpcEndpointId',
+}
+
+# SQLite host parameters per IN (...) list
+QUERY_BATCH_SIZE = 500
+
+
+def _name(resource_type, resource):
+    if resource_type == 'SecurityGroup':
+        return resource.get('GroupName')
+    return next((tag['Value'] for tag in resource.get('Tags', []) if tag['Key'] == 'Name'), None)
+
+
+def _state(resource):
+    state = resource.get('State') or resource.get('Status')
+    if isinstance(state, dict):
+        return state.get('Name') or state.get('Code')
+    return state
+
+
+def _edges(resource_type, resource):
+    """(relation, target, detail) of the edges leaving one resource."""
+    edges = []
+    if resource.get('VpcId') and resource_type != 'Vpc':
+        edges.append(('in_vpc', resource['VpcId'], None))
+    if resource.get('SubnetId') and resource_type != 'Subnet':
+        edges.append(('in_subnet', resource['SubnetId'], None))
+    if resource_type == 'InternetGateway':
+        edges.extend(('attached_to', attachment['VpcId'], None) for attachment in resource.get('Attachments', []))
+    elif resource_type == 'RouteTable':
+        for route in resource.get('Routes', []):
+            destination = (route.get('DestinationCidrBlock') or route.get('DestinationIpv6CidrBlock')
+                           or route.get('DestinationPrefixListId'))
+            edges.extend(('routes_to', route[key], destination) for key in ROUTE_TARGET_KEYS
+                         if route.get(key) and route[key] != 'local')
+    elif resource_type == 'EC2Instance':
+        edges.extend(('member_of', group['GroupId'], None) for group in resource.get('SecurityGroups', []))
+    elif resource_type == 'VpcPeeringConnection':
+        for relation, info_key in (('requester', 'RequesterVpcInfo'), ('accepter', 'AccepterVpcInfo')):
+            if resource.get(info_key, {}).get('VpcId'):
+                edges.append((relation, resource[info_key]['VpcId'], None))
+    elif resource_type == 'VpcEndpoint':
+        edges.extend(('in_subnet', subnet_id, None) for subnet_id in resource.get('SubnetIds', []))
+    return edges
+
+
+def topology_records(resources, account_id, region):
+    """Node records, each with its outgoing edges, of one region's describe_* records.
+
+    resources maps a resource type of ID_KEYS to its records; instances are
+    records of describe_instances' Instances, not reservations.
+    """
+    nodes = {}
+    for resource_type, records in resources.items():
+        for resource in records:
+            node_id = resource[ID_KEYS[resource_type]]
+            nodes[node_id] = {
+                'node_id': node_id, 'type': resource_type, 'account': account_id, 'region': region,
+                'vpc_id': resource.get('VpcId') if resource_type != 'VpcPeeringConnection'
+                else resource.get('RequesterVpcInfo', {}).get('VpcId'),
+                'name': _name(resource_type, resource), 'state': _state(resource),
+                'edges': _edges(resource_type, resource),
+            }
+
+    # Associations are listed on route tables, network ACLs and endpoints, but are
+    # stored as edges of the subnet (or route table) they apply to
+    main_tables, associated = {}, set()
+    for resource in resources.get('RouteTable', []):
+        for association in resource.get('Associations', []):
+            if association.get('Main'):
+                main_tables[resource['VpcId']] = resource['RouteTableId']
+            elif association.get('SubnetId') in nodes:
+                nodes[association['SubnetId']]['edges'].append(('uses_route_table', resource['RouteTableId'], None))
+                associated.add(association['SubnetId'])
+    for subnet in resources.get('Subnet', []):
+        # Subnets without an explicit association use the main route table of their VPC
+        if subnet['SubnetId'] not in associated and subnet['VpcId'] in main_tables:
+            nodes[subnet['SubnetId']]['edges'].append(('uses_route_table', main_tables[subnet['VpcId']], 'main'))
+    for resource in resources.get('NetworkAcl', []):
+        for association in resource.get('Associations', []):
+            if association.get('SubnetId') in nodes:
+                nodes[association['SubnetId']]['edges'].append(('uses_network_acl', resource['NetworkAclId'], None))
+    for resource in resources.get('VpcEndpoint', []):
+        # Gateway endpoints are reached through the route tables they are attached to
+        for route_table_id in resource.get('RouteTableIds', []):
+            if route_table_id in nodes:
+                route_table_edges = nodes[route_table_id]['edges']
+                if not any(edge[:2] == ('routes_to', resource['VpcEndpointId']) for edge in route_table_edges):
+                    route_table_edges.append(('routes_to', resource['VpcEndpointId'], resource.get('ServiceName')))
+    return list(nodes.values())
+
+
+def _batches(items):
+    items = list(items)
+    for start in range(0, len(items), QUERY_BATCH_SIZE):
+        yield items[start:start + QUERY_BATCH_SIZE]
+
+
+class TopologyGraph:
+    """SQLite tables of nodes and edges, with the edges indexed from both ends."""
+
+    def __init__(self, path=DEFAULT_TOPOLOGY_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS nodes (
+                node_id TEXT PRIMARY KEY,
+                type TEXT,
+                account TEXT,
+                region TEXT,
+                vpc_id TEXT,
+                name TEXT,
+                state TEXT,
+                indexed_at REAL NOT NULL
+            );
+            -- Stored in (src, relation) order; edges_dst indexes the other direction
+            CREATE TABLE IF NOT EXISTS edges (
+                src TEXT NOT NULL,
+                relation TEXT NOT NULL,
+                dst TEXT NOT NULL,
+                detail TEXT NOT NULL,
+                PRIMARY KEY (src, relation, dst, detail)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS edges_dst ON edges (dst, relation);
+            CREATE INDEX IF NOT EXISTS nodes_account_region ON nodes (account, region);
+        """)
+
+    def upsert(self, records, indexed_at=None):
+        """Store the node records of whole regions, replacing every edge of those regions."""
+        indexed_at = indexed_at or time.time()
+        # One delete per region, of the edges of the nodes the previous run stored for it
+        self.conn.executemany('DELETE FROM edges WHERE src IN (SELECT node_id FROM nodes WHERE account = ? AND region = ?)',
+                              {(record['account'], record['region']) for record in records})
+        # Inserting in key order keeps the B-tree updates cheap
+        records = sorted(records, key=lambda record: record['node_id'])
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO nodes ({', '.join(NODE_FIELDS)}, indexed_at) VALUES ({', '.join('?' for _ in NODE_FIELDS)}, ?)",
+            [tuple(record.get(field) for field in NODE_FIELDS) + (indexed_at,) for record in records])
+        self.conn.executemany('INSERT OR IGNORE INTO edges VALUES (?, ?, ?, ?)',
+                              sorted((record['node_id'], relation, target, detail or '')
+                                     for record in records for relation, target, detail in record['edges']))
+
+    def get(self, node_ids):
+        """Return {node_id: node} for the IDs in the graph."""
+        nodes = {}
+        for batch in _batches(node_ids):
+            rows = self.conn.execute(f"SELECT * FROM nodes WHERE node_id IN ({', '.join('?' for _ in batch)})", batch)
+            nodes.update((row['node_id'], dict(row)) for row in rows)
+        return nodes
+
+    def _edges(self, column, node_ids, relations):
+        edges = []
+        for batch in _batches(node_ids):
+            query = f"SELECT src, relation, dst, detail FROM edges WHERE {column} IN ({', '.join('?' for _ in batch)})"
+            params = list(batch)
+            if relations:
+                query += f" AND relation IN ({', '.join('?' for _ in relations)})"
+                params.extend(relations)
+            edges.extend((src, relation, dst, detail or None) for src, relation, dst, detail in self.conn.execute(query, params))
+        return edges
+
+    def edges_from(self, node_ids, relations=None):
+        """(src, relation, dst, detail) of the edges leaving node_ids."""
+        return self._edges('src', node_ids, relations)
+
+    def edges_to(self, node_ids, relations=None):
+        """(src, relation, dst, detail) of the edges arriving at node_ids."""
+        return self._edges('dst', node_ids, relations)
+
+    def prune(self, account, region, before):
+        """Delete the nodes of account/region not seen since `before`, with the edges leaving or reaching them.
+
+        upsert() only replaces the edges of regions that returned records, so
+        the edges of a region that became empty are deleted here.
+        """
+        stale = [row[0] for row in self.conn.execute(
+            'SELECT node_id FROM nodes WHERE account = ? AND region = ? AND indexed_at < ?', (account, region, before))]
+        for batch in _batches(stale):
+            placeholders = ', '.join('?' for _ in batch)
+            self.conn.execute(f'DELETE FROM edges WHERE src IN ({placeholders})', batch)
+            self.conn.execute(f'DELETE FROM edges WHERE dst IN ({placeholders})', batch)
+            self.conn.execute(f'DELETE FROM nodes WHERE node_id IN ({placeholders})', batch)
+
+    def counts(self):
+        return (self.conn.execute('SELECT COUNT(*) FROM nodes').fetchone()[0],
+                self.conn.execute('SELECT COUNT(*) FROM edges').fetchone()[0])
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def routed_through(graph, target_id):
+    """(route tables, subnets, resources) whose traffic can leave through target_id.
+
+    Follows route table -> target routes back to the subnets using those
+    tables and the instances, NAT gateways and endpoints in the subnets.
+    """
+    route_tables = {src for src, _, _, _ in graph.edges_to([target_id], ['routes_to'])}
+    subnets = {src for src, _, _, _ in graph.edges_to(route_tables, ['uses_route_table'])}
+    resources = {src for src, _, _, _ in graph.edges_to(subnets, ['in_subnet'])}
+    return route_tables, subnets, resources
+
+
+def peered_resources(graph, vpc_id):
+    """(active peering connections, peer VPCs, resources in them) reachable over peering from vpc_id.
+
+    Peering is not transitive, so only directly peered VPCs are followed.
+    """
+    connections = {src for src, _, _, _ in graph.edges_to([vpc_id], ['requester', 'accepter'])}
+    active = {node_id for node_id, node in graph.get(connections).items() if node['state'] == 'active'}
+    peers = {dst for _, _, dst, _ in graph.edges_from(active, ['requester', 'accepter']) if dst != vpc_id}
+    resources = {src for src, _, _, _ in graph.edges_to(peers, ['in_vpc', 'attached_to'])}
+    return active, peers, resources
+
+
+class TopologySink:
+    """Output sink storing the 'vpc-topology' collector rows in a TopologyGraph.
+
+    Once the run completes, the nodes that disappeared from a scanned
+    account/region are removed from the graph with their edges.
+    """
+
+    def __init__(self, path=DEFAULT_TOPOLOGY_DB):
+        self.graph = TopologyGraph(path)
+        self.filename = path
+        self.started = time.time()
+        self.rows_written = 0
+        # (account, region) units scanned completely, pruned once the run completes
+        self._scanned = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(complete=exc_type is None)
+
+    def write_rows(self, rows):
+        # The engine writes the rows of a region all at once, as upsert() needs
+        self.graph.upsert(rows, self.started)
+        self.rows_written += len(rows)
+
+    def unit_scanned(self, account, region, complete):
+        # Recorded even without rows, so a region whose last resource is gone is pruned too
+        if complete:
+            self._scanned.add((account, region))
+
+    def close(self, complete=True):
+        if complete:
+            for account, region in self._scanned:
+                self.graph.prune(account, region, self.started)
+        self.graph.commit()
+        self.nodes, self.edges = self.graph.counts()
+        self.graph.close()
+
+    def report(self):
+        print(f"VPC topology graph '{self.filename}': {self.rows_written} nodes written, "
+              f"{self.nodes} nodes and {self.edges} edges in total")
@@ -0,0 +1,181 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import boto3
+from botocore.exceptions import ClientError
+
+from ec2_helpers import chunks, client_config
+
+# AMI backups of many instances at once, replacing the one-by-one loops of
+# Script_to_take_AMI_backup.sh and AMI_backup_script_Instance_id_input.sh
+
+REPORT_FIELDS = ['Instance ID', 'Instance Name', 'AMI Name', 'AMI ID', 'State', 'Seconds', 'Error']
+
+# Report state of instance IDs that were not found; not an AMI state, so the two cannot be confused
+UNKNOWN_INSTANCE = 'unknown-instance'
+# States of backups that did not fail: 'pending' is only left without --wait
+SUCCEEDED_STATES = ('available', 'pending')
+
+def describe_instances(ec2, instance_ids):
+    """Return {instance_id: instance} for the IDs that exist, in batched calls.
+
+    An instance-id filter is used instead of InstanceIds, so an unknown ID
+    does not fail the whole batch.
+    """
+    instances = {}
+    paginator = ec2.get_paginator('describe_instances')
+    for batch in chunks(instance_ids):
+        for page in paginator.paginate(Filters=[{'Name': 'instance-id', 'Values': batch}]):
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    instances[instance['InstanceId']] = instance
+    return instances
+
+def backup_tags(instance):
+    # Tags with the reserved 'aws:' prefix cannot be set by users
+    return [tag for tag in instance.get('Tags', []) if not tag['Key'].startswith('aws:')]
+
+def create_image(ec2, instance, ami_name, copy_tags, no_reboot):
+    """Create the AMI of one instance, tagging the image and its snapshots at creation."""
+    params = {'InstanceId': instance['InstanceId'], 'Name': ami_name, 'NoReboot': no_reboot}
+    tags = backup_tags(instance) if copy_tags else []
+    if tags:
+        params['TagSpecifications'] = [{'ResourceType': 'image', 'Tags': tags},
+                                       {'ResourceType': 'snapshot', 'Tags': tags}]
+    return ec2.create_image(**params)['ImageId']
+
+def wait_for_images(ec2, results, poll_interval, timeout):
+    """Poll every pending image with one describe_images call per batch until none is pending.
+
+    Images still pending after timeout seconds are marked 'timeout'.
+    """
+    pending = {result['AMI ID']: result for result in results if result['State'] == 'pending'}
+    deadline = time.monotonic() + timeout
+    while pending:
+        if time.monotonic() > deadline:
+            print(f"Timed out waiting for {len(pending)} AMIs.")
+            for result in pending.values():
+                result['State'] = 'timeout'
+                result['Error'] = f"Still pending after {timeout:.0f} seconds"
+            return
+        time.sleep(poll_interval)
+        for batch in chunks(list(pending)):
+            try:
+                images = ec2.describe_images(ImageIds=batch)['Images']
+            except ClientError as e:
+                # New images can take a moment to become visible; poll again
+                print(f"Error polling AMI states: {e}")
+                continue
+            for image in images:
+                if image['State'] == 'pending':
+                    continue
+                result = pending.pop(image['ImageId'])
+                result['State'] = image['State']
+                result['Seconds'] = round(time.monotonic() - result.pop('_started'))
+                if image['State'] != 'available':
+                    result['Error'] = image.get('StateReason', {}).get('Message', '')
+                print(f"AMI {image['ImageId']} of instance {result['Instance ID']}: {image['State']}")
+        print(f"{len(pending)} AMIs still pending.")
+
+def write_report(results, report_file):
+    if report_file.endswith('.json'):
+        with open(report_file, 'w') as file:
+            json.dump(results, file, indent=1)
+    else:
+        with open(report_file, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(results)
+    print(f"Backup report written to '{report_file}'.")
+
+def backup_instances(instance_ids, args):
+    # Adaptive retries slow the create_image workers down when EC2 throttles them
+    ec2 = boto3.client('ec2', region_name=args.region,
+                       config=client_config(max_pool_connections=max(10, args.max_concurrency)))
+
+    # Validate every instance ID at once
+    instances = describe_instances(ec2, instance_ids)
+    results = []
+    valid = []
+    for instance_id in instance_ids:
+        if instance_id in instances:
+            valid.append(instances[instance_id])
+        else:
+            print(f"Warning: Instance ID {instance_id} is invalid or not found. Skipping.")
+            results.append({'Instance ID': instance_id, 'State': UNKNOWN_INSTANCE, 'Error': 'Instance not found'})
+
+    today = date.today().isoformat()
+
+    def backup(instance):
+        tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+        name = tags.get('Name') or 'Unnamed-Instance'
+        ami_name = args.name_format.format(name=name, instance_id=instance['InstanceId'], date=today)
+        result = {'Instance ID': instance['InstanceId'], 'Instance Name': name, 'AMI Name': ami_name,
+                  '_started': time.monotonic()}
+        try:
+            result['AMI ID'] = create_image(ec2, instance, ami_name, args.copy_tags, not args.reboot)
+            result['State'] = 'pending'
+            print(f"AMI backup created for instance {instance['InstanceId']} with AMI ID: {result['AMI ID']}")
+        except ClientError as e:
+            result['State'] = 'error'
+            result['Error'] = str(e)
+            print(f"Error creating AMI backup for {instance['InstanceId']}: {e}")
+        return result
+
+    # Create the images concurrently, up to --max-concurrency calls in flight
+    with ThreadPoolExecutor(max_workers=args.max_concurrency) as executor:
+        created = list(executor.map(backup, valid))
+    results.extend(created)
+
+    if args.wait:
+        wait_for_images(ec2, created, args.poll_interval, args.timeout)
+    for result in results:
+        result.pop('_started', None)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create AMI backups of EC2 instances in parallel')
+    parser.add_argument('instance_ids', nargs='?', help='Comma-separated instance IDs (prompted for if omitted)')
+    parser.add_argument('--file', help='Read instance IDs from a file, one per line')
+    parser.add_argument('--region', help='Region of the instances (default: the configured region)')
+    parser.add_argument('--max-concurrency', type=int, default=10,
+                        help='create_image calls in flight at once (default: 10)')
+    parser.add_argument('--name-format', default='{name}-backup-{date}',
+                        help='AMI name; {name}, {instance_id} and {date} are replaced (default: {name}-backup-{date})')
+    parser.add_argument('--no-copy-tags', dest='copy_tags', action='store_false',
+                        help='Do not copy the instance tags to the AMI and its snapshots')
+    parser.add_argument('--reboot', action='store_true', help='Let EC2 reboot the instances for consistent images')
+    parser.add_argument('--wait', action='store_true', help='Wait until every AMI is available or failed')
+    parser.add_argument('--poll-interval', type=float, default=15, help='Seconds between AMI state polls (default: 15)')
+    parser.add_argument('--timeout', type=float, default=3600, help='Seconds to wait for the AMIs (default: 3600)')
+    parser.add_argument('--report', default='ami_backup_report.csv',
+                        help='Result report; .json for JSON, CSV otherwise (default: ami_backup_report.csv)')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as file:
+            instance_ids_input = ','.join(file)
+    else:
+        # Prompt for EC2 instance IDs (comma-separated)
+        instance_ids_input = args.instance_ids or input("Enter the EC2 instance IDs (comma-separated, e.g., i-1234567890abcdef,i-abcdef1234567890): ")
+    instance_ids = list(dict.fromkeys(instance_id.strip() for instance_id in instance_ids_input.split(",") if instance_id.strip()))
+
+    if not instance_ids:
+        print("No instance IDs provided. Exiting.")
+        sys.exit(1)
+
+    results = backup_instances(instance_ids, args)
+    write_report(results, args.report)
+    # Unknown IDs are skipped with a warning, as the shell scripts did; every other backup
+    # that did not end 'available' (error, timeout, or an AMI state such as failed,
+    # invalid, deregistered, disabled or transient) fails the run
+    skipped = sum(result['State'] == UNKNOWN_INSTANCE for result in results)
+    failed = [result for result in results if result['State'] not in SUCCEEDED_STATES + (UNKNOWN_INSTANCE,)]
+    print(f"All AMI backup operations have been completed: {len(results) - len(failed) - skipped} succeeded, "
+          f"{len(failed)} failed, {skipped} skipped.")
+    sys.exit(1 if failed else 0)
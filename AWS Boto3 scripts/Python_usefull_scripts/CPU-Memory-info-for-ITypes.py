@@ -1,46 +1,135 @@
+import argparse
 import boto3
 import csv
+import json
+import os
+import time
+from botocore.exceptions import ClientError
 #this files will fetch all memory cpu inventory for all the instance types
-# Read instance types from a text file
+
+# describe_instance_types accepts at most 100 instance types per call
+BATCH_SIZE = 100
+
+# Read instance types from a text file, skipping blank lines and duplicates
 def read_instance_types(file_path):
     with open(file_path, 'r') as file:
-        return [line.strip() for line in file.readlines()]
-
-# Initialize the EC2 client
-ec2 = boto3.client('ec2')
-
-# Path to the text file with instance types
-instance_types_file = 'instance_types.txt'
-
-# Get instance types from the text file
-instance_types = read_instance_types(instance_types_file)
-
-# Create a list to hold instances details
-instances_details = []
-
-# Fetch instance type details
-for instance_type in instance_types:
-    instance_info = ec2.describe_instance_types(InstanceTypes=[instance_type])['InstanceTypes'][0]
-    vcpus = instance_info['VCpuInfo']['DefaultVCpus']
-    memory_gib = instance_info['MemoryInfo']['SizeInMiB'] / 1024  # Convert MiB to GiB
-    
-    instance_detail = {
-        'Instance Type': instance_type,
-        'CPU Capacity': vcpus,
-        'Memory Capacity (GiB)': memory_gib
+        return list(dict.fromkeys(line.strip() for line in file if line.strip()))
+
+# Load the on-disk cache: {region: {instance_type: {'VCpus', 'MemoryMiB', 'FetchedAt'}}};
+# types the API rejected are cached as {'Invalid': True, 'FetchedAt'} for the same TTL
+def load_cache(cache_file):
+    if not os.path.exists(cache_file):
+        return {}
+    with open(cache_file, 'r') as file:
+        return json.load(file)
+
+def save_cache(cache, cache_file):
+    # Write to a temporary file first so an interrupted run never leaves a corrupt cache
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'w') as file:
+        json.dump(cache, file, indent=1, sort_keys=True)
+    os.replace(temp_file, cache_file)
+
+def cache_entry(instance_info):
+    return {
+        'VCpus': instance_info['VCpuInfo']['DefaultVCpus'],
+        'MemoryMiB': instance_info['MemoryInfo']['SizeInMiB'],
+        'FetchedAt': time.time()
     }
-    
-    instances_details.append(instance_detail)
 
-# Create a CSV file and write the header row
-output_file = 'instance_capacity_details.csv'
-with open(output_file, 'w', newline='') as csvfile:
-    fieldnames = ['Instance Type', 'CPU Capacity', 'Memory Capacity (GiB)']
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    writer.writeheader()
+def invalid_entry():
+    # Cached so a stale input line is not bisected out of its batch again on every run
+    return {'Invalid': True, 'FetchedAt': time.time()}
+
+# Fetch specs for a batch of instance types, returning (specs found, invalid types)
+def describe_batch(ec2, batch):
+    try:
+        return ec2.describe_instance_types(InstanceTypes=batch)['InstanceTypes'], []
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'InvalidInstanceType':
+            raise
+        if len(batch) == 1:
+            return [], batch
+    # One bad type fails the whole call, so split the batch in halves to isolate it
+    middle = len(batch) // 2
+    found_left, invalid_left = describe_batch(ec2, batch[:middle])
+    found_right, invalid_right = describe_batch(ec2, batch[middle:])
+    return found_left + found_right, invalid_left + invalid_right
+
+# Download the whole instance type catalog for the region into the cache
+def prefetch_catalog(ec2, region_cache):
+    paginator = ec2.get_paginator('describe_instance_types')
+    for page in paginator.paginate():
+        for instance_info in page['InstanceTypes']:
+            region_cache[instance_info['InstanceType']] = cache_entry(instance_info)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetch vCPU and memory capacity for a list of instance types')
+    parser.add_argument('--input', default='instance_types.txt', help='Text file with one instance type per line')
+    parser.add_argument('--output', default='instance_capacity_details.csv', help='CSV file to write')
+    parser.add_argument('--region', default=None, help='Region to query (default: the configured region)')
+    parser.add_argument('--cache-file', default='instance_types_cache.json', help='On-disk cache of instance type specs')
+    parser.add_argument('--ttl-days', type=float, default=30, help='Days before a cached entry is fetched again')
+    parser.add_argument('--prefetch', action='store_true', help='Cache the full instance type catalog of the region')
+    parser.add_argument('--offline', action='store_true', help='Only use the cache, never call the API')
+    args = parser.parse_args()
+
+    # Initialize the EC2 client
+    ec2 = None if args.offline else boto3.client('ec2', region_name=args.region)
+    region = args.region or (ec2.meta.region_name if ec2 else boto3.session.Session().region_name) or 'default'
+
+    cache = load_cache(args.cache_file)
+    region_cache = cache.setdefault(region, {})
+
+    if args.prefetch and not args.offline:
+        prefetch_catalog(ec2, region_cache)
+        print(f"Cached {len(region_cache)} instance types for region {region}.")
+
+    # Get unique instance types from the text file
+    instance_types = read_instance_types(args.input)
+
+    # Only look up types that are missing from the cache or have expired
+    max_age = args.ttl_days * 24 * 3600
+    stale = [instance_type for instance_type in instance_types
+             if instance_type not in region_cache or time.time() - region_cache[instance_type]['FetchedAt'] > max_age]
+    if args.offline:
+        stale = [instance_type for instance_type in stale if instance_type not in region_cache]
+        for instance_type in stale:
+            print(f"Warning: {instance_type} is not in the cache. Skipping.")
+    else:
+        for i in range(0, len(stale), BATCH_SIZE):
+            found, invalid = describe_batch(ec2, stale[i:i + BATCH_SIZE])
+            for instance_info in found:
+                region_cache[instance_info['InstanceType']] = cache_entry(instance_info)
+            for instance_type in invalid:
+                region_cache[instance_type] = invalid_entry()
+        batches = (len(stale) + BATCH_SIZE - 1) // BATCH_SIZE
+        print(f"Looked up {len(stale)} instance types in {batches} batches, {len(instance_types) - len(stale)} from cache.")
+        save_cache(cache, args.cache_file)
+
+    # Create a list to hold instances details
+    instances_details = []
+    for instance_type in instance_types:
+        if instance_type not in region_cache:
+            continue
+        spec = region_cache[instance_type]
+        if spec.get('Invalid'):
+            print(f"Warning: {instance_type} is not a valid instance type. Skipping.")
+            continue
+        instances_details.append({
+            'Instance Type': instance_type,
+            'CPU Capacity': spec['VCpus'],
+            'Memory Capacity (GiB)': spec['MemoryMiB'] / 1024  # Convert MiB to GiB
+        })
+
+    # Create a CSV file and write the header row
+    with open(args.output, 'w', newline='') as csvfile:
+        fieldnames = ['Instance Type', 'CPU Capacity', 'Memory Capacity (GiB)']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
 
-    # Write instance details rows
-    for instance in instances_details:
-        writer.writerow(instance)
+        # Write instance details rows
+        for instance in instances_details:
+            writer.writerow(instance)
 
-print(f"CSV file '{output_file}' has been created successfully.")
+    print(f"CSV file '{args.output}' has been created successfully.")
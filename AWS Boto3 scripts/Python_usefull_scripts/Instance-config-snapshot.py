@@ -0,0 +1,147 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+from ec2_helpers import chunks
+
+# Backs up the describe-instances config of EC2 instances, like
+# Config_backup_for_instance.sh, into a deduplicated snapshot store:
+#
+#   STORE/objects/ab/abcdef....json.gz   canonical JSON, named by its SHA-256
+#   STORE/history.db                     (instance, time, hash) of every change
+#
+# A config is only written when it differs from the instance's last snapshot.
+
+# Largest describe_instances page
+PAGE_SIZE = 1000
+
+def describe_instances(ec2, instance_ids=None):
+    """Yield every instance (or those of instance_ids) with as few describe_instances calls as possible."""
+    paginator = ec2.get_paginator('describe_instances')
+    if instance_ids:
+        # An instance-id filter, unlike InstanceIds, does not fail the batch on an unknown ID
+        batches = [{'Filters': [{'Name': 'instance-id', 'Values': batch}]} for batch in chunks(instance_ids)]
+    else:
+        batches = [{}]
+    for params in batches:
+        for page in paginator.paginate(PaginationConfig={'PageSize': PAGE_SIZE}, **params):
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    yield reservation['OwnerId'], instance
+
+def canonical_json(instance):
+    # Sorted keys and fixed separators give identical bytes for identical configs
+    return json.dumps(instance, sort_keys=True, separators=(',', ':'), default=str).encode()
+
+class SnapshotStore:
+    """Content-addressed, gzip-compressed config objects plus an SQLite history of changes."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(path, 'history.db'))
+        self.db.execute("""CREATE TABLE IF NOT EXISTS history (
+            instance_id TEXT, taken_at REAL, hash TEXT, name TEXT, account TEXT, region TEXT)""")
+        self.db.execute('CREATE INDEX IF NOT EXISTS history_instance ON history (instance_id, taken_at)')
+
+    def object_path(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], digest + '.json.gz')
+
+    def latest_hashes(self):
+        """{instance_id: hash of its latest snapshot}."""
+        return dict(self.db.execute("""SELECT instance_id, hash FROM history h WHERE taken_at =
+            (SELECT MAX(taken_at) FROM history WHERE instance_id = h.instance_id)"""))
+
+    def put(self, content):
+        """Store content under its SHA-256 unless an identical object exists; return the hash."""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + '.tmp'
+            # mtime=0 keeps the compressed bytes stable too
+            with gzip.GzipFile(temp_path, 'wb', mtime=0) as file:
+                file.write(content)
+            os.replace(temp_path, path)
+        return digest
+
+    def get(self, digest):
+        with gzip.open(self.object_path(digest)) as file:
+            return json.load(file)
+
+    def record(self, rows):
+        self.db.executemany('INSERT INTO history VALUES (?, ?, ?, ?, ?, ?)', rows)
+        self.db.commit()
+
+    def history(self, instance_id):
+        return self.db.execute('SELECT taken_at, hash, name FROM history WHERE instance_id = ? ORDER BY taken_at',
+                               (instance_id,)).fetchall()
+
+def snapshot(ec2, store, instance_ids=None):
+    """Snapshot the instances whose config changed; returns (instances seen, snapshots written)."""
+    latest = store.latest_hashes()
+    taken_at = time.time()
+    region = ec2.meta.region_name
+    seen, rows = set(), []
+    for account_id, instance in describe_instances(ec2, instance_ids):
+        instance_id = instance['InstanceId']
+        seen.add(instance_id)
+        name = next((tag['Value'] for tag in instance.get('Tags', []) if tag['Key'] == 'Name'), instance_id)
+        digest = store.put(canonical_json(instance))
+        if latest.get(instance_id) != digest:
+            rows.append((instance_id, taken_at, digest, name, account_id, region))
+            print(f"Backup for instance {instance_id} ({name}) saved as {digest[:12]}.")
+    store.record(rows)
+    for instance_id in instance_ids or []:
+        if instance_id not in seen:
+            print(f"Warning: Instance ID {instance_id} is invalid or not found. Skipping.")
+    return len(seen), len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Back up EC2 instance configs into a deduplicated snapshot store')
+    parser.add_argument('instance_ids', nargs='?', help='Comma-separated instance IDs (prompted for unless --all)')
+    parser.add_argument('--all', action='store_true', help='Back up every instance of the region')
+    parser.add_argument('--region', help='Region of the instances (default: the configured region)')
+    parser.add_argument('--store', default='instance_config_snapshots', help='Snapshot store directory (default: instance_config_snapshots)')
+    parser.add_argument('--history', metavar='INSTANCE_ID', help='List the snapshots of an instance and exit')
+    parser.add_argument('--show', metavar='INSTANCE_ID[@HASH]', help='Print the latest (or the given) snapshot of an instance and exit')
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.store)
+
+    if args.history:
+        for taken_at, digest, name in store.history(args.history):
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(taken_at))}  {digest}  {name}")
+        sys.exit(0)
+    if args.show:
+        instance_id, _, digest = args.show.partition('@')
+        snapshots = store.history(instance_id)
+        matches = [row[1] for row in snapshots if row[1].startswith(digest)]
+        if not matches:
+            sys.exit(f"No snapshot of {args.show} in '{args.store}'.")
+        print(json.dumps(store.get(matches[-1]), indent=4, sort_keys=True))
+        sys.exit(0)
+
+    instance_ids = None
+    if not args.all:
+        # Prompt for EC2 instance IDs (comma-separated)
+        instance_ids_input = args.instance_ids or input("Enter the EC2 instance IDs (comma-separated, e.g., i-1234567890abcdef,i-abcdef1234567890): ")
+        instance_ids = list(dict.fromkeys(instance_id.strip() for instance_id in instance_ids_input.split(",") if instance_id.strip()))
+        if not instance_ids:
+            print("No instance IDs provided. Exiting.")
+            sys.exit(1)
+
+    ec2 = boto3.client('ec2', region_name=args.region)
+    try:
+        seen, written = snapshot(ec2, store, instance_ids)
+    except ClientError as e:
+        sys.exit(f"Error describing instances: {e}")
+    print(f"{seen} instances checked, {written} changed configs saved to '{args.store}'.")
@@ -1,21 +1,49 @@
+import argparse
+import sys
+import time
+
 import boto3
+from botocore.exceptions import BotoCoreError, ClientError
 
-def get_instance_details(instance_ids):
-    # Initialize EC2 client
-    ec2_client = boto3.client('ec2')
+from ec2_helpers import THROTTLE_CODES, chunks
 
-    # Fetch instance details
-    try:
-        response = ec2_client.describe_instances(InstanceIds=instance_ids)
-    except ec2_client.exceptions.ClientError as e:
-        print(f"Error fetching instance details: {e}")
-        return
+# InstanceIds accepted per describe_instance_status call
+STATUS_BATCH_SIZE = 100
 
-    # Print the header
-    print(f"{'Instance ID':<20}{'Instance Name':<25}{'Private IP':<15}{'State':<15}{'Instance Type':<15}{'State Transition Reason':<35}{'Status Checks (3/3)':<20}")
+ROW_FORMAT = "{:<20}{:<25}{:<15}{:<15}{:<15}{:<35}{:<20}"
+HEADER = ROW_FORMAT.format('Instance ID', 'Instance Name', 'Private IP', 'State', 'Instance Type', 'State Transition Reason', 'Status Checks (3/3)')
 
-    # Process each instance in the response
-    for reservation in response.get('Reservations', []):
+def get_status_checks(ec2_client, instance_ids):
+    """Fetch instance/system status checks for all IDs, one call per 100 IDs, keyed by instance ID."""
+    status_checks = {}
+    paginator = ec2_client.get_paginator('describe_instance_status')
+    for batch in chunks(instance_ids, STATUS_BATCH_SIZE):
+        # IncludeAllInstances also returns stopped/pending instances, which report 'not-applicable'
+        for page in paginator.paginate(InstanceIds=batch, IncludeAllInstances=True):
+            for instance_status in page.get('InstanceStatuses', []):
+                instance_check = instance_status.get('InstanceStatus', {}).get('Status', 'N/A')
+                system_check = instance_status.get('SystemStatus', {}).get('Status', 'N/A')
+                status_checks[instance_status['InstanceId']] = f"{instance_check}/{system_check}"
+    return status_checks
+
+def fetch_instance_rows(ec2_client, instance_ids):
+    """Return one formatted table row per instance, in the order EC2 returns them."""
+    reservations = []
+    paginator = ec2_client.get_paginator('describe_instances')
+    for page in paginator.paginate(InstanceIds=instance_ids):
+        reservations.extend(page.get('Reservations', []))
+
+    # Fetch 3/3 status checks for every instance at once and join them in memory
+    try:
+        status_checks = get_status_checks(ec2_client, instance_ids)
+        status_error = None
+    except ClientError as e:
+        if e.response['Error']['Code'] in THROTTLE_CODES:
+            raise
+        status_checks, status_error = {}, f"Error: {e}"
+
+    rows = []
+    for reservation in reservations:
         for instance in reservation.get('Instances', []):
             instance_id = instance.get('InstanceId', 'N/A')
             private_ip = instance.get('PrivateIpAddress', 'N/A')
@@ -27,29 +55,85 @@ def get_instance_details(instance_ids):
             tags = instance.get('Tags', [])
             name = next((tag['Value'] for tag in tags if tag['Key'] == 'Name'), 'N/A')
 
-            # Fetch 3/3 status checks
-            try:
-                status_response = ec2_client.describe_instance_status(InstanceIds=[instance_id])
-                instance_statuses = status_response.get('InstanceStatuses', [])
-                if instance_statuses:
-                    instance_status = instance_statuses[0]
-                    instance_check = instance_status.get('InstanceStatus', {}).get('Status', 'N/A')
-                    system_check = instance_status.get('SystemStatus', {}).get('Status', 'N/A')
-                    status_checks = f"{instance_check}/{system_check}"
-                else:
-                    status_checks = "N/A"
-            except Exception as e:
-                status_checks = f"Error: {e}"
-
-            # Format and print each row
-            print(f"{instance_id:<20}{name:<25}{private_ip:<15}{state:<15}{instance_type:<15}{state_transition_reason:<35}{status_checks:<20}")
+            status = status_error or status_checks.get(instance_id, 'N/A')
+            rows.append(ROW_FORMAT.format(instance_id, name, private_ip, state, instance_type, state_transition_reason, status))
+    return rows
+
+def get_instance_details(instance_ids):
+    # Initialize EC2 client
+    ec2_client = boto3.client('ec2')
+
+    # Fetch instance details
+    try:
+        rows = fetch_instance_rows(ec2_client, instance_ids)
+    except ClientError as e:
+        print(f"Error fetching instance details: {e}")
+        return
+
+    # Print the header and each row
+    print(HEADER)
+    for row in rows:
+        print(row)
+
+def watch_instance_details(instance_ids, interval, max_interval=300):
+    """Refresh the table every interval seconds, redrawing only the rows that changed.
+
+    When EC2 throttles the refresh the interval is doubled (up to max_interval),
+    and it shrinks back towards the requested interval after successful refreshes.
+    Other errors, such as expired credentials or AccessDenied, are shown on the
+    status line below the last table drawn and the refresh is retried next tick.
+    """
+    ec2_client = boto3.client('ec2')
+    current_interval = interval
+    drawn_rows = None
+
+    while True:
+        try:
+            rows = fetch_instance_rows(ec2_client, instance_ids)
+            current_interval = max(interval, current_interval / 2)
+            status = f"Last refresh {time.strftime('%H:%M:%S')}, next in {current_interval:.0f}s (Ctrl-C to stop)"
+        except (BotoCoreError, ClientError) as e:
+            rows = drawn_rows or []
+            if isinstance(e, ClientError) and e.response['Error']['Code'] in THROTTLE_CODES:
+                current_interval = min(max_interval, current_interval * 2)
+                status = f"Throttled at {time.strftime('%H:%M:%S')}, backing off to {current_interval:.0f}s"
+            else:
+                status = f"Refresh failed at {time.strftime('%H:%M:%S')}, retrying in {current_interval:.0f}s: {e}"
+
+        if drawn_rows is None or len(rows) != len(drawn_rows):
+            # First draw, or the set of rows changed: print the whole table
+            print(HEADER)
+            for row in rows:
+                print(row)
+        else:
+            # Move the cursor up to each changed row and rewrite it in place
+            for index, row in enumerate(rows):
+                if row != drawn_rows[index]:
+                    lines_up = len(rows) - index + 1
+                    sys.stdout.write(f"\033[{lines_up}A\r\033[2K{row}\033[{lines_up}B\r")
+            sys.stdout.write("\033[1A\r\033[2K")  # Rewrite the status line below the table
+        print(status)
+        sys.stdout.flush()
+        drawn_rows = rows
+
+        time.sleep(current_interval)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show state and 3/3 status checks for EC2 instances')
+    parser.add_argument('instance_ids', nargs='?', help='Comma-separated instance IDs (prompted for if omitted)')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='Refresh the table every SECONDS seconds')
+    args = parser.parse_args()
+
     # Prompt for EC2 instance IDs (comma-separated)
-    instance_ids_input = input("Enter the EC2 instance IDs (comma-separated, e.g., i-1234567890abcdef,i-abcdef1234567890): ")
+    instance_ids_input = args.instance_ids or input("Enter the EC2 instance IDs (comma-separated, e.g., i-1234567890abcdef,i-abcdef1234567890): ")
     instance_ids = [instance_id.strip() for instance_id in instance_ids_input.split(",") if instance_id.strip()]
 
     if not instance_ids:
         print("No instance IDs provided. Exiting.")
+    elif args.watch:
+        try:
+            watch_instance_details(instance_ids, args.watch)
+        except KeyboardInterrupt:
+            pass
     else:
         get_instance_details(instance_ids)
@@ -0,0 +1,207 @@
+import argparse
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+
+from ec2_helpers import chunks, client_config
+
+# Tags EBS volumes from their attachments, like adding_volume_tags.sh, but
+# with one bulk scan per region and batched create_tags calls
+
+# create_tags accepts up to 1000 resource IDs; AWS recommends smaller batches
+TAG_BATCH_SIZE = 500
+
+print_lock = threading.Lock()
+
+def log(message):
+    # Regions run in parallel; keep their lines whole
+    with print_lock:
+        print(message)
+
+def tag_dict(tags):
+    return {tag['Key']: tag['Value'] for tag in tags or []}
+
+def scan_volumes(ec2, instance_ids=None):
+    """All attached volumes of the region, or only those of instance_ids, with one paginated scan."""
+    paginator = ec2.get_paginator('describe_volumes')
+    if not instance_ids:
+        pages = paginator.paginate(Filters=[{'Name': 'attachment.status', 'Values': ['attached']}])
+        return [volume for page in pages for volume in page['Volumes']]
+    volumes = []
+    for batch in chunks(instance_ids):
+        for page in paginator.paginate(Filters=[{'Name': 'attachment.instance-id', 'Values': batch}]):
+            volumes.extend(page['Volumes'])
+    return volumes
+
+def scan_instance_tags(ec2, instance_ids):
+    """{instance_id: tags} of the given instances, in batched describe_instances calls."""
+    instance_tags = {}
+    paginator = ec2.get_paginator('describe_instances')
+    for batch in chunks(instance_ids):
+        for page in paginator.paginate(Filters=[{'Name': 'instance-id', 'Values': batch}]):
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    instance_tags[instance['InstanceId']] = tag_dict(instance.get('Tags'))
+    return instance_tags
+
+def desired_tags(volume, static_tags, instance_tags, copy_keys, instance_ids=None):
+    """Tags a volume should carry: its device name, the static tags and the copied instance tags.
+
+    Every attachment (to instance_ids, if given) is considered. A Multi-Attach
+    volume whose attachments disagree on the device name or the copied tags
+    returns None and is skipped, as one tag cannot hold several values.
+    """
+    candidates = []
+    for attachment in volume['Attachments']:
+        if instance_ids is not None and attachment['InstanceId'] not in instance_ids:
+            continue
+        tags = {'Device_Name': attachment['Device'], **static_tags}
+        source = instance_tags.get(attachment['InstanceId'], {})
+        tags.update({key: source[key] for key in copy_keys if key in source})
+        candidates.append(tags)
+    if not candidates or any(tags != candidates[0] for tags in candidates[1:]):
+        return None
+    return candidates[0]
+
+def group_changes(changes):
+    """Group {volume_id: {key: value}} into {tag set: [volume IDs]} for batched create_tags calls.
+
+    Volumes needing identical changes share calls. When copied instance tags
+    make most sets unique, grouping by single tag needs fewer calls instead;
+    the cheaper grouping is returned.
+    """
+    by_set, by_tag = {}, {}
+    for volume_id, tags in changes.items():
+        by_set.setdefault(tuple(sorted(tags.items())), []).append(volume_id)
+        for tag in tags.items():
+            by_tag.setdefault((tag,), []).append(volume_id)
+
+    def calls(groups):
+        return sum(-(-len(volume_ids) // TAG_BATCH_SIZE) for volume_ids in groups.values())
+    return by_set if calls(by_set) <= calls(by_tag) else by_tag
+
+def plan_region(ec2, instance_ids, static_tags, copy_keys):
+    """Plan the tags missing from the volumes of one region.
+
+    Returns ({tag set: [volume IDs]} grouped into batches, the instance_ids
+    found in the region, the Multi-Attach volumes skipped).
+    """
+    volumes = [volume for volume in scan_volumes(ec2, instance_ids) if volume.get('Attachments')]
+    instance_tags = {}
+    if instance_ids:
+        # Also tells which of the given instances exist in this region
+        instance_tags = scan_instance_tags(ec2, instance_ids)
+    elif copy_keys:
+        attached = list(dict.fromkeys(attachment['InstanceId'] for volume in volumes for attachment in volume['Attachments']))
+        instance_tags = scan_instance_tags(ec2, attached)
+    requested = set(instance_ids) if instance_ids else None
+    changes, skipped = {}, []
+    for volume in volumes:
+        desired = desired_tags(volume, static_tags, instance_tags, copy_keys, requested)
+        if desired is None:
+            skipped.append(volume['VolumeId'])
+            continue
+        existing = tag_dict(volume.get('Tags'))
+        # Only tags that are missing or differ are written, so reruns change nothing
+        missing = {key: value for key, value in desired.items() if existing.get(key) != value}
+        if missing:
+            changes[volume['VolumeId']] = missing
+    found = set(instance_tags) if instance_ids else set()
+    return group_changes(changes), found, skipped
+
+def create_tags(ec2, volume_ids, tags):
+    return ec2.create_tags(Resources=volume_ids, Tags=[{'Key': key, 'Value': value} for key, value in tags])
+
+def propagate_region(ec2, region, args, static_tags, copy_keys):
+    """Plan and apply the tags of one region; returns (volumes tagged, calls failed, instance IDs found)."""
+    try:
+        plan, found, skipped = plan_region(ec2, args.instance_ids, static_tags, copy_keys)
+    except ClientError as e:
+        log(f"Error scanning volumes in region {region}: {e}")
+        return 0, 1, set()
+    if skipped:
+        log(f"[{region}] skipped {len(skipped)} Multi-Attach volumes whose attachments need different tags: "
+            f"{', '.join(skipped)}")
+
+    tagged, failed = set(), 0
+    for tags, volume_ids in sorted(plan.items()):
+        tag_text = ', '.join(f"{key}={value}" for key, value in tags)
+        if args.dry_run:
+            log(f"[{region}] would tag {len(volume_ids)} volumes with {tag_text}: {', '.join(volume_ids[:5])}"
+                f"{' ...' if len(volume_ids) > 5 else ''}")
+            continue
+        for batch in chunks(volume_ids, TAG_BATCH_SIZE):
+            try:
+                create_tags(ec2, batch, tags)
+                tagged.update(batch)
+                log(f"[{region}] tagged {len(batch)} volumes with {tag_text}")
+            except ClientError as e:
+                failed += 1
+                log(f"[{region}] error tagging {len(batch)} volumes with {tag_text}: {e}")
+    if not plan:
+        log(f"[{region}] all volumes already carry their tags")
+    return len(tagged), failed, found
+
+def parse_tags(values):
+    tags = {}
+    for value in values:
+        key, separator, tag_value = value.partition('=')
+        if not separator:
+            sys.exit(f"Invalid tag '{value}', expected KEY=VALUE")
+        tags[key] = tag_value
+    return tags
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tag EBS volumes with their device name and other tags, in bulk')
+    parser.add_argument('instance_ids', nargs='?', help='Comma-separated instance IDs (prompted for unless --all)')
+    parser.add_argument('--all', action='store_true', help='Tag every attached volume of the regions')
+    parser.add_argument('--regions', help='Comma-separated regions (default: the configured region; "all" for every region)')
+    parser.add_argument('--tag', action='append', default=None, metavar='KEY=VALUE',
+                        help='Tag to set on every volume, repeatable (default: Project_CSI=Yes)')
+    parser.add_argument('--copy-instance-tags', default='', metavar='KEYS',
+                        help='Comma-separated instance tag keys to copy to the volumes, e.g. Name,Env')
+    parser.add_argument('--max-workers', type=int, default=4, help='Regions processed in parallel (default: 4)')
+    parser.add_argument('--dry-run', action='store_true', help='Print the tagging plan without changing anything')
+    args = parser.parse_args()
+
+    if args.all:
+        args.instance_ids = None
+    else:
+        # Prompt for EC2 instance IDs (comma-separated)
+        instance_ids_input = args.instance_ids or input("Enter the EC2 instance IDs (comma-separated, e.g., i-1234567890abcdef,i-abcdef1234567890): ")
+        args.instance_ids = list(dict.fromkeys(instance_id.strip() for instance_id in instance_ids_input.split(",") if instance_id.strip()))
+        if not args.instance_ids:
+            print("No instance IDs provided. Exiting.")
+            sys.exit(1)
+
+    static_tags = parse_tags(args.tag if args.tag is not None else ['Project_CSI=Yes'])
+    copy_keys = [key.strip() for key in args.copy_instance_tags.split(',') if key.strip()]
+
+    if args.regions == 'all':
+        regions = [region['RegionName'] for region in boto3.client('ec2').describe_regions()['Regions']]
+    elif args.regions:
+        regions = [region.strip() for region in args.regions.split(',') if region.strip()]
+    else:
+        regions = [boto3.session.Session().region_name]
+
+    # Clients are created here: boto3's default session is not thread-safe, the clients are
+    clients = {region: boto3.client('ec2', region_name=region, config=client_config()) for region in regions}
+    with ThreadPoolExecutor(max_workers=max(1, args.max_workers)) as executor:
+        results = list(executor.map(lambda region: propagate_region(clients[region], region, args, static_tags, copy_keys),
+                                    regions))
+
+    tagged = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    if args.instance_ids:
+        # Unknown IDs are skipped with a warning, as adding_volume_tags.sh did
+        found = set().union(*(result[2] for result in results))
+        unknown = [instance_id for instance_id in args.instance_ids if instance_id not in found]
+        if unknown:
+            print(f"Warning: {len(unknown)} instance IDs are invalid or not found in {', '.join(regions)}. "
+                  f"Skipping: {', '.join(unknown)}")
+    if not args.dry_run:
+        print(f"Script execution completed: {tagged} volumes tagged, {failed} failed calls.")
+    sys.exit(1 if failed else 0)
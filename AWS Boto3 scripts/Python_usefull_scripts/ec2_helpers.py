@@ -0,0 +1,26 @@
+"""Constants and helpers shared by the EC2 scripts in this directory."""
+from botocore.config import Config
+
+# Values accepted per describe_* filter or ID list
+FILTER_BATCH_SIZE = 200
+
+# Error codes returned when EC2 throttles the caller
+THROTTLE_CODES = ('RequestLimitExceeded', 'Throttling', 'ThrottlingException')
+
+# Attempts of a throttled call; botocore's adaptive mode backs off between them
+MAX_ATTEMPTS = 10
+
+
+def client_config(**options):
+    """botocore Config with adaptive retries, the only retries of these scripts.
+
+    Adaptive mode backs off with jitter and slows down every worker sharing
+    the client while EC2 throttles it. options are further Config arguments,
+    e.g. max_pool_connections.
+    """
+    return Config(retries={'mode': 'adaptive', 'max_attempts': MAX_ATTEMPTS}, **options)
+
+
+def chunks(items, size=FILTER_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,224 @@
+"""Benchmark the inventory scripts against synthetic fleets, offline.
+
+Every (script, fleet size) case runs in its own process against the local
+AWS stand-in in synthetic_aws.py and records wall time, API calls per
+operation and peak memory. Results are compared with a stored baseline and
+any regression makes the run exit with status 1:
+
+    python benchmark-inventory.py --sizes small,medium --save-baseline
+    python benchmark-inventory.py --sizes small,medium
+
+API call counts are deterministic and compared exactly, so the committed
+baseline holds only those. Wall time and peak memory depend on the machine:
+--save-baseline --with-timings stores them too, tagged with the machine they
+were measured on, and they are only compared (within --tolerance) on that
+same machine.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+
+from synthetic_aws import BASE_TIME, FLEET_SIZES, INSTANCE_TYPES, REGIONS, hex_id
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCHMARK_DIR)
+
+# Benchmark cases: name -> (script relative to 'AWS Boto3 scripts', default arguments)
+CASES = {
+    'ec2-single-account': ('AWS-inventory/AWS-ec2-inventory-ec2-single-account.py', []),
+    'ec2-org': ('AWS-inventory/AWS_inventory_accross_account-ec2.py', []),
+    'rds-org': ('AWS-inventory/AWS_inventory_accross_account-rds.py', []),
+    'vpc': ('AWS-inventory/VPC-related-network-component-inventory.py', []),
+    'all-org': ('AWS-inventory/AWS_inventory_accross_account-all.py', []),
+    'all-org-config': ('AWS-inventory/AWS_inventory_accross_account-all.py', ['--config-aggregator', 'org-aggregator']),
+    'instance-types': ('Python_usefull_scripts/CPU-Memory-info-for-ITypes.py', ['--region', 'us-east-1']),
+    'ami-backup': ('Python_usefull_scripts/AMI-backup.py',
+                   ['--file', 'ami_instances.txt', '--region', 'us-east-1', '--wait', '--poll-interval', '0.5']),
+    'volume-tags': ('Python_usefull_scripts/Volume-tag-propagation.py', ['--all', '--regions', 'all']),
+    'config-snapshot': ('Python_usefull_scripts/Instance-config-snapshot.py', ['--all', '--region', 'us-east-1']),
+    'capacity-rollup': ('AWS-inventory/capacity-rollup.py', ['inventory.csv']),
+}
+
+# Instances backed up by the ami-backup case, as in a nightly backup run
+AMI_BACKUP_INSTANCES = 400
+
+DEFAULT_CASES = ['ec2-single-account', 'rds-org', 'vpc', 'instance-types']
+
+# Operations polled until a state changes; their count depends on timing and is compared with --tolerance
+POLLED_OPERATIONS = {'ec2.DescribeImages'}
+
+# Machine-dependent measurements, only compared against a baseline recorded on this machine
+TIMINGS = (('wall_seconds', 's'), ('peak_rss_mib', ' MiB'))
+
+
+def machine_id():
+    return f"{platform.node()}/{platform.machine()}/{os.cpu_count()} CPUs/Python {platform.python_version()}"
+
+
+def prepare_workdir(case, size, workdir):
+    """Create the input files a case reads from its working directory."""
+    if case == 'instance-types':
+        # One line per instance, as exported from an inventory, plus a type that no longer exists
+        with open(os.path.join(workdir, 'instance_types.txt'), 'w') as file:
+            for index in range(FLEET_SIZES[size]['instances']):
+                file.write(INSTANCE_TYPES[index % len(INSTANCE_TYPES)][0] + '\n')
+            file.write('m1.retired\n')
+    if case == 'ami-backup':
+        # Instances of the first region, plus an ID that does not exist
+        with open(os.path.join(workdir, 'ami_instances.txt'), 'w') as file:
+            for index in range(min(AMI_BACKUP_INSTANCES, FLEET_SIZES[size]['instances'] // 4)):
+                file.write(hex_id('i', 0, index) + '\n')
+            file.write('i-0fffffffffffffffff\n')
+    if case == 'capacity-rollup':
+        write_capacity_inputs(size, workdir)
+
+
+def write_capacity_inputs(size, workdir):
+    """An EC2 inventory CSV of the fleet and an instance type cache missing its largest type."""
+    fields = ['Account Number', 'Instance ID', 'Region', 'State', 'Env', 'Grade', 'Instance Type', 'Volume Sizes']
+    with open(os.path.join(workdir, 'inventory.csv'), 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        for index in range(FLEET_SIZES[size]['instances']):
+            writer.writerow({
+                'Account Number': f"{index % 5:012d}", 'Instance ID': hex_id('i', 0, index),
+                'Region': REGIONS[index % len(REGIONS)], 'State': ['running', 'stopped'][index % 7 == 0],
+                'Env': ['prod', 'stage', 'dev'][index % 3], 'Grade': ['prod', 'nonprod'][index % 2],
+                'Instance Type': INSTANCE_TYPES[index % len(INSTANCE_TYPES)][0],
+                'Volume Sizes': ', '.join(f"{size}GiB" for size in [8, 50 + index % 450][:1 + index % 2]),
+            })
+    fetched_at = BASE_TIME.timestamp()
+    cache = {'us-east-1': {name: {'VCpus': vcpus, 'MemoryMiB': memory, 'FetchedAt': fetched_at}
+                           for name, vcpus, memory in INSTANCE_TYPES[:-1]}}
+    with open(os.path.join(workdir, 'instance_types_cache.json'), 'w') as file:
+        json.dump(cache, file)
+
+
+def run_case(case, size, extra_args, verbose=False, throttling=False):
+    """Run one case in a fresh process and working directory and return its measurements."""
+    script, default_args = CASES[case]
+    with tempfile.TemporaryDirectory(prefix=f"bench-{case}-") as workdir:
+        prepare_workdir(case, size, workdir)
+        result_file = os.path.join(workdir, 'result.json')
+        command = [sys.executable, os.path.join(BENCHMARK_DIR, 'synthetic_aws.py'), size, result_file,
+                   os.path.join(SCRIPTS_DIR, script)] + default_args + extra_args
+        output = None if verbose else subprocess.DEVNULL
+        env = dict(os.environ, SYNTHETIC_AWS_THROTTLING='1' if throttling else '0')
+        subprocess.run(command, cwd=workdir, stdout=output, env=env, check=False)
+        with open(result_file) as file:
+            return json.load(file)
+
+
+def compare(result, baseline, tolerance, same_machine):
+    """Return the regressions of result against its baseline entry, as messages."""
+    regressions = []
+    for operation, calls in sorted(result['api_calls'].items()):
+        baseline_calls = baseline['api_calls'].get(operation, 0)
+        allowed = baseline_calls * (1 + tolerance) if operation in POLLED_OPERATIONS else baseline_calls
+        if calls > allowed:
+            regressions.append(f"{operation}: {calls} calls (baseline {baseline_calls})")
+    if not same_machine:
+        return regressions
+    for metric, unit in TIMINGS:
+        if result.get(metric) and baseline.get(metric) and result[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append(f"{metric}: {result[metric]:.2f}{unit} (baseline {baseline[metric]:.2f}{unit})")
+    return regressions
+
+
+def baseline_entry(result, with_timings):
+    entry = {'api_calls': result['api_calls']}
+    if with_timings:
+        entry.update((metric, result[metric]) for metric, _ in TIMINGS)
+    return entry
+
+
+def print_result(key, result):
+    total_calls = sum(result['api_calls'].values())
+    total_bytes = sum(result['payload_bytes'].values())
+    throttled = sum(result.get('throttled_calls', {}).values())
+    status = f"  ERROR {result['error']}" if result['error'] else ''
+    if throttled:
+        status += f"  ({throttled} throttled)"
+    print(f"{key:<32}{result['wall_seconds']:>9.2f}s{result['peak_rss_mib']:>9.1f} MiB"
+          f"{total_calls:>8} calls{total_bytes / 1024 / 1024:>9.1f} MiB payload{status}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmark of the inventory scripts on synthetic fleets')
+    parser.add_argument('--cases', default=','.join(DEFAULT_CASES),
+                        help=f"Comma-separated cases to run (available: {', '.join(CASES)})")
+    parser.add_argument('--sizes', default=','.join(FLEET_SIZES),
+                        help=f"Comma-separated fleet sizes (available: {', '.join(FLEET_SIZES)})")
+    parser.add_argument('--script-args', default='',
+                        help="Extra arguments passed to every script, e.g. --script-args='--max-workers 4'")
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per case; the fastest run is kept')
+    parser.add_argument('--baseline', default=os.path.join(BENCHMARK_DIR, 'benchmark_baseline.json'),
+                        help='Baseline file to compare with or save to')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the API call counts of these results as the new baseline')
+    parser.add_argument('--with-timings', action='store_true',
+                        help='With --save-baseline, also store wall time and peak memory for this machine')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed relative increase of wall time, peak memory and polling calls (default: 0.5)')
+    parser.add_argument('--output', help='Also write the full results to this JSON file')
+    parser.add_argument('--aws-throttling', action='store_true',
+                        help='Make the stand-in enforce AWS request rate buckets and throttle calls beyond them')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the scripts')
+    args = parser.parse_args()
+
+    extra_args = shlex.split(args.script_args)
+    results = {}
+    print(f"{'Case':<32}{'Wall':>10}{'Peak RSS':>13}{'API calls':>14}{'Payload':>17}")
+    for size in args.sizes.split(','):
+        for case in args.cases.split(','):
+            runs = [run_case(case, size, extra_args, args.verbose, args.aws_throttling) for _ in range(max(1, args.repeat))]
+            result = min(runs, key=lambda run: run['wall_seconds'])
+            key = f"{case}/{size}"
+            results[key] = result
+            print_result(key, result)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+
+    baseline = {'machine': None, 'cases': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    if args.save_baseline:
+        if args.with_timings and baseline['machine'] != machine_id():
+            # Timings of another machine cannot be compared with these
+            baseline['cases'] = {key: baseline_entry(entry, False) for key, entry in baseline['cases'].items()}
+            baseline['machine'] = machine_id()
+        baseline['cases'].update((key, baseline_entry(result, args.with_timings)) for key, result in results.items())
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=1, sort_keys=True)
+        print(f"Baseline saved to '{args.baseline}'.")
+        sys.exit(0)
+
+    if not baseline['cases']:
+        print(f"No baseline at '{args.baseline}'; run with --save-baseline to create one.")
+        sys.exit(0)
+
+    same_machine = baseline['machine'] == machine_id()
+    if baseline['machine'] and not same_machine:
+        print(f"Baseline timings were measured on {baseline['machine']}; comparing API calls only.")
+    failed = False
+    for key, result in results.items():
+        if result['error']:
+            failed = True
+        if key not in baseline['cases']:
+            print(f"{key}: no baseline entry")
+            continue
+        for regression in compare(result, baseline['cases'][key], args.tolerance, same_machine):
+            print(f"REGRESSION {key}: {regression}")
+            failed = True
+    print("Regressions found." if failed else "No regressions against the baseline.")
+    sys.exit(1 if failed else 0)
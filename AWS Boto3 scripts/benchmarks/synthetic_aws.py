@@ -0,0 +1,690 @@
+"""Local AWS stand-in serving synthetic fleets to the scripts under benchmark.
+
+Like botocore's Stubber, the stand-in answers API calls from a before-call
+event handler, so parameter validation, paginators and ClientError handling
+are the real botocore code paths and no request leaves the machine. Instead
+of a queue of canned responses, every resource is generated on demand from
+its index, so a 50k instance fleet costs no memory until a page is served.
+
+With SYNTHETIC_AWS_THROTTLING=1 in the environment, calls beyond the
+AWS_RATE_LIMITS request buckets fail with the service's throttling error,
+as botocore would report them once its retries are exhausted. With
+SYNTHETIC_AWS_OMIT_TAGLIST=1, RDS describe responses leave out TagList, as
+older API versions did.
+
+Config select_aggregate_resource_config queries of the form the inventory
+scripts send (resourceType = '...' AND accountId IN (...)) are answered with
+the same resources as configuration items. With SYNTHETIC_AWS_CONFIG_LAG=1,
+the aggregator has not recorded the newest CONFIG_LAG_FRACTION of the
+instances yet and reports some stopped instances as still running, like a
+Config recorder lagging behind the account.
+
+Run as a script, this module executes one benchmark case in the current
+process and writes its measurements as JSON (used by benchmark-inventory.py):
+
+    python synthetic_aws.py SIZE RESULT_JSON SCRIPT [SCRIPT ARGS...]
+"""
+import datetime
+import json
+import os
+import re
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Fleet sizes: totals per account, spread evenly over REGIONS
+FLEET_SIZES = {
+    'small': {'instances': 1000, 'volumes': 1500, 'vpcs': 100, 'db_instances': 20},
+    'medium': {'instances': 10000, 'volumes': 15000, 'vpcs': 300, 'db_instances': 200},
+    'large': {'instances': 50000, 'volumes': 75000, 'vpcs': 500, 'db_instances': 1000},
+}
+
+REGIONS = ['us-east-1', 'us-west-2', 'eu-west-1', 'ap-southeast-2']
+
+CALLER_ACCOUNT = '111111111111'
+
+# Network components created for every VPC
+PER_VPC = {'subnets': 6, 'route_tables': 3, 'security_groups': 10, 'vpc_endpoints': 2}
+
+# (type, vCPUs, memory MiB) of the instance type catalog
+INSTANCE_TYPES = [
+    ('t3.micro', 2, 1024), ('t3.large', 2, 8192), ('m5.large', 2, 8192), ('m5.xlarge', 4, 16384),
+    ('m5.2xlarge', 8, 32768), ('c5.xlarge', 4, 8192), ('c5.4xlarge', 16, 32768), ('r5.large', 2, 16384),
+    ('r5.2xlarge', 8, 65536), ('m6i.4xlarge', 16, 65536), ('c6g.large', 2, 4096), ('x2idn.16xlarge', 64, 1048576),
+]
+
+BASE_TIME = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+
+# AWS-side request buckets enforced with throttling enabled: (refill per second, size)
+# per (account, region, service, mutating), like the documented EC2 buckets
+AWS_RATE_LIMITS = {('ec2', False): (20.0, 100), ('ec2', True): (5.0, 200),
+                   ('rds', False): (10.0, 50), ('rds', True): (5.0, 50)}
+# Seconds a created AMI stays 'pending' before it becomes 'available'
+IMAGE_PENDING_SECONDS = 1.0
+
+# Listings whose records reflect CreateTags calls: result key -> ID key
+TAGGABLE = {'Reservations': 'InstanceId', 'Volumes': 'VolumeId'}
+
+THROTTLE_ERRORS = {'ec2': ('RequestLimitExceeded', 503), 'rds': ('Throttling', 400)}
+
+# Config resource types of the aggregator stand-in: type -> (fleet attribute, ID key)
+CONFIG_RESOURCE_TYPES = {
+    'AWS::EC2::Instance': ('instances', 'InstanceId'),
+    'AWS::EC2::Volume': ('volumes', 'VolumeId'),
+    'AWS::EC2::VPC': ('vpcs', 'VpcId'),
+    'AWS::EC2::Subnet': ('subnets', 'SubnetId'),
+    'AWS::EC2::RouteTable': ('route_tables', 'RouteTableId'),
+    'AWS::EC2::InternetGateway': ('internet_gateways', 'InternetGatewayId'),
+    'AWS::EC2::SecurityGroup': ('security_groups', 'GroupId'),
+    'AWS::EC2::NetworkAcl': ('network_acls', 'NetworkAclId'),
+    'AWS::EC2::VPCPeeringConnection': ('peering_connections', 'VpcPeeringConnectionId'),
+    'AWS::EC2::NatGateway': ('nat_gateways', 'NatGatewayId'),
+    'AWS::EC2::VPCEndpoint': ('vpc_endpoints', 'VpcEndpointId'),
+    'AWS::RDS::DBInstance': ('db_instances', 'DBInstanceIdentifier'),
+    'AWS::RDS::DBCluster': ('db_clusters', 'DBClusterIdentifier'),
+}
+CONFIG_QUERY_RE = re.compile(r"resourceType = '(?P<type>[^']+)'(?: AND accountId IN \((?P<accounts>[^)]*)\))?")
+# Newest instances the lagging aggregator has not recorded yet (SYNTHETIC_AWS_CONFIG_LAG=1)
+CONFIG_LAG_FRACTION = 0.01
+
+
+def hex_id(prefix, region_index, index, width=17):
+    return f"{prefix}-{region_index:02x}{index:0{width - 2}x}"
+
+
+def tags(**values):
+    return [{'Key': key, 'Value': value} for key, value in values.items()]
+
+
+class VirtualList:
+    """count records built on demand by make(index)."""
+
+    def __init__(self, count, make):
+        self.count = count
+        self.make = make
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (self.make(index) for index in range(self.count))
+
+    def slice(self, start, stop):
+        return [self.make(index) for index in range(start, min(stop, self.count))]
+
+
+class RegionFleet:
+    """The synthetic resources of one (account, region)."""
+
+    def __init__(self, size, account_id, region):
+        totals = FLEET_SIZES[size]
+        self.account_id = account_id
+        self.region = region
+        self.region_index = REGIONS.index(region)
+        self.counts = {name: self._share(total) for name, total in totals.items()}
+        n_vpcs = self.counts['vpcs']
+
+        self.instances = VirtualList(self.counts['instances'], self.instance)
+        self.volumes = VirtualList(self.counts['volumes'], self.volume)
+        self.vpcs = VirtualList(n_vpcs, self.vpc)
+        self.subnets = VirtualList(n_vpcs * PER_VPC['subnets'], self.subnet)
+        self.route_tables = VirtualList(n_vpcs * PER_VPC['route_tables'], self.route_table)
+        self.security_groups = VirtualList(n_vpcs * PER_VPC['security_groups'], self.security_group)
+        self.vpc_endpoints = VirtualList(n_vpcs * PER_VPC['vpc_endpoints'], self.vpc_endpoint)
+        self.internet_gateways = VirtualList(n_vpcs, self.internet_gateway)
+        self.network_acls = VirtualList(n_vpcs, self.network_acl)
+        self.nat_gateways = VirtualList(n_vpcs, self.nat_gateway)
+        self.peering_connections = VirtualList(max(0, n_vpcs - 1), self.peering_connection)
+        self.db_instances = VirtualList(self.counts['db_instances'], self.db_instance)
+        # Every third DB instance is the writer of an Aurora cluster
+        self.db_clusters = VirtualList(self.counts['db_instances'] // 3, self.db_cluster)
+        self.rds_tag_mappings = VirtualList(len(self.db_instances) + len(self.db_clusters), self.rds_tag_mapping)
+        # AMIs created through CreateImage, by image ID
+        self.images = {}
+        # Tags set through CreateTags, by resource ID
+        self.tag_overrides = {}
+        # Records matching the filters of a paginated listing, kept for its next pages
+        self.filtered = {}
+
+    def _share(self, total):
+        share, remainder = divmod(total, len(REGIONS))
+        return share + (1 if self.region_index < remainder else 0)
+
+    def _id(self, prefix, index):
+        return hex_id(prefix, self.region_index, index)
+
+    def vpc_id(self, index):
+        return self._id('vpc', index % self.counts['vpcs'])
+
+    def subnet_id(self, vpc_index, index):
+        return self._id('subnet', vpc_index * PER_VPC['subnets'] + index % PER_VPC['subnets'])
+
+    def az(self, index):
+        return self.region + 'abc'[index % 3]
+
+    def instance(self, index):
+        instance_type = INSTANCE_TYPES[index % len(INSTANCE_TYPES)][0]
+        stopped = index % 10 == 0
+        instance = {
+            'InstanceId': self._id('i', index),
+            'InstanceType': instance_type,
+            'ImageId': self._id('ami', index % 50),
+            'KeyName': f"key-{index % 20}",
+            'LaunchTime': BASE_TIME + datetime.timedelta(minutes=index),
+            'Placement': {'AvailabilityZone': self.az(index)},
+            'PrivateIpAddress': f"10.{self.region_index}.{index // 250 % 256}.{index % 250 + 4}",
+            'State': {'Code': 80 if stopped else 16, 'Name': 'stopped' if stopped else 'running'},
+            'StateTransitionReason': 'User initiated (2023-06-01 10:00:00 GMT)' if stopped else '',
+            'VpcId': self.vpc_id(index),
+            'SubnetId': self.subnet_id(index % self.counts['vpcs'], index // self.counts['vpcs']),
+            'SecurityGroups': [{'GroupId': self._id('sg', index % self.counts['vpcs'] * PER_VPC['security_groups'] + index % 10),
+                                'GroupName': f"sg-{index % 10}"}],
+            # Volume `index` is the root volume of instance `index`, see volume()
+            'BlockDeviceMappings': [{'DeviceName': '/dev/xvda', 'Ebs': {'VolumeId': self._id('vol', index), 'Status': 'attached'}}],
+            'Tags': tags(Name=f"app-{index:06d}", Env=['prod', 'stage', 'dev'][index % 3], Grade=['prod', 'nonprod'][index % 2],
+                         Application=f"app{index % 40}", Role=['web', 'db', 'worker'][index % 3]),
+        }
+        if index % 4 == 0:
+            instance['PublicIpAddress'] = f"54.{self.region_index}.{index // 250 % 256}.{index % 250 + 1}"
+        if index % 7 == 0:
+            instance['Platform'] = 'windows'
+        return instance
+
+    def volume(self, index):
+        instance_index = index % self.counts['instances'] if self.counts['instances'] else None
+        volume = {
+            'VolumeId': self._id('vol', index),
+            'Size': 8 if index < self.counts['instances'] else 50 + index % 450,
+            'VolumeType': 'gp3',
+            'AvailabilityZone': self.az(instance_index or 0),
+            'State': 'in-use' if instance_index is not None else 'available',
+            'Attachments': [],
+        }
+        if instance_index is not None:
+            device = '/dev/xvda' if index < self.counts['instances'] else f"/dev/sd{'fghijklmnop'[index // self.counts['instances'] % 11]}"
+            volume['Attachments'] = [{'InstanceId': self._id('i', instance_index), 'VolumeId': volume['VolumeId'],
+                                      'Device': device, 'State': 'attached'}]
+        return volume
+
+    def vpc(self, index):
+        return {'VpcId': self._id('vpc', index), 'CidrBlock': f"10.{index % 256}.0.0/16", 'State': 'available',
+                'Tags': tags(Name=f"vpc-{self.region}-{index}")}
+
+    def subnet(self, index):
+        return {'SubnetId': self._id('subnet', index), 'VpcId': self.vpc_id(index // PER_VPC['subnets']),
+                'AvailabilityZone': self.az(index), 'Tags': tags(Name=f"subnet-{index}")}
+
+    def route_table(self, index):
+        # Per VPC: the main (public) table routing to the internet gateway, and two private
+        # tables routing through the NAT gateway, the second also to the next VPC over peering.
+        # Subnets 1-2 and 3-4 use the private tables, 0 (the NAT's) and 5 the main table.
+        vpc_index, kind = divmod(index, PER_VPC['route_tables'])
+        route_table_id = self._id('rtb', index)
+        routes = [{'DestinationCidrBlock': f"10.{vpc_index % 256}.0.0/16", 'GatewayId': 'local', 'State': 'active'}]
+        if kind == 0:
+            routes.append({'DestinationCidrBlock': '0.0.0.0/0', 'GatewayId': self._id('igw', vpc_index), 'State': 'active'})
+            associations = [{'RouteTableAssociationId': self._id('rtbassoc', index), 'RouteTableId': route_table_id, 'Main': True}]
+        else:
+            routes.append({'DestinationCidrBlock': '0.0.0.0/0', 'NatGatewayId': self._id('nat', vpc_index), 'State': 'active'})
+            if kind == 2 and vpc_index < len(self.peering_connections):
+                routes.append({'DestinationCidrBlock': f"10.{(vpc_index + 1) % 256}.0.0/16",
+                               'VpcPeeringConnectionId': self._id('pcx', vpc_index), 'State': 'active'})
+            associations = [{'RouteTableAssociationId': self._id('rtbassoc', index * 10 + subnet), 'RouteTableId': route_table_id,
+                             'SubnetId': self.subnet_id(vpc_index, subnet), 'Main': False}
+                            for subnet in ((1, 2) if kind == 1 else (3, 4))]
+        return {'RouteTableId': route_table_id, 'VpcId': self.vpc_id(vpc_index), 'Routes': routes,
+                'Associations': associations, 'Tags': tags(Name=f"rtb-{index}")}
+
+    def security_group(self, index):
+        return {'GroupId': self._id('sg', index), 'GroupName': f"sg-{index}",
+                'VpcId': self.vpc_id(index // PER_VPC['security_groups'])}
+
+    def vpc_endpoint(self, index):
+        vpc_index = index // PER_VPC['vpc_endpoints']
+        return {'VpcEndpointId': self._id('vpce', index), 'VpcId': self.vpc_id(vpc_index),
+                'ServiceName': f"com.amazonaws.{self.region}.s3", 'VpcEndpointType': 'Gateway',
+                'RouteTableIds': [self._id('rtb', vpc_index * PER_VPC['route_tables'] + kind) for kind in (1, 2)]}
+
+    def internet_gateway(self, index):
+        return {'InternetGatewayId': self._id('igw', index), 'Attachments': [{'VpcId': self.vpc_id(index), 'State': 'available'}],
+                'Tags': tags(Name=f"igw-{index}")}
+
+    def network_acl(self, index):
+        return {'NetworkAclId': self._id('acl', index), 'VpcId': self.vpc_id(index), 'IsDefault': True,
+                'Associations': [{'NetworkAclId': self._id('acl', index), 'SubnetId': self.subnet_id(index, subnet)}
+                                 for subnet in range(PER_VPC['subnets'])]}
+
+    def nat_gateway(self, index):
+        return {'NatGatewayId': self._id('nat', index), 'VpcId': self.vpc_id(index), 'SubnetId': self.subnet_id(index, 0),
+                'State': 'available',
+                'Tags': tags(Name=f"nat-{index}")}
+
+    def peering_connection(self, index):
+        return {'VpcPeeringConnectionId': self._id('pcx', index), 'Status': {'Code': 'active', 'Message': 'Active'},
+                'RequesterVpcInfo': {'VpcId': self.vpc_id(index), 'OwnerId': self.account_id, 'Region': self.region},
+                'AccepterVpcInfo': {'VpcId': self.vpc_id(index + 1), 'OwnerId': self.account_id, 'Region': self.region}}
+
+    def db_instance(self, index):
+        identifier = f"db-{self.region_index:02d}-{index:05d}"
+        return {
+            'DBInstanceIdentifier': identifier,
+            'DBInstanceArn': f"arn:aws:rds:{self.region}:{self.account_id}:db:{identifier}",
+            'Engine': ['postgres', 'mysql', 'aurora-postgresql'][index % 3],
+            'EngineVersion': ['15.4', '8.0.35', '15.4'][index % 3],
+            'DBInstanceClass': ['db.r5.large', 'db.m5.xlarge', 'db.t3.medium'][index % 3],
+            'DBInstanceStatus': 'available',
+            'AvailabilityZone': self.az(index),
+            'AllocatedStorage': 100 + index % 900,
+            'Endpoint': {'Address': f"{identifier}.abc.{self.region}.rds.amazonaws.com", 'Port': 5432},
+            'DBSubnetGroup': {'VpcId': self.vpc_id(index)},
+            'InstanceCreateTime': BASE_TIME + datetime.timedelta(hours=index),
+            'TagList': tags(Name=identifier, Env=['prod', 'stage', 'dev'][index % 3], Application=f"app{index % 40}"),
+        }
+
+    def db_cluster(self, index):
+        identifier = f"cluster-{self.region_index:02d}-{index:05d}"
+        return {
+            'DBClusterIdentifier': identifier,
+            'DBClusterArn': f"arn:aws:rds:{self.region}:{self.account_id}:cluster:{identifier}",
+            'Engine': 'aurora-postgresql',
+            'EngineVersion': '15.4',
+            'EngineMode': 'provisioned',
+            'Status': 'available',
+            'MultiAZ': False,
+            'DBClusterMembers': [{'DBInstanceIdentifier': self.db_instance(index * 3 + 2)['DBInstanceIdentifier'],
+                                  'IsClusterWriter': True}],
+            'Endpoint': f"{identifier}.cluster-abc.{self.region}.rds.amazonaws.com",
+            'ReaderEndpoint': f"{identifier}.cluster-ro-abc.{self.region}.rds.amazonaws.com",
+            'DBSubnetGroup': 'default',
+            'ClusterCreateTime': BASE_TIME + datetime.timedelta(hours=index),
+            'TagList': tags(Name=identifier, Env='prod', Application=f"app{index % 40}"),
+        }
+
+    def rds_tag_mapping(self, index):
+        if index < len(self.db_instances):
+            resource, arn_key = self.db_instance(index), 'DBInstanceArn'
+        else:
+            resource, arn_key = self.db_cluster(index - len(self.db_instances)), 'DBClusterArn'
+        return {'ResourceARN': resource[arn_key], 'Tags': resource['TagList']}
+
+
+def instance_type_info(entry):
+    instance_type, vcpus, memory = entry
+    return {'InstanceType': instance_type, 'VCpuInfo': {'DefaultVCpus': vcpus}, 'MemoryInfo': {'SizeInMiB': memory}}
+
+
+def with_tags(record, id_key, tag_overrides):
+    """record with the tags set on it through CreateTags."""
+    resource_id = record[id_key]
+    if resource_id not in tag_overrides:
+        return record
+    merged = {tag['Key']: tag['Value'] for tag in record.get('Tags', [])}
+    merged.update(tag_overrides[resource_id])
+    return dict(record, Tags=[{'Key': key, 'Value': value} for key, value in merged.items()])
+
+
+def config_value(value):
+    """A describe_* value as AWS Config records it: lowerCamel keys, ISO 8601 timestamps."""
+    if isinstance(value, dict):
+        return {key[:1].lower() + key[1:]: config_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [config_value(item) for item in value]
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%S.') + f"{value.microsecond // 1000:03d}Z"
+    return value
+
+
+def config_item(record, resource_type, id_key, account_id, region):
+    """The configuration item of a describe_* record, as returned by select_aggregate_resource_config."""
+    item_tags = record.get('Tags', record.get('TagList', []))
+    configuration = {key: value for key, value in record.items() if key not in ('Tags', 'TagList')}
+    return json.dumps({'accountId': account_id, 'awsRegion': region, 'resourceType': resource_type,
+                       'resourceId': record[id_key], 'tags': [{'key': tag['Key'], 'value': tag['Value']} for tag in item_tags],
+                       'configuration': config_value(configuration)})
+
+
+def filter_values(record, name):
+    """Values a describe_* filter name matches against in record."""
+    if name.startswith('tag:'):
+        return [tag['Value'] for tag in record.get('Tags', []) if tag['Key'] == name[4:]]
+    if name == 'vpc-id':
+        return [record.get('VpcId')]
+    if name == 'attachment.vpc-id':
+        return [attachment['VpcId'] for attachment in record.get('Attachments', [])]
+    if name == 'requester-vpc-info.vpc-id':
+        return [record['RequesterVpcInfo']['VpcId']]
+    if name == 'accepter-vpc-info.vpc-id':
+        return [record['AccepterVpcInfo']['VpcId']]
+    if name == 'attachment.instance-id':
+        return [attachment['InstanceId'] for attachment in record.get('Attachments', [])]
+    if name == 'attachment.status':
+        return [attachment['State'] for attachment in record.get('Attachments', [])]
+    if name == 'instance-id':
+        return [record['InstanceId']]
+    if name == 'instance-state-name':
+        return [record['State']['Name']]
+    raise KeyError(name)
+
+
+class ApiError(Exception):
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+class SyntheticAws:
+    """before-call handler answering the EC2, RDS and STS calls of the inventory scripts.
+
+    Pages are cut with the operation's real pagination parameters, and every
+    call is counted per operation with the payload size it would have had.
+    """
+
+    # (service, operation) -> (fleet attribute, result key, default page size, input token, limit key, output token)
+    LISTINGS = {
+        ('ec2', 'DescribeInstances'): ('instances', 'Reservations', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeVolumes'): ('volumes', 'Volumes', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeVpcs'): ('vpcs', 'Vpcs', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeSubnets'): ('subnets', 'Subnets', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeRouteTables'): ('route_tables', 'RouteTables', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeInternetGateways'): ('internet_gateways', 'InternetGateways', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeSecurityGroups'): ('security_groups', 'SecurityGroups', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeNetworkAcls'): ('network_acls', 'NetworkAcls', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeVpcPeeringConnections'): ('peering_connections', 'VpcPeeringConnections', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeNatGateways'): ('nat_gateways', 'NatGateways', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('ec2', 'DescribeVpcEndpoints'): ('vpc_endpoints', 'VpcEndpoints', 1000, 'NextToken', 'MaxResults', 'NextToken'),
+        ('rds', 'DescribeDBInstances'): ('db_instances', 'DBInstances', 100, 'Marker', 'MaxRecords', 'Marker'),
+        ('rds', 'DescribeDBClusters'): ('db_clusters', 'DBClusters', 100, 'Marker', 'MaxRecords', 'Marker'),
+        ('resourcegroupstaggingapi', 'GetResources'): ('rds_tag_mappings', 'ResourceTagMappingList', 50,
+                                                       'PaginationToken', 'ResourcesPerPage', 'PaginationToken'),
+    }
+
+    def __init__(self, size, throttling=False, omit_tag_list=False, config_lag=False):
+        self.size = size
+        self.throttling = throttling
+        self.omit_tag_list = omit_tag_list
+        self.config_lag = config_lag
+        self.calls = Counter()
+        self.payload_bytes = Counter()
+        self.throttled = Counter()
+        self.handler_seconds = 0.0
+        self._fleets = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take_token(self, service, operation, account_id, region):
+        """Return False when the AWS-side bucket of the call is empty."""
+        mutating = not operation.startswith(('Describe', 'Get', 'List', 'Search'))
+        if (service, mutating) not in AWS_RATE_LIMITS:
+            return True
+        rate, capacity = AWS_RATE_LIMITS[(service, mutating)]
+        key = (account_id, region, service, mutating)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def fleet(self, account_id, region):
+        key = (account_id, region)
+        with self._lock:
+            if key not in self._fleets:
+                self._fleets[key] = RegionFleet(self.size, account_id, region)
+            return self._fleets[key]
+
+    def install(self):
+        """Answer the API calls of every botocore client created from now on."""
+        from botocore.session import Session
+
+        original_create_client = Session.create_client
+        stand_in = self
+
+        def create_client(session, *args, **kwargs):
+            client = original_create_client(session, *args, **kwargs)
+            client.meta.events.register_first('before-parameter-build', stand_in.keep_params)
+            # Registered last so hooks of the scripts (e.g. API metrics) still see every call
+            client.meta.events.register_last('before-call', stand_in.handle)
+            return client
+
+        Session.create_client = create_client
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'AKIABENCHMARK')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+        os.environ.setdefault('AWS_DEFAULT_REGION', REGIONS[0])
+
+    def keep_params(self, params, context, **kwargs):
+        # before-call only sees the serialized request, so keep the API parameters
+        context['synthetic_params'] = dict(params)
+
+    def handle(self, model, context, request_signer=None, **kwargs):
+        from botocore.awsrequest import AWSResponse
+
+        started = time.perf_counter()
+        params = context.get('synthetic_params', {})
+        service = model.service_model.service_name
+        region = request_signer._region_name if request_signer else REGIONS[0]
+        account_id = self._account_of(request_signer)
+        try:
+            body, status = self.respond(service, model.name, params, account_id, region), 200
+        except ApiError as error:
+            body, status = {'Error': {'Code': error.code, 'Message': str(error)}}, error.status
+        payload = len(json.dumps(body, default=str))
+        body['ResponseMetadata'] = {'RequestId': 'synthetic', 'HTTPStatusCode': status, 'RetryAttempts': 0,
+                                    'HTTPHeaders': {'content-length': str(payload)}}
+        with self._lock:
+            self.calls[f"{service}.{model.name}"] += 1
+            self.payload_bytes[f"{service}.{model.name}"] += payload
+            self.handler_seconds += time.perf_counter() - started
+        return AWSResponse(None, status, {}, None), body
+
+    def _account_of(self, request_signer):
+        # Assumed-role keys issued by AssumeRole below end with the account ID
+        credentials = getattr(request_signer, '_credentials', None)
+        access_key = getattr(credentials, 'access_key', '') or ''
+        return access_key[4:] if access_key.startswith('ASIA') else CALLER_ACCOUNT
+
+    def respond(self, service, operation, params, account_id, region):
+        if self.throttling and not self.take_token(service, operation, account_id, region):
+            with self._lock:
+                self.throttled[f"{service}.{operation}"] += 1
+            code, status = THROTTLE_ERRORS[service]
+            raise ApiError(code, 'Rate exceeded', status)
+        if (service, operation) in self.LISTINGS:
+            return self.listing(service, operation, params, self.fleet(account_id, region))
+        if (service, operation) == ('ec2', 'DescribeRegions'):
+            return {'Regions': [{'RegionName': name, 'Endpoint': f"ec2.{name}.amazonaws.com"} for name in REGIONS]}
+        if (service, operation) == ('ec2', 'DescribeInstanceTypes'):
+            return self.describe_instance_types(params)
+        if (service, operation) == ('ec2', 'CreateImage'):
+            return self.create_image(params, self.fleet(account_id, region))
+        if (service, operation) == ('ec2', 'CreateTags'):
+            return self.create_tags(params, self.fleet(account_id, region))
+        if (service, operation) == ('ec2', 'DescribeImages'):
+            return self.describe_images(params, self.fleet(account_id, region))
+        if (service, operation) == ('rds', 'ListTagsForResource'):
+            return self.list_tags_for_resource(params, account_id, region)
+        if (service, operation) == ('config', 'SelectAggregateResourceConfig'):
+            return self.select_aggregate_resource_config(params)
+        if (service, operation) == ('sts', 'GetCallerIdentity'):
+            return {'Account': account_id, 'Arn': f"arn:aws:iam::{account_id}:user/benchmark", 'UserId': 'AIDABENCHMARK'}
+        if (service, operation) == ('sts', 'AssumeRole'):
+            target_account = params['RoleArn'].split(':')[4]
+            expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+            return {'Credentials': {'AccessKeyId': f"ASIA{target_account}", 'SecretAccessKey': 'benchmark',
+                                    'SessionToken': 'benchmark', 'Expiration': expiration}}
+        raise ApiError('UnsupportedOperation', f"The benchmark stand-in does not implement {service}.{operation}")
+
+    def listing(self, service, operation, params, fleet):
+        attribute, result_key, default_page, input_token, limit_key, output_token = self.LISTINGS[(service, operation)]
+        records = getattr(fleet, attribute)
+        filters = params.get('Filters') or params.get('Filter') or []
+        start = int(params.get(input_token) or 0)
+        stop = start + params.get(limit_key, default_page)
+
+        if filters:
+            key = (attribute, json.dumps(filters, sort_keys=True))
+            matching = fleet.filtered.get(key)
+            if matching is None:
+                try:
+                    matching = [record for record in records
+                                if all(set(filter_values(record, f['Name'])) & set(f['Values']) for f in filters)]
+                except KeyError as error:
+                    raise ApiError('InvalidParameterValue', f"The filter '{error.args[0]}' is invalid")
+                fleet.filtered[key] = matching
+            page, total = matching[start:stop], len(matching)
+        else:
+            page, total = records.slice(start, stop), len(records)
+
+        if fleet.tag_overrides and result_key in TAGGABLE:
+            page = [with_tags(record, TAGGABLE[result_key], fleet.tag_overrides) for record in page]
+        if self.omit_tag_list and result_key in ('DBInstances', 'DBClusters'):
+            page = [{key: value for key, value in record.items() if key != 'TagList'} for record in page]
+        if operation == 'DescribeInstances':
+            page = [{'ReservationId': hex_id('r', fleet.region_index, start + offset), 'OwnerId': fleet.account_id,
+                     'Instances': [instance]} for offset, instance in enumerate(page)]
+        response = {result_key: page}
+        if stop < total:
+            response[output_token] = str(stop)
+        return response
+
+    def describe_instance_types(self, params):
+        catalog = {entry[0]: entry for entry in INSTANCE_TYPES}
+        requested = params.get('InstanceTypes')
+        if requested:
+            invalid = [instance_type for instance_type in requested if instance_type not in catalog]
+            if invalid:
+                raise ApiError('InvalidInstanceType', f"The following supplied instance types do not exist: [{', '.join(invalid)}]")
+            return {'InstanceTypes': [instance_type_info(catalog[instance_type]) for instance_type in requested]}
+        start = int(params.get('NextToken') or 0)
+        stop = start + params.get('MaxResults', 100)
+        response = {'InstanceTypes': [instance_type_info(entry) for entry in INSTANCE_TYPES[start:stop]]}
+        if stop < len(INSTANCE_TYPES):
+            response['NextToken'] = str(stop)
+        return response
+
+    def list_tags_for_resource(self, params, account_id, region):
+        resource_kind, identifier = params['ResourceName'].split(':')[-2:]
+        index = int(identifier.rsplit('-', 1)[-1])
+        fleet = self.fleet(account_id, region)
+        resource = fleet.db_cluster(index) if resource_kind == 'cluster' else fleet.db_instance(index)
+        return {'TagList': resource['TagList']}
+
+    def select_aggregate_resource_config(self, params):
+        match = CONFIG_QUERY_RE.search(params['Expression'])
+        if not match or match.group('type') not in CONFIG_RESOURCE_TYPES:
+            raise ApiError('InvalidExpressionException', f"The benchmark stand-in cannot run '{params['Expression']}'")
+        resource_type = match.group('type')
+        attribute, id_key = CONFIG_RESOURCE_TYPES[resource_type]
+        accounts = re.findall(r"'(\d+)'", match.group('accounts') or '') or [CALLER_ACCOUNT]
+        # The org-wide result, cut into pages across every (account, region) fleet
+        fleets = [self.fleet(account_id, region) for account_id in accounts for region in REGIONS]
+        start = int(params.get('NextToken') or 0)
+        stop = start + (params.get('Limit') or 100)
+        results, offset = [], 0
+        for fleet in fleets:
+            records = getattr(fleet, attribute)
+            count = len(records)
+            if attribute == 'instances' and self.config_lag:
+                count -= int(count * CONFIG_LAG_FRACTION)
+            if offset + count > start and offset < stop:
+                for record in records.slice(max(0, start - offset), min(count, stop - offset)):
+                    if self.config_lag and attribute == 'instances' and record['State']['Name'] == 'stopped' \
+                            and int(record['InstanceId'][4:], 16) % 20 == 0:
+                        record = dict(record, State={'Code': 16, 'Name': 'running'})
+                    results.append(config_item(record, resource_type, id_key, fleet.account_id, fleet.region))
+            offset += count
+        response = {'Results': results, 'QueryInfo': {'SelectFields': [{'Name': name} for name in (
+            'accountId', 'awsRegion', 'resourceId', 'tags', 'configuration')]}}
+        if stop < offset:
+            response['NextToken'] = str(stop)
+        return response
+
+    def create_image(self, params, fleet):
+        instance_id = params['InstanceId']
+        index = int(instance_id[4:], 16) if instance_id[2:4] == f"{fleet.region_index:02x}" else -1
+        if not 0 <= index < len(fleet.instances):
+            raise ApiError('InvalidInstanceID.NotFound', f"The instance ID '{instance_id}' does not exist")
+        with self._lock:
+            if any(image['Name'] == params['Name'] for image in fleet.images.values()):
+                raise ApiError('InvalidAMIName.Duplicate', f"AMI name {params['Name']} is already in use by an AMI")
+            image_id = hex_id('ami', fleet.region_index, 0x100000 + len(fleet.images))
+            tags = {spec['ResourceType']: spec['Tags'] for spec in params.get('TagSpecifications', [])}
+            fleet.images[image_id] = {'ImageId': image_id, 'Name': params['Name'], 'SourceInstanceId': instance_id,
+                                      'Tags': tags.get('image', []), 'Created': time.monotonic()}
+        return {'ImageId': image_id}
+
+    def create_tags(self, params, fleet):
+        if len(params['Resources']) > 1000:
+            raise ApiError('InvalidParameterValue', 'Tagging is limited to 1000 resources per call')
+        with self._lock:
+            for resource_id in params['Resources']:
+                fleet.tag_overrides.setdefault(resource_id, {}).update(
+                    {tag['Key']: tag['Value'] for tag in params['Tags']})
+        return {}
+
+    def describe_images(self, params, fleet):
+        images = []
+        for image_id in params.get('ImageIds', []):
+            if image_id not in fleet.images:
+                raise ApiError('InvalidAMIID.NotFound', f"The image id '[{image_id}]' does not exist")
+            image = dict(fleet.images[image_id])
+            pending = time.monotonic() - image.pop('Created') < IMAGE_PENDING_SECONDS
+            images.append(dict(image, State='pending' if pending else 'available'))
+        return {'Images': images}
+
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(size, result_file, script, script_args):
+    """Run script against the stand-in in this process and write its measurements to result_file."""
+    stand_in = SyntheticAws(size, throttling=os.environ.get('SYNTHETIC_AWS_THROTTLING') == '1',
+                            omit_tag_list=os.environ.get('SYNTHETIC_AWS_OMIT_TAGLIST') == '1',
+                            config_lag=os.environ.get('SYNTHETIC_AWS_CONFIG_LAG') == '1')
+    stand_in.install()
+
+    script = os.path.abspath(script)
+    sys.path.insert(0, os.path.dirname(script))
+    sys.argv = [script] + script_args
+
+    started = time.perf_counter()
+    error = None
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            error = f"exit status {e.code}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall_seconds = time.perf_counter() - started
+
+    with open(result_file, 'w') as file:
+        json.dump({
+            'size': size,
+            'wall_seconds': wall_seconds,
+            'stand_in_seconds': stand_in.handler_seconds,
+            'peak_rss_mib': peak_rss_mib(),
+            'api_calls': dict(stand_in.calls),
+            'throttled_calls': dict(stand_in.throttled),
+            'payload_bytes': dict(stand_in.payload_bytes),
+            'error': error,
+        }, file, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        sys.exit(__doc__)
+    run_case(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4:])
@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# lookup_instances: answers from the local inventory index, empty on a miss
+source "$(dirname "$0")/inventory_lookup.sh"
+
 # Prompt for EC2 instance IDs (comma-separated)
 read -p "Enter the EC2 instance IDs (comma-separated, e.g., i-1234567890abcdef,i-abcdef1234567890): " INSTANCE_IDS
 
@@ -8,15 +11,18 @@ IFS=',' read -ra INSTANCE_ID_ARRAY <<< "$INSTANCE_IDS"
 
 # Loop over each instance ID
 for INSTANCE_ID in "${INSTANCE_ID_ARRAY[@]}"; do
-  # Fetch the instance name by querying tags (assuming 'Name' tag is set)
-  INSTANCE_NAME=$(aws ec2 describe-tags --filters "Name=resource-id,Values=$INSTANCE_ID" "Name=key,Values=Name" --query "Tags[0].Value" --output text)
+  # Fetch the instance name from the inventory index, or by querying tags (assuming 'Name' tag is set)
+  INSTANCE_NAME=$(lookup_instances "$INSTANCE_ID" --field name)
+  if [ -z "$INSTANCE_NAME" ]; then
+    INSTANCE_NAME=$(aws ec2 describe-tags --filters "Name=resource-id,Values=$INSTANCE_ID" "Name=key,Values=Name" --query "Tags[0].Value" --output text)
+  fi
 
   # If no name tag found, use the instance ID as the name
   if [ "$INSTANCE_NAME" == "None" ]; then
     INSTANCE_NAME="$INSTANCE_ID"
   fi
 
-  # Fetch full instance details
+  # Fetch full instance details (always from the API: this is the backup)
   INSTANCE_DETAILS=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --output json)
 
   # Save the output to a JSON file with instance name and ID
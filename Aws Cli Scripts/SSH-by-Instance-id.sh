@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# lookup_instances: answers from the local inventory index, empty on a miss
+source "$(dirname "$0")/inventory_lookup.sh"
+
 # Prompt for the EC2 Instance ID
 read -p "Enter the EC2 Instance ID: " INSTANCE_ID
 
@@ -9,9 +12,12 @@ if ! command -v aws &> /dev/null; then
     exit 1
 fi
 
-# Fetch Key Name and Private IP Address using AWS CLI
+# Fetch Key Name and Private IP Address from the inventory index, or using AWS CLI
 echo "Fetching details for instance $INSTANCE_ID..."
-INSTANCE_DETAILS=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[0].Instances[0].[KeyName, PrivateIpAddress]" --output text 2>/dev/null)
+INSTANCE_DETAILS=$(lookup_instances "$INSTANCE_ID" --field key_name --field private_ip)
+if [[ -z "$INSTANCE_DETAILS" ]]; then
+    INSTANCE_DETAILS=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[0].Instances[0].[KeyName, PrivateIpAddress]" --output text 2>/dev/null)
+fi
 
 if [[ -z "$INSTANCE_DETAILS" ]]; then
     echo "Error: Could not retrieve details for instance $INSTANCE_ID. Check if the instance ID is correct and you have appropriate permissions."
@@ -19,8 +25,8 @@ if [[ -z "$INSTANCE_DETAILS" ]]; then
 fi
 
 # Parse the Key Name and Private IP Address
-KEY_NAME=$(echo "$INSTANCE_DETAILS" | awk '{print $1}')
-PRIVATE_IP=$(echo "$INSTANCE_DETAILS" | awk '{print $2}')
+KEY_NAME=$(echo "$INSTANCE_DETAILS" | awk -F'\t' '{print $1}')
+PRIVATE_IP=$(echo "$INSTANCE_DETAILS" | awk -F'\t' '{print $2}')
 
 # Validate Key Name and Private IP
 if [[ -z "$KEY_NAME" || -z "$PRIVATE_IP" ]]; then
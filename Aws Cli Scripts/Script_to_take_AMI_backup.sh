@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# lookup_instances: answers from the local inventory index, empty on a miss
+source "$(dirname "$0")/inventory_lookup.sh"
+
 # Prompt for EC2 instance IDs (comma-separated)
 read -p "Enter the EC2 instance IDs (comma-separated, e.g., i-1234567890abcdef,i-abcdef1234567890): " INSTANCE_IDS
 
@@ -12,10 +15,20 @@ if [[ ${#INSTANCE_ID_ARRAY[@]} -eq 0 ]]; then
   exit 1
 fi
 
-# Validate and filter valid instance IDs
+# Look up all instances in the inventory index at once: ID -> name
+declare -A INDEXED
+while IFS=$'\t' read -r INDEXED_ID INDEXED_VALUE; do
+  [[ -n "$INDEXED_ID" ]] && INDEXED["$INDEXED_ID"]="$INDEXED_VALUE"
+done <<< "$(lookup_instances "${INSTANCE_ID_ARRAY[@]}" --field instance_id --field name)"
+
+# Validate and filter valid instance IDs; indexed instances need no API call
 VALID_INSTANCE_IDS=()
 for INSTANCE_ID in "${INSTANCE_ID_ARRAY[@]}"; do
-  INSTANCE_CHECK=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[*].Instances[*].InstanceId" --output text 2>/dev/null)
+  if [[ -v INDEXED["$INSTANCE_ID"] ]]; then
+    INSTANCE_CHECK="$INSTANCE_ID"
+  else
+    INSTANCE_CHECK=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[*].Instances[*].InstanceId" --output text 2>/dev/null)
+  fi
   if [[ -n "$INSTANCE_CHECK" ]]; then
     VALID_INSTANCE_IDS+=("$INSTANCE_ID")
   else
@@ -35,7 +48,11 @@ LOG_FILE="/path/to/log_file.log"
 # Process each valid instance to create AMI backups
 for INSTANCE_ID in "${VALID_INSTANCE_IDS[@]}"; do
   # Get the instance name from tags, default to "Unnamed-Instance" if no name found
-  INSTANCE_NAME=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[0].Instances[0].Tags[?Key=='Name'].Value" --output text)
+  if [[ -v INDEXED["$INSTANCE_ID"] ]]; then
+    INSTANCE_NAME="${INDEXED["$INSTANCE_ID"]}"
+  else
+    INSTANCE_NAME=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[0].Instances[0].Tags[?Key=='Name'].Value" --output text)
+  fi
   if [[ -z "$INSTANCE_NAME" ]]; then
     INSTANCE_NAME="Unnamed-Instance"
   fi
@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# lookup_instances: answers from the local inventory index, empty on a miss
+source "$(dirname "$0")/inventory_lookup.sh"
+
 # Log file to store the output
 LOG_FILE="ec2_volume_tag_log_$(date +%Y-%m-%d_%H-%M-%S).log"
 
@@ -9,10 +12,20 @@ read -p "Enter the EC2 instance IDs (comma-separated, e.g., i-1234567890abcdef,i
 # Convert comma-separated instance IDs into an array
 IFS=',' read -ra INSTANCE_ID_ARRAY <<< "$INSTANCE_IDS"
 
-# Validate and filter valid instance IDs
+# Look up all instances in the inventory index at once: ID -> block_devices
+declare -A INDEXED
+while IFS=$'\t' read -r INDEXED_ID INDEXED_VALUE; do
+  [[ -n "$INDEXED_ID" ]] && INDEXED["$INDEXED_ID"]="$INDEXED_VALUE"
+done <<< "$(lookup_instances "${INSTANCE_ID_ARRAY[@]}" --field instance_id --field block_devices)"
+
+# Validate and filter valid instance IDs; indexed instances need no API call
 VALID_INSTANCE_IDS=()
 for INSTANCE_ID in "${INSTANCE_ID_ARRAY[@]}"; do
-  INSTANCE_CHECK=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[*].Instances[*].InstanceId" --output text 2>/dev/null)
+  if [[ -v INDEXED["$INSTANCE_ID"] ]]; then
+    INSTANCE_CHECK="$INSTANCE_ID"
+  else
+    INSTANCE_CHECK=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[*].Instances[*].InstanceId" --output text 2>/dev/null)
+  fi
   if [[ -n "$INSTANCE_CHECK" ]]; then
     VALID_INSTANCE_IDS+=("$INSTANCE_ID")
   else
@@ -30,8 +43,12 @@ fi
 for INSTANCE_ID in "${VALID_INSTANCE_IDS[@]}"; do
   echo "Processing instance: $INSTANCE_ID" | tee -a "$LOG_FILE"
 
-  # Fetch attached volumes for the instance
-  VOLUME_DETAILS=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[0].Instances[0].BlockDeviceMappings[*].{DeviceName:DeviceName,VolumeId:Ebs.VolumeId}" --output json)
+  # Fetch attached volumes for the instance, from the inventory index if it has them
+  if [[ -v INDEXED["$INSTANCE_ID"] ]]; then
+    VOLUME_DETAILS="${INDEXED["$INSTANCE_ID"]}"
+  else
+    VOLUME_DETAILS=$(aws ec2 describe-instances --instance-ids "$INSTANCE_ID" --query "Reservations[0].Instances[0].BlockDeviceMappings[*].{DeviceName:DeviceName,VolumeId:Ebs.VolumeId}" --output json)
+  fi
 
   # Check if volumes are attached
   if [[ -z "$VOLUME_DETAILS" || "$VOLUME_DETAILS" == "null" ]]; then
@@ -0,0 +1,14 @@
+#!/bin/bash
+# Sourced by the scripts in this directory; not meant to be run on its own.
+
+# Local inventory index kept by the inventory scripts (--index-db). Lookups
+# are answered from it in milliseconds; on a miss or a stale entry (see
+# inventory-lookup.py --max-age-hours) the scripts fall back to the AWS CLI.
+# Only instances indexed in the region the AWS CLI acts on are returned, so an
+# instance ID of another region is not mistaken for one of this region.
+INVENTORY_LOOKUP="${INVENTORY_LOOKUP:-$(dirname "${BASH_SOURCE[0]}")/../AWS Boto3 scripts/AWS-inventory/inventory-lookup.py}"
+lookup_instances() {
+  [[ -f "$INVENTORY_LOOKUP" ]] || return
+  local region="${AWS_REGION:-${AWS_DEFAULT_REGION:-$(aws configure get region 2>/dev/null)}}"
+  python3 "$INVENTORY_LOOKUP" --no-api ${region:+--region "$region"} "$@" 2>/dev/null
+}